@@ -0,0 +1,263 @@
+"""
+Benchmark harness for the bff commands.
+
+Generates synthetic trees (see synthetic.py) at several scales, runs each
+command in a fresh process and records wall time, throughput, peak RSS and
+(optionally, through strace) syscall counts as JSON.
+
+    python benchmarks/run.py --scales 10000 100000 --output results/new.json
+    python benchmarks/run.py compare results/old.json results/new.json
+
+Hashing order policies are compared with `index:<order>` commands, each run
+on a fresh repository with their progress milestones recorded:
+
+    python benchmarks/run.py --commands index:walk index:smallest index:largest
+"""
+
+import argparse
+import dataclasses
+import json
+import os
+import platform
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Optional
+
+from synthetic import add_spec_arguments, generate_tree, spec_from_args
+
+# Run order matters: the first index is cold, the second hits the cache,
+# and clean (destructive) goes last.
+DEFAULT_COMMANDS = ["index", "index-warm", "stats", "check", "verify", "diff", "clean"]
+
+# strace -c summary: "% time  seconds  usecs/call  calls  [errors]  total"
+_STRACE_TOTAL = re.compile(r"^\s*100\.00\s+\S+\s+\S+\s+(\d+)\s+(?:\d+\s+)?total")
+
+
+def _command_argv(
+    command: str, repo: str, metrics_file: str, other: Optional[str] = None
+) -> List[str]:
+    base = [sys.executable, "-m", "bff.main"]
+    if command.startswith("index:"):
+        order = command.split(":", 1)[1]
+        return base + [
+            "--metrics",
+            "json",
+            "--metrics-file",
+            metrics_file,
+            "index",
+            "--order",
+            order,
+        ]
+    if command == "index-warm":
+        return base + ["index"]
+    if command == "diff":
+        return base + ["diff", os.path.join(other or repo, ".bff", "index.json")]
+    return base + [command]
+
+
+def _run_measured(argv: List[str], cwd: str, strace: bool) -> Dict[str, Any]:
+    """Runs argv in a child process and returns its wall time and rusage."""
+    trace_file = None
+    if strace:
+        fd, trace_file = tempfile.mkstemp(suffix=".strace")
+        os.close(fd)
+        argv = ["strace", "-f", "-c", "-o", trace_file] + argv
+
+    start = time.perf_counter()
+    proc = subprocess.Popen(
+        argv, cwd=cwd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    _, status, rusage = os.wait4(proc.pid, 0)
+    wall = time.perf_counter() - start
+    proc.returncode = os.waitstatus_to_exitcode(status)
+
+    syscalls: Optional[int] = None
+    if trace_file:
+        with open(trace_file, "r") as f:
+            for line in f:
+                match = _STRACE_TOTAL.match(line)
+                if match:
+                    syscalls = int(match.group(1))
+        os.remove(trace_file)
+
+    # ru_maxrss is in KiB on Linux and in bytes on macOS
+    rss_kb = rusage.ru_maxrss // 1024 if sys.platform == "darwin" else rusage.ru_maxrss
+    return {
+        "exit_code": proc.returncode,
+        "wall_s": round(wall, 4),
+        "user_s": round(rusage.ru_utime, 4),
+        "sys_s": round(rusage.ru_stime, 4),
+        "peak_rss_kb": rss_kb,
+        "syscalls": syscalls,
+    }
+
+
+def _fresh_repository(repo: str) -> None:
+    shutil.rmtree(os.path.join(repo, ".bff"), ignore_errors=True)
+    subprocess.run(
+        [sys.executable, "-m", "bff.main", "init"],
+        cwd=repo,
+        check=True,
+        stdout=subprocess.DEVNULL,
+    )
+
+
+def _milestones(metrics_file: str) -> Dict[str, Optional[float]]:
+    """Seconds to half the files and to the first duplicate, if recorded."""
+    try:
+        with open(metrics_file, "r") as f:
+            stages = json.load(f)["stages"]
+    except (OSError, ValueError, KeyError):
+        return {}
+    return {
+        "half_files_s": stages.get("progress_half", {}).get("sum_s"),
+        "first_dup_s": stages.get("progress_first_dup", {}).get("sum_s"),
+    }
+
+
+def run_scale(
+    workdir: str, args: argparse.Namespace, files: int, strace: bool
+) -> List[Dict[str, Any]]:
+    repo = os.path.join(workdir, f"tree-{files}")
+    spec = spec_from_args(args, files)
+
+    print(f"[{files} files] generating tree in {repo}...", flush=True)
+    manifest = generate_tree(repo, spec)
+
+    # Every run starts from a fresh repository, but the tree is reused
+    _fresh_repository(repo)
+    metrics_file = repo + ".metrics.json"
+
+    # diff compares against a variant of the tree, indexed once (untimed),
+    # so that both the shared and the differing contents are walked
+    other = None
+    if "diff" in args.commands:
+        other = repo + "-changed"
+        generate_tree(other, dataclasses.replace(spec, changed_ratio=0.25))
+        _fresh_repository(other)
+        subprocess.run(
+            [sys.executable, "-m", "bff.main", "index"],
+            cwd=other,
+            check=True,
+            stdout=subprocess.DEVNULL,
+        )
+
+    results = []
+    for command in args.commands:
+        if command.startswith("index:"):
+            # Order policies are only comparable on a cold index
+            _fresh_repository(repo)
+        argv = _command_argv(command, repo, metrics_file, other)
+        measured = _run_measured(argv, repo, strace)
+        wall = measured["wall_s"] or 1e-9
+        measured.update(
+            {
+                "scale": files,
+                "command": command,
+                "files_per_s": round(manifest["files"] / wall, 1),
+                "mb_per_s": round(manifest["total_bytes"] / wall / 1024 / 1024, 2),
+            }
+        )
+        line = (
+            f"[{files} files] {command:<20} {measured['wall_s']:>9.3f}s "
+            f"{measured['files_per_s']:>12.1f} files/s "
+            f"{measured['peak_rss_kb'] / 1024:>8.1f} MiB RSS"
+        )
+        if command.startswith("index:"):
+            milestones = _milestones(metrics_file)
+            measured.update(milestones)
+            for label, key in (("half", "half_files_s"), ("1st dup", "first_dup_s")):
+                value = milestones.get(key)
+                line += f"  {label} " + (f"{value:.3f}s" if value else "-")
+        print(line, flush=True)
+        results.append(measured)
+
+    if os.path.exists(metrics_file):
+        os.remove(metrics_file)
+
+    # Generated trees are modified by clean, regenerate them next time
+    if "clean" in args.commands:
+        os.remove(repo + ".manifest.json")
+
+    return results
+
+
+def compare(old_path: str, new_path: str) -> None:
+    """Prints new/old ratios for every (scale, command) present in both."""
+    with open(old_path, "r") as f:
+        old = {(r["scale"], r["command"]): r for r in json.load(f)["results"]}
+    with open(new_path, "r") as f:
+        new = {(r["scale"], r["command"]): r for r in json.load(f)["results"]}
+
+    print(f"{'scale':>9} {'command':<11} {'wall':>8} {'rss':>8} {'syscalls':>9}")
+    for key in sorted(old.keys() & new.keys()):
+        o, n = old[key], new[key]
+        ratios = []
+        for field in ("wall_s", "peak_rss_kb", "syscalls"):
+            if o.get(field) and n.get(field) is not None:
+                ratios.append(f"{n[field] / o[field]:>7.2f}x")
+            else:
+                ratios.append(f"{'-':>8}")
+        print(f"{key[0]:>9} {key[1]:<11} {ratios[0]} {ratios[1]} {ratios[2]:>9}")
+
+
+def main() -> None:
+    if len(sys.argv) > 1 and sys.argv[1] == "compare":
+        parser = argparse.ArgumentParser(description="Compare two result files")
+        parser.add_argument("old")
+        parser.add_argument("new")
+        cmp_args = parser.parse_args(sys.argv[2:])
+        compare(cmp_args.old, cmp_args.new)
+        return
+
+    parser = argparse.ArgumentParser(description="Benchmark bff commands")
+    parser.add_argument(
+        "--scales", type=int, nargs="+", default=[10_000, 100_000, 1_000_000]
+    )
+    parser.add_argument("--commands", nargs="+", default=DEFAULT_COMMANDS)
+    parser.add_argument(
+        "--workdir",
+        default=os.path.join(tempfile.gettempdir(), "bff-bench"),
+        help="Where trees are generated (kept between runs)",
+    )
+    parser.add_argument("--output", default="benchmarks/results/latest.json")
+    parser.add_argument(
+        "--syscalls", action="store_true", help="Count syscalls with strace"
+    )
+    add_spec_arguments(parser)
+    args = parser.parse_args()
+
+    strace = args.syscalls and shutil.which("strace") is not None
+    if args.syscalls and not strace:
+        print("warning: strace not found, syscall counts will be null")
+
+    os.makedirs(args.workdir, exist_ok=True)
+    results = []
+    for files in args.scales:
+        results.extend(run_scale(args.workdir, args, files, strace))
+
+    from bff import __version__
+
+    report = {
+        "bff_version": __version__,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "spec": {
+            k: v for k, v in vars(args).items() if k not in ("scales", "commands")
+        },
+        "results": results,
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=4)
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+"""
+Deterministic generator for synthetic BFF repositories.
+
+The same parameters and seed always produce the same tree (paths, sizes
+and bytes), so benchmark results stay comparable between versions.
+"""
+
+import argparse
+import json
+import math
+import os
+import random
+import shutil
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, List
+
+MANIFEST_SUFFIX = ".manifest.json"
+_WRITE_CHUNK = 1024 * 1024
+
+
+@dataclass
+class TreeSpec:
+    """Parameters of a synthetic tree."""
+
+    files: int = 10_000
+    # Log-normal size distribution: median size and spread, capped at max_size
+    median_size: int = 16 * 1024
+    size_sigma: float = 1.5
+    max_size: int = 64 * 1024 * 1024
+    # Fraction of files whose content duplicates an earlier file
+    duplicate_ratio: float = 0.2
+    # Fraction of files given new content, for a variant of the same tree
+    changed_ratio: float = 0.0
+    depth: int = 3
+    fanout: int = 8
+    seed: int = 42
+
+
+def _directories(spec: TreeSpec) -> List[str]:
+    """All leaf directories of a fanout^depth tree, as relative paths."""
+    dirs = [""]
+    for level in range(spec.depth):
+        dirs = [
+            os.path.join(d, f"d{level}_{i}") for d in dirs for i in range(spec.fanout)
+        ]
+    return dirs
+
+
+def _write_content(path: str, content_id: int, size: int, seed: int) -> None:
+    """Writes `size` pseudo-random bytes determined by (seed, content_id)."""
+    rng = random.Random(seed * 1_000_003 + content_id)
+    with open(path, "wb") as f:
+        remaining = size
+        while remaining > 0:
+            n = min(remaining, _WRITE_CHUNK)
+            f.write(rng.getrandbits(n * 8).to_bytes(n, "little"))
+            remaining -= n
+
+
+def manifest_path_for(root: str) -> str:
+    return os.path.normpath(root) + MANIFEST_SUFFIX
+
+
+def plan_tree(spec: TreeSpec) -> List[Dict[str, Any]]:
+    """
+    Returns the file plan: one {path, content_id, size} per file.
+    Duplicates reuse the content_id (and size) of an earlier file. With a
+    changed_ratio, that fraction of the files then gets content of its own,
+    so the tree only partly matches the one planned without it.
+    """
+    rng = random.Random(spec.seed)
+    dirs = _directories(spec)
+    mu = math.log(max(spec.median_size, 1))
+
+    plan: List[Dict[str, Any]] = []
+    uniques: List[Dict[str, Any]] = []
+    for i in range(spec.files):
+        directory = dirs[rng.randrange(len(dirs))]
+        if uniques and rng.random() < spec.duplicate_ratio:
+            source = uniques[rng.randrange(len(uniques))]
+            content_id, size = source["content_id"], source["size"]
+        else:
+            content_id = len(uniques)
+            size = min(int(rng.lognormvariate(mu, spec.size_sigma)), spec.max_size)
+            uniques.append({"content_id": content_id, "size": size})
+        plan.append(
+            {
+                "path": os.path.join(directory, f"f{i:07d}.bin"),
+                "content_id": content_id,
+                "size": size,
+            }
+        )
+
+    if spec.changed_ratio:
+        changes = random.Random(spec.seed + 1)
+        for item in plan:
+            if changes.random() < spec.changed_ratio:
+                item["content_id"] = len(uniques)
+                uniques.append(item)
+    return plan
+
+
+def generate_tree(root: str, spec: TreeSpec) -> Dict[str, Any]:
+    """
+    Materializes the tree under root and returns its manifest. A tree that
+    was already generated with the same spec is reused as is. The manifest
+    lives next to root so that it is not indexed with the tree.
+    """
+    manifest_path = manifest_path_for(root)
+    if os.path.exists(manifest_path):
+        with open(manifest_path, "r") as f:
+            manifest = json.load(f)
+        if manifest.get("spec") == asdict(spec):
+            return manifest
+
+    # Never mix files from a previous spec into the new tree
+    if os.path.exists(root):
+        shutil.rmtree(root)
+
+    plan = plan_tree(spec)
+    created_dirs = set()
+    for item in plan:
+        path = os.path.join(root, item["path"])
+        parent = os.path.dirname(path)
+        if parent not in created_dirs:
+            os.makedirs(parent, exist_ok=True)
+            created_dirs.add(parent)
+        _write_content(path, item["content_id"], item["size"], spec.seed)
+
+    unique_sizes = {item["content_id"]: item["size"] for item in plan}
+    manifest = {
+        "spec": asdict(spec),
+        "files": len(plan),
+        "unique_files": len(unique_sizes),
+        "total_bytes": sum(item["size"] for item in plan),
+        "unique_bytes": sum(unique_sizes.values()),
+    }
+    with open(manifest_path, "w") as f:
+        json.dump(manifest, f, indent=4)
+    return manifest
+
+
+def add_spec_arguments(parser: argparse.ArgumentParser) -> None:
+    defaults = TreeSpec()
+    parser.add_argument("--median-size", type=int, default=defaults.median_size)
+    parser.add_argument("--size-sigma", type=float, default=defaults.size_sigma)
+    parser.add_argument("--max-size", type=int, default=defaults.max_size)
+    parser.add_argument(
+        "--duplicate-ratio", type=float, default=defaults.duplicate_ratio
+    )
+    parser.add_argument("--depth", type=int, default=defaults.depth)
+    parser.add_argument("--fanout", type=int, default=defaults.fanout)
+    parser.add_argument("--seed", type=int, default=defaults.seed)
+
+
+def spec_from_args(args: argparse.Namespace, files: int) -> TreeSpec:
+    return TreeSpec(
+        files=files,
+        median_size=args.median_size,
+        size_sigma=args.size_sigma,
+        max_size=args.max_size,
+        duplicate_ratio=args.duplicate_ratio,
+        depth=args.depth,
+        fanout=args.fanout,
+        seed=args.seed,
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Generate a synthetic BFF tree")
+    parser.add_argument("root", help="Directory to populate")
+    parser.add_argument("--files", type=int, default=TreeSpec.files)
+    add_spec_arguments(parser)
+    args = parser.parse_args()
+
+    manifest = generate_tree(args.root, spec_from_args(args, args.files))
+    print(json.dumps(manifest, indent=4))
+
+
+if __name__ == "__main__":
+    main()
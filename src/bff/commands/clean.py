@@ -2,8 +2,14 @@ import os
 from typing import List, Optional
 
 from bff.core.constants import BFF_DIR
-from bff.core.filtering import IndexFilters, should_index
-from bff.core.index_manager import load_index, save_index
+from bff.core.filtering import IndexFilters, select
+from bff.core.index_manager import (
+    allocated_bytes,
+    load_compact_index,
+    save_index,
+    set_entry_paths,
+)
+from bff.core.locking import writer_lock
 
 
 def _remove_file(filepath: str) -> bool:
@@ -28,6 +34,11 @@ def _create_symlink(target: str, link_name: str) -> None:
 def clean_command(
     use_symlinks: bool = False, filters: Optional[IndexFilters] = None
 ) -> None:
+    """
+    Deletes (or links) every duplicate of each content, keeping its master.
+    With filters, only the duplicates whose path matches are processed,
+    evaluated against the index; the master is always kept.
+    """
     if not os.path.exists(BFF_DIR):
         print("Error: Not a bff repository.")
         return
@@ -36,61 +47,85 @@ def clean_command(
         f"bff: Cleaning duplicates (Mode: {'Symlink' if use_symlinks else 'Delete'})..."
     )
 
-    index = load_index()
-    cleaned_count = 0
-    bytes_saved = 0
+    with writer_lock():
+        index = load_compact_index()
+        cleaned_count = 0
+        bytes_saved = 0
 
-    # Iterate over a copy of items because we might modify entries
-    for file_hash, entry in index.items():
-        paths: List[str] = entry.get("paths", [])
+        # Entries are modified in place, never added or removed
+        for file_hash, entry, positions in select(index, filters):
+            paths: List[str] = list(entry.get("paths", []))
 
-        if len(paths) <= 1:
-            continue
-
-        master_path = paths[0]
-
-        if filters:
-            if not should_index(master_path, filters):
+            if len(paths) <= 1:
                 continue
 
-        if not os.path.exists(master_path):
-            print(f"Warning: Master file missing for {file_hash[:8]}, skipping...")
-            continue
-
-        duplicates = paths[1:]
-        file_size = entry.get("size", 0)
-
-        processed_dupes = []
-
-        for dup_path in duplicates:
-            # Safety check: ensure we don't process if it's already a link (unless we want to re-link)
-            if os.path.exists(dup_path) and not os.path.islink(dup_path):
-                if _remove_file(dup_path):
-                    if use_symlinks:
-                        _create_symlink(master_path, dup_path)
-                        print(f"Linked: {dup_path} -> {master_path}")
-                        cleaned_count += 1
-                    else:
-                        print(f"Deleted: {dup_path}")
-                        bytes_saved += file_size
-                        cleaned_count += 1
-                else:
-                    # Deletion failed, keep in index
-                    processed_dupes.append(dup_path)
-
-            elif os.path.islink(dup_path):
-                # Currently, we skip existing symlinks to avoid loops or double processing
-                # But we keep them in the index structure
-                processed_dupes.append(dup_path)
-
+            master_path = paths[0]
+            if positions is None:
+                duplicates = paths[1:]
             else:
-                # File does not exist anymore, do not add back to processed_dupes
-                pass
+                duplicates = [paths[i] for i in positions if i > 0]
+                if not duplicates:
+                    continue
+
+            try:
+                master_stat = os.stat(master_path)
+            except OSError:
+                print(f"Warning: Master file missing for {file_hash[:8]}, skipping...")
+                continue
+            master_inode = (master_stat.st_dev, master_stat.st_ino)
+
+            # Duplicates the filters left out stay as they are
+            candidates = set(duplicates)
+            processed_dupes = []
+
+            for dup_path in duplicates:
+                # Safety check: ensure we don't process if it's already a link (unless we want to re-link)
+                if os.path.exists(dup_path) and not os.path.islink(dup_path):
+                    try:
+                        dup_stat = os.stat(dup_path)
+                    except OSError:
+                        processed_dupes.append(dup_path)
+                        continue
+
+                    if (dup_stat.st_dev, dup_stat.st_ino) == master_inode:
+                        # Hardlink to the master: no extra copy on disk to reclaim
+                        processed_dupes.append(dup_path)
+                        continue
+
+                    if _remove_file(dup_path):
+                        if use_symlinks:
+                            _create_symlink(master_path, dup_path)
+                            print(f"Linked: {dup_path} -> {master_path}")
+                            cleaned_count += 1
+                        else:
+                            print(f"Deleted: {dup_path}")
+                            # Data is only freed once its last hardlink is gone
+                            if dup_stat.st_nlink == 1:
+                                bytes_saved += allocated_bytes(dup_stat)
+                            cleaned_count += 1
+                    else:
+                        # Deletion failed, keep in index
+                        processed_dupes.append(dup_path)
 
-        # Update index: The entry now only contains the master + failed deletions + existing links
-        index[file_hash]["paths"] = [master_path] + processed_dupes
+                elif os.path.islink(dup_path):
+                    # Currently, we skip existing symlinks to avoid loops or double processing
+                    # But we keep them in the index structure
+                    processed_dupes.append(dup_path)
 
-    save_index(index)
+                else:
+                    # File does not exist anymore, do not add back to processed_dupes
+                    pass
+
+            # Update index: The entry now only contains the master + failed deletions + existing links
+            # (+ the duplicates left out by the filters)
+            kept = set(processed_dupes)
+            set_entry_paths(
+                entry,
+                [master_path]
+                + [p for p in paths[1:] if p not in candidates or p in kept],
+            )
+
+        save_index(index)
 
     mb_saved = bytes_saved / (1024 * 1024)
     print(f"bff: Clean complete. Processed {cleaned_count} files.")
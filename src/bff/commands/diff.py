@@ -1,9 +1,12 @@
 import os
 import sys
-from typing import Set
+from typing import Dict, List, Optional
 
 from bff.core.constants import BFF_DIR, INDEX_FILE
-from bff.core.index_manager import load_index
+from bff.core.filtering import IndexFilters, select
+from bff.core.index_manager import disk_copies, index_root, load_compact_index
+from bff.core.locking import snapshot_lock
+from bff.core.remote import is_remote, pull
 
 
 def _resolve_index_path(target_path: str) -> str:
@@ -33,9 +36,16 @@ def _resolve_index_path(target_path: str) -> str:
         sys.exit(1)
 
 
-def diff_command(target: str) -> None:
+def diff_command(target: str, filters: Optional[IndexFilters] = None) -> None:
+    """
+    Compares the local index with another repository's. target is a path,
+    or a URL pulled through a transport (see bff.core.remote). With
+    filters, each side only counts its matching paths (relative globs
+    apply from each repository's own root).
+    """
     # 1. Resolve Remote Path
-    remote_index_path = _resolve_index_path(target)
+    remote = is_remote(target)
+    remote_index_path = target if remote else _resolve_index_path(target)
 
     # 2. Load Local Index
     if not os.path.exists(INDEX_FILE):
@@ -43,25 +53,41 @@ def diff_command(target: str) -> None:
         return
 
     print("bff: Loading local index...")
-    local_index = load_index()
-    local_hashes: Set[str] = set(local_index.keys())
+    with snapshot_lock():
+        local_index = load_compact_index()
+    local_hashes: Dict[str, Optional[List[int]]] = {
+        h: positions for h, _, positions in select(local_index, filters)
+    }
 
     # 3. Load Remote Index
-    print(f"bff: Loading remote index from '{remote_index_path}'...")
-    # Use standard load_index since logic is generic now
-    remote_index = load_index(remote_index_path)
-    remote_hashes: Set[str] = set(remote_index.keys())
+    if remote:
+        print(f"bff: Pulling remote index from '{target}'...")
+        try:
+            remote_index, transport = pull(target)
+        except (OSError, ValueError) as e:
+            print(f"Error: Could not pull '{target}' ({e}).")
+            sys.exit(1)
+        print(f"bff: Received {transport.received / 1024:.1f} KB.")
+        target_path = target
+    else:
+        print(f"bff: Loading remote index from '{remote_index_path}'...")
+        with snapshot_lock(index_root(remote_index_path)):
+            remote_index = load_compact_index(remote_index_path)
+        target_path = os.path.dirname(os.path.dirname(remote_index_path))
+    remote_hashes: Dict[str, Optional[List[int]]] = {
+        h: positions for h, _, positions in select(remote_index, filters)
+    }
 
     # 4. Compute Set Differences
-    common = local_hashes & remote_hashes
-    only_local = local_hashes - remote_hashes
-    only_remote = remote_hashes - local_hashes
+    common = local_hashes.keys() & remote_hashes.keys()
+    only_local = local_hashes.keys() - remote_hashes.keys()
+    only_remote = remote_hashes.keys() - local_hashes.keys()
 
     # 5. Generate Report
     print("\n" + "=" * 60)
     print("BFF DIFFERENTIAL REPORT")
     print(f"Local Path:  {os.getcwd()}")
-    print(f"Target Path: {os.path.dirname(os.path.dirname(remote_index_path))}")
+    print(f"Target Path: {target_path}")
     print("=" * 60)
 
     print(f"Total Local Files  : {len(local_hashes)}")
@@ -77,10 +103,19 @@ def diff_command(target: str) -> None:
         print("[=] OVERLAP                     : 0 files")
 
     # [LOCAL ONLY]
+    # Volumes are allocated bytes: hardlinked paths count once
+    size_local = sum(
+        sum(disk_copies(local_index[h], local_hashes[h])) for h in only_local
+    )
     print(f"[-] LOCAL ONLY (Unique here)    : {len(only_local)} files")
+    print(f"    Local Data Volume           : {size_local / (1024 * 1024):.2f} MB")
 
     # [REMOTE ONLY]
+    size_remote = sum(
+        sum(disk_copies(remote_index[h], remote_hashes[h])) for h in only_remote
+    )
     print(f"[+] TARGET ONLY (Unique there)  : {len(only_remote)} files")
+    print(f"    Target Data Volume          : {size_remote / (1024 * 1024):.2f} MB")
 
     print("=" * 60)
 
@@ -94,7 +129,8 @@ def diff_command(target: str) -> None:
 
             # Retrieve metadata from the remote index
             remote_entry = remote_index[h]
-            path = remote_entry["paths"][0]
+            positions = remote_hashes[h]
+            path = remote_entry["paths"][positions[0] if positions else 0]
             size_mb = remote_entry["size"] / (1024 * 1024)
 
             filename = os.path.basename(path)
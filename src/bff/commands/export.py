@@ -0,0 +1,75 @@
+import os
+import sys
+from typing import Optional
+
+from bff.core import exchange
+from bff.core.constants import BFF_DIR
+from bff.core.index_manager import find_repository_root, save_index_entries
+from bff.core.locking import snapshot_lock, writer_lock
+
+
+def export_command(
+    output: str, fmt: Optional[str] = None, jobs: Optional[int] = None
+) -> None:
+    """
+    Writes the index to output as JSON Lines, CSV or Parquet (one row per
+    path), streamed from the index file and split across jobs processes.
+    """
+    root_dir = find_repository_root()
+    if not root_dir:
+        print("Error: No .bff repository found. Run 'init' inside the project.")
+        return
+
+    index_file_path = os.path.join(root_dir, BFF_DIR, "index.json")
+    if not os.path.exists(index_file_path):
+        print("bff: Index is empty. Run 'bff index' first.")
+        return
+
+    print(f"bff: Exporting the index to '{output}'...")
+    try:
+        # Only opening is locked: a save replaces the file, not this one
+        with snapshot_lock(root_dir):
+            index_file = open(index_file_path, "rb")
+        with index_file:
+            count, paths = exchange.export_index(
+                index_file, output, fmt, jobs or os.cpu_count() or 1
+            )
+    except (OSError, ValueError) as e:
+        print(f"Error: Could not export the index ({e}).")
+        sys.exit(1)
+    print(f"bff: Exported {count} entries ({paths} paths).")
+
+
+def import_command(source: str, fmt: Optional[str] = None, force: bool = False) -> None:
+    """
+    Replaces the index with an export, streamed into the index file. The
+    files themselves are not touched.
+    """
+    root_dir = find_repository_root()
+    if not root_dir:
+        print("Error: No .bff repository found. Run 'init' inside the project.")
+        return
+
+    index_file_path = os.path.join(root_dir, BFF_DIR, "index.json")
+    if (
+        not force
+        and os.path.exists(index_file_path)
+        and os.path.getsize(index_file_path) > len("{}")
+    ):
+        response = (
+            input("This replaces the current index. Continue? [y/N]: ").strip().lower()
+        )
+        if response != "y":
+            print("bff: Import aborted.")
+            return
+
+    print(f"bff: Importing the index from '{source}'...")
+    try:
+        with writer_lock(root_dir):
+            count = save_index_entries(
+                exchange.read_export(source, fmt), index_file_path
+            )
+    except (OSError, ValueError) as e:
+        print(f"Error: Could not import '{source}' ({e}). The index is unchanged.")
+        sys.exit(1)
+    print(f"bff: Imported {count} entries.")
@@ -1,149 +1,802 @@
 import os
+import threading
+import time
 from concurrent.futures import ThreadPoolExecutor, as_completed
-from typing import Any, Dict, Tuple
+from stat import S_ISLNK
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    MutableMapping,
+    Optional,
+    Set,
+    Tuple,
+)
 
 from tqdm import tqdm
 
-from bff.core.constants import BFF_DIR, IGNORED_DIRS
+from bff.core import metrics
+from bff.core.constants import (
+    BFF_DIR,
+    CHUNKS_FILE,
+    DIRS_FILE,
+    IGNORED_DIRS,
+    INDEX_ORDERS,
+    SIMILARITY_FILE,
+)
 from bff.core.filtering import IndexFilters, should_index
-from bff.core.hash import hash_file
+from bff.core.hash import hash_file, hash_tree, sample_digest
 from bff.core.index_manager import (
     _LOCK,
+    absolute_path,
+    allocated_bytes,
     find_repository_root,
     get_metadata,
+    inode_records,
+    load_compact_index,
+    load_config,
     load_index,
+    path_records,
+    relative_path,
     save_index,
+    set_entry_paths,
+    tree_hash_min_size,
 )
+from bff.core.locking import writer_lock
+from bff.core.scheduler import Location, run_by_device
+
+# Directories modified less than this long before a scan are re-listed on
+# the next one (mtime granularity is up to 2s on some filesystems).
+_RACY_WINDOW_NS = 2_000_000_000
+
+# Candidates stat'ed per thread pool task when planning the hashing queue
+_PLAN_BATCH = 512
+
+# (st_dev, st_ino, st_size, st_mtime_ns): identifies one version of an inode
+InodeKey = Tuple[int, int, int, int]
+
+Job = Tuple[str, Optional[os.stat_result]]
+
+
+# (content key, Merkle leaves for tree-hashed contents)
+Hashed = Tuple[str, Optional[List[str]]]
+
+
+def _hash_content(filepath: str, size: int, tree_min_size: Optional[int]) -> Hashed:
+    """Tree-hashes files of at least tree_min_size bytes, flat-hashes the rest."""
+    if tree_min_size is not None and size >= tree_min_size:
+        return hash_tree(filepath)
+    return hash_file(filepath), None
+
+
+class _InodeHashes:
+    """
+    Hashes each inode version once, however many hardlinks point to it.
+    Threads reaching an inode that is being hashed wait for the result.
+
+    Also knows the inode versions of the paths that vanished since the last
+    run: a new path with one of them is a moved file, whose hash carries
+    over without reading it (see moved_hash).
+    """
+
+    def __init__(
+        self,
+        known: Optional[Dict[InodeKey, str]] = None,
+        tree_min_size: Optional[int] = None,
+        moves: Optional[Dict[InodeKey, str]] = None,
+        check_moves: bool = False,
+    ) -> None:
+        self._lock = threading.Lock()
+        self._done: Dict[InodeKey, Hashed] = {
+            key: (file_hash, None) for key, file_hash in (known or {}).items()
+        }
+        self._pending: Dict[InodeKey, threading.Event] = {}
+        self.tree_min_size = tree_min_size
+        self._moves = moves or {}
+        self.check_moves = check_moves
+        self.moved = 0
+
+    def expect_moves(self, moves: Dict[InodeKey, str]) -> None:
+        """Replaces the inode versions of vanished paths (see moved_hash)."""
+        self._moves = moves
+
+    def moved_hash(
+        self, key: InodeKey, filepath: str, index: MutableMapping[str, Any]
+    ) -> Optional[str]:
+        """
+        Hash of a moved file, or None if key is not the inode version of a
+        vanished path. With check_moves, the first and last blocks must also
+        match the sample digest of the content (contents indexed before
+        samples were recorded are hashed again).
+        """
+        file_hash = self._moves.get(key)
+        if file_hash is None:
+            return None
+        if self.check_moves:
+            entry = index.get(file_hash)
+            expected = entry.get("sample") if entry is not None else None
+            if expected is None or sample_digest(filepath) != expected:
+                metrics.incr("moves_rejected")
+                return None
+        metrics.incr("moves_detected")
+        with self._lock:
+            self.moved += 1
+        return file_hash
+
+    def hash(self, key: InodeKey, filepath: str) -> Hashed:
+        with self._lock:
+            hashed = self._done.get(key)
+            if hashed is not None:
+                metrics.incr("inode_reused")
+                return hashed
+            event = self._pending.get(key)
+            owner = event is None
+            if owner:
+                event = self._pending[key] = threading.Event()
+
+        assert event is not None
+        if not owner:
+            event.wait()
+            with self._lock:
+                hashed = self._done.get(key)
+            if hashed is not None:
+                metrics.incr("inode_reused")
+                return hashed
+            # The owner failed to read it, try ourselves
+            return _hash_content(filepath, key[2], self.tree_min_size)
+
+        try:
+            hashed = _hash_content(filepath, key[2], self.tree_min_size)
+            with self._lock:
+                self._done[key] = hashed
+            return hashed
+        finally:
+            with self._lock:
+                del self._pending[key]
+            event.set()
+
+
+def _inode_record(stat: os.stat_result) -> List[int]:
+    return [stat.st_dev, stat.st_ino, stat.st_mtime_ns, allocated_bytes(stat)]
+
+
+def _build_path_cache(index: MutableMapping[str, Any]) -> Dict[str, Tuple[float, int]]:
+    """Build lookup map: Path -> (Mtime, Size)."""
+    path_cache = {}
+    for entry in index.values():
+        mtime = entry.get("mtime", 0.0)
+        size = entry.get("size", 0)
+        for p, record in path_records(entry):
+            # Prefer the path's own mtime over the entry-wide one
+            path_cache[p] = (record[2] / 1e9 if record else mtime, size)
+    return path_cache
+
+
+def _build_move_seed(
+    index: MutableMapping[str, Any], present: Set[str]
+) -> Dict[InodeKey, str]:
+    """Inode versions of the indexed paths that are no longer present."""
+    seed = {}
+    for file_hash, entry in index.items():
+        size = entry.get("size", 0)
+        for p, record in path_records(entry):
+            if record is None or p in present:
+                continue
+            dev, ino, mtime_ns = record[:3]
+            seed[(dev, ino, size, mtime_ns)] = file_hash
+    return seed
+
+
+def _build_inode_seed(index: MutableMapping[str, Any]) -> Dict[InodeKey, str]:
+    """Inode versions already hashed in previous runs."""
+    seed = {}
+    for file_hash, entry in index.items():
+        size = entry.get("size", 0)
+        for record in inode_records(entry):
+            if record is None:
+                continue
+            dev, ino, mtime_ns = record[:3]
+            seed[(dev, ino, size, mtime_ns)] = file_hash
+    return seed
+
+
+def _is_cached(
+    abs_path: str, stat: os.stat_result, cache_map: Dict[str, Tuple[float, int]]
+) -> bool:
+    if abs_path not in cache_map:
+        return False
+    cached_mtime, cached_size = cache_map[abs_path]
+    return stat.st_size == cached_size and abs(stat.st_mtime - cached_mtime) < 0.001
+
+
+def _hash_and_record(
+    abs_path: str,
+    index: MutableMapping[str, Any],
+    stat: Optional[os.stat_result] = None,
+    inode_hashes: Optional[_InodeHashes] = None,
+    tree_min_size: Optional[int] = None,
+) -> str:
+    """
+    Hashes a file and records its path (and inode) under the resulting hash.
+    Hardlinked files are hashed once and moved files not at all through
+    inode_hashes, and libmagic only runs for contents not indexed yet.
+    Files of at least tree_min_size bytes get a tree hash, whose leaves are
+    kept in the entry. New contents also get a sample digest.
+    Returns the hash. Raises OSError if the file cannot be read.
+    """
+    if stat is None:
+        stat = os.stat(abs_path)
+
+    if inode_hashes is not None:
+        # The setting of the indexing run
+        tree_min_size = inode_hashes.tree_min_size
+    key = (stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns)
+    moved_hash = None
+    if inode_hashes is not None:
+        moved_hash = inode_hashes.moved_hash(key, abs_path, index)
+    if moved_hash is not None:
+        file_hash, leaves = moved_hash, None
+    elif inode_hashes is not None and stat.st_nlink > 1:
+        file_hash, leaves = inode_hashes.hash(key, abs_path)
+    else:
+        file_hash, leaves = _hash_content(abs_path, stat.st_size, tree_min_size)
+
+    metadata = None
+    sample = None
+    known = index.get(file_hash)
+    if known is None:
+        metadata = get_metadata(abs_path)
+    if moved_hash is None and (known is None or "sample" not in known):
+        sample = sample_digest(abs_path)
+
+    with metrics.timer("lock_wait"):
+        _LOCK.acquire()
+    try:
+        entry = index.get(file_hash)
+        if entry is None:
+            if metadata is None:
+                # The entry was dropped since we looked
+                metadata = get_metadata(abs_path)
+            index[file_hash] = {
+                "size": metadata["size"],
+                "mimetype": metadata["mimetype"],
+                "created_at": metadata["created_at"],
+                "mtime": metadata["mtime"],
+                "paths": [],
+            }
+            # The index may store its own record for it (see CompactIndex)
+            entry = index[file_hash]
+        entry["mtime"] = stat.st_mtime
+        if sample is not None and "sample" not in entry:
+            entry["sample"] = sample
+        if leaves is not None and "leaves" not in entry:
+            entry["leaves"] = leaves
+        if abs_path not in entry["paths"]:
+            if entry["paths"]:
+                metrics.incr("duplicates_found")
+            entry["paths"].append(abs_path)
+        entry.setdefault("inodes", {})[abs_path] = _inode_record(stat)
+    finally:
+        _LOCK.release()
+
+    return file_hash
+
+
+def _remove_path(
+    index: MutableMapping[str, Any], file_hash: str, abs_path: str
+) -> None:
+    """Removes a path from an entry, dropping the entry once it has no paths."""
+    entry = index.get(file_hash)
+    if entry is None:
+        return
+    paths = entry.get("paths", [])
+    if abs_path in paths:
+        paths.remove(abs_path)
+    entry.get("inodes", {}).pop(abs_path, None)
+    if not paths:
+        del index[file_hash]
 
 
 def _process_file_incremental(
     filepath: str,
-    index: Dict[str, Any],
+    index: MutableMapping[str, Any],
     filters: IndexFilters,
     cache_map: Dict[str, Tuple[float, int]],
+    inode_hashes: Optional[_InodeHashes] = None,
+    stat: Optional[os.stat_result] = None,
 ) -> str:
     """
     Returns status: 'indexed', 'skipped', 'failed', 'ignored'.
+    A stat taken by the caller is reused instead of stat-ing again.
     """
     # Use the shared filtering logic
-    if not should_index(filepath, filters):
-        return "ignored"
+    with metrics.timer("filter"):
+        if not should_index(filepath, filters, stat):
+            return "ignored"
 
     try:
         abs_path = os.path.abspath(filepath)
-        stat = os.stat(abs_path)
+        if stat is None:
+            with metrics.timer("stat"):
+                stat = os.stat(abs_path)
 
         # Incremental Optimization (Cache Check)
-        if abs_path in cache_map:
-            cached_mtime, cached_size = cache_map[abs_path]
-            if (
-                stat.st_size == cached_size
-                and abs(stat.st_mtime - cached_mtime) < 0.001
-            ):
-                return "skipped"
-
-        # Hashing
-        file_hash = hash_file(abs_path)
-        metadata = get_metadata(abs_path)
-
-        with _LOCK:
-            if file_hash not in index:
-                index[file_hash] = {
-                    "size": metadata["size"],
-                    "mimetype": metadata["mimetype"],
-                    "created_at": metadata["created_at"],
-                    "mtime": metadata["mtime"],
-                    "paths": [abs_path],
-                }
-            else:
-                index[file_hash]["mtime"] = metadata["mtime"]
-                if abs_path not in index[file_hash]["paths"]:
-                    index[file_hash]["paths"].append(abs_path)
+        if _is_cached(abs_path, stat, cache_map):
+            return "skipped"
 
+        _hash_and_record(abs_path, index, stat, inode_hashes)
         return "indexed"
 
     except OSError:
         return "failed"
 
 
-def index_command(filters: IndexFilters) -> None:
-    root_dir = find_repository_root()
-    if not root_dir:
-        print("Error: No .bff repository found. Run 'init' inside the project.")
-        return
+def _list_directory(path: str) -> Optional[Tuple[List[str], List[str]]]:
+    """Returns (subdirs, files) for a directory, or None if it is unreadable."""
+    subdirs, files = [], []
+    try:
+        with os.scandir(path) as it:
+            for entry in it:
+                if entry.is_dir():
+                    # Like os.walk: symlinked directories are not followed
+                    if entry.name not in IGNORED_DIRS and not entry.is_symlink():
+                        subdirs.append(entry.name)
+                else:
+                    files.append(entry.name)
+    except OSError:
+        return None
+    return subdirs, files
 
-    index_file_path = os.path.join(root_dir, BFF_DIR, "index.json")
-    print(f"bff: Indexing root: {root_dir}")
 
-    index = load_index(index_file_path)
+def _scan_files(
+    root_dir: str,
+    dir_cache: Optional[Dict[str, Any]] = None,
+    prune: Optional[Callable[[str], bool]] = None,
+) -> Tuple[List[str], Set[str], Dict[str, Any]]:
+    """
+    Walks the repository and returns (candidates, files in unchanged
+    directories, new directory cache).
 
-    # Build lookup map: Path -> (Mtime, Size)
-    path_cache = {}
-    for entry in index.values():
-        mtime = entry.get("mtime", 0.0)
-        size = entry.get("size", 0)
-        for p in entry.get("paths", []):
-            path_cache[p] = (mtime, size)
+    A directory whose mtime matches the cached one has gained, lost or
+    renamed no entries, so its cached listing is reused instead of reading
+    it again. Directories modified too close to the scan are not cached,
+    since a later change could land within the same timestamp tick.
+    Subdirectories for which prune(path) is true are not walked at all.
+    """
+    dir_cache = dir_cache or {}
+    new_cache: Dict[str, Any] = {}
+    racy_limit_ns = time.time_ns() - _RACY_WINDOW_NS
+
+    all_files: List[str] = []
+    unchanged_files: Set[str] = set()
+    stack = [root_dir]
+
+    while stack:
+        current = stack.pop()
+        try:
+            mtime_ns = os.stat(current).st_mtime_ns
+        except OSError:
+            continue
+
+        metrics.incr("walk_dirs")
+        cached = dir_cache.get(current)
+        if cached and cached.get("mtime_ns") == mtime_ns:
+            subdirs, files = cached["dirs"], cached["files"]
+            unchanged = True
+            metrics.incr("walk_dirs_cached")
+        else:
+            listing = _list_directory(current)
+            if listing is None:
+                continue
+            subdirs, files = listing
+            unchanged = False
+
+        if mtime_ns < racy_limit_ns:
+            new_cache[current] = {
+                "mtime_ns": mtime_ns,
+                "dirs": subdirs,
+                "files": files,
+            }
 
-    print("bff: Scanning file system...")
-    all_files = []
-    for root, dirs, files in os.walk(root_dir):
-        dirs[:] = [d for d in dirs if d not in IGNORED_DIRS]
         for f in files:
-            full_path = os.path.join(root, f)
+            full_path = os.path.join(current, f)
             if BFF_DIR in full_path:
                 continue
             all_files.append(full_path)
+            if unchanged:
+                unchanged_files.add(full_path)
+
+        for d in reversed(subdirs):
+            subdir = os.path.join(current, d)
+            if prune is not None and prune(subdir):
+                metrics.incr("walk_dirs_pruned")
+                continue
+            stack.append(subdir)
+
+    metrics.incr("walk_files", len(all_files))
+    return all_files, unchanged_files, new_cache
+
 
-    print(f"bff: Found {len(all_files)} candidates.")
+def _prune_unseen(index: MutableMapping[str, Any], seen_paths: Set[str]) -> int:
+    """Drops paths that were not seen on disk. Returns the number pruned."""
+    pruned_count = 0
+    hashes_to_delete = []
+
+    for file_hash, entry in index.items():
+        current_paths = entry.get("paths", [])
+        new_paths = [p for p in current_paths if p in seen_paths]
 
+        pruned_count += len(current_paths) - len(new_paths)
+
+        if not new_paths:
+            hashes_to_delete.append(file_hash)
+        elif len(new_paths) != len(current_paths):
+            set_entry_paths(entry, new_paths)
+
+    for h in hashes_to_delete:
+        del index[h]
+
+    return pruned_count
+
+
+def _cached_file_matches(
+    path: str, cached: Tuple[float, int], filters: IndexFilters
+) -> bool:
+    """Evaluates the filters against cached metadata, without touching disk."""
+    compiled = filters.compile()
+    if compiled.after_date or compiled.mimetypes:
+        # Neither ctime nor mimetype is cached per path, let the regular
+        # pipeline decide
+        return False
+    return (
+        cached[1] >= compiled.min_size
+        and compiled.match_mtime(cached[0])
+        and compiled.match_path(path)
+    )
+
+
+def _plan_job(path: str) -> Tuple[Job, Location]:
+    try:
+        with metrics.timer("stat"):
+            stat = os.lstat(path)
+    except OSError:
+        return (path, None), None
+    if S_ISLNK(stat.st_mode):
+        # Ignored by the filters, nothing to read
+        return (path, None), None
+    return (path, stat), (stat.st_dev, stat.st_ino)
+
+
+def _plan_batch(paths: List[str]) -> List[Tuple[Job, Location]]:
+    return [_plan_job(path) for path in paths]
+
+
+def _plan_jobs(paths: Iterable[str]) -> List[Tuple[Job, Location]]:
+    """
+    Stats candidates up front so the scheduler can group them by device.
+    The stats run on a thread pool in batches: done one by one on the main
+    thread, they would hold back the first hash on large or network trees.
+    """
+    paths = list(paths)
+    batches = [paths[i : i + _PLAN_BATCH] for i in range(0, len(paths), _PLAN_BATCH)]
+    if len(batches) <= 1:
+        return _plan_batch(paths)
+
+    max_workers = min(32, (os.cpu_count() or 1) + 4)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return [job for batch in executor.map(_plan_batch, batches) for job in batch]
+
+
+def _job_priority(
+    order: str,
+    jobs: List[Tuple[Job, Location]],
+    path_cache: Dict[str, Tuple[float, int]],
+) -> Optional[Callable[[Job], Tuple[int, int]]]:
+    """
+    Sort key of the hashing queue for an order policy (None keeps walk
+    order). Files whose cached entry is still valid only cost a stat, so
+    they always go first; the policy ranks the files left to hash:
+    - smallest: smallest first, for the fastest file coverage
+    - largest: largest first, so big files do not become the tail of a
+      multi-worker run
+    - size-collision: files sharing their size with another candidate
+      (the only possible duplicates) first, smallest first among them
+    """
+    if order not in INDEX_ORDERS:
+        raise ValueError(f"Unknown order policy: {order}")
+    if order == "walk":
+        return None
+
+    sizes: Dict[int, int] = {}
+    if order == "size-collision":
+        for (_, stat), _location in jobs:
+            if stat is not None:
+                sizes[stat.st_size] = sizes.get(stat.st_size, 0) + 1
+
+    def priority(job: Job) -> Tuple[int, int]:
+        path, stat = job
+        if stat is None or _is_cached(os.path.abspath(path), stat, path_cache):
+            return (0, 0)
+        if order == "smallest":
+            return (1, stat.st_size)
+        if order == "largest":
+            return (1, -stat.st_size)
+        return (1 if sizes[stat.st_size] > 1 else 2, stat.st_size)
+
+    return priority
+
+
+def _process_all(
+    paths: Iterable[str],
+    total: int,
+    index: MutableMapping[str, Any],
+    filters: IndexFilters,
+    path_cache: Dict[str, Tuple[float, int]],
+    order: str = "walk",
+    tree_min_size: Optional[int] = None,
+    moves: Optional[Dict[InodeKey, str]] = None,
+    check_moves: bool = False,
+) -> Tuple[Dict[str, int], Set[str]]:
+    """
+    Runs the incremental pipeline over paths, scheduled per device. moves
+    maps the inode versions of vanished paths to their hash (see
+    _build_move_seed); files found under them are counted as "moved"
+    rather than "indexed".
+    """
     stats = {"indexed": 0, "skipped": 0, "failed": 0}
     seen_paths_on_disk = set()
 
+    inode_hashes = _InodeHashes(
+        _build_inode_seed(index), tree_min_size, moves, check_moves
+    )
+    jobs = _plan_jobs(paths)
+    priority = _job_priority(order, jobs, path_cache)
+
+    def process(job: Job) -> str:
+        path, stat = job
+        return _process_file_incremental(
+            path, index, filters, path_cache, inode_hashes, stat
+        )
+
+    # Milestones for comparing order policies (recorded with --metrics):
+    # when half the files are done, and when the first duplicate is found
+    started = time.perf_counter()
+    milestones = {"progress_half": False, "progress_first_dup": False}
+
+    def record_milestones(done: int) -> None:
+        registry = metrics.active()
+        if registry is None:
+            return
+        elapsed = time.perf_counter() - started
+        if not milestones["progress_half"] and done * 2 >= total:
+            milestones["progress_half"] = True
+            metrics.observe("progress_half", elapsed)
+        if not milestones["progress_first_dup"] and registry.counters.get(
+            "duplicates_found"
+        ):
+            milestones["progress_first_dup"] = True
+            metrics.observe("progress_first_dup", elapsed)
+
+    with tqdm(total=total, unit="file", desc="Processing") as pbar:
+
+        def on_done(job: Job, result: str) -> None:
+            if result in ["indexed", "skipped"]:
+                seen_paths_on_disk.add(os.path.abspath(job[0]))
+
+            if result in stats:
+                stats[result] += 1
+            metrics.incr(f"files_{result}")
+
+            pbar.update(1)
+            record_milestones(pbar.n)
+
+        run_by_device(jobs, process, on_done, priority)
+
+    stats["moved"] = inode_hashes.moved
+    stats["indexed"] -= inode_hashes.moved
+    return stats, seen_paths_on_disk
+
+
+def _update_chunk_index(
+    index: MutableMapping[str, Any], chunks_file_path: str
+) -> Tuple[int, Dict[str, Any]]:
+    """
+    Chunks every indexed content that has no chunk list yet and drops the
+    lists of contents that left the index.
+    Returns (number chunked, chunk index).
+    """
+    # Deferred: chunking may pull in numpy
+    from bff.core.chunking import DEFAULT_PARAMS, chunk_file
+
+    chunk_index = load_index(chunks_file_path)
+    if chunk_index.get("params") != list(DEFAULT_PARAMS):
+        chunk_index = {"params": list(DEFAULT_PARAMS), "files": {}}
+    files = chunk_index["files"]
+
+    for file_hash in list(files):
+        if file_hash not in index:
+            del files[file_hash]
+
+    todo = {
+        file_hash: entry["paths"][0]
+        for file_hash, entry in index.items()
+        if file_hash not in files and entry.get("paths")
+    }
+
     max_workers = min(32, (os.cpu_count() or 1) + 4)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(chunk_file, p): h for h, p in todo.items()}
+        with tqdm(total=len(futures), unit="file", desc="Chunking") as pbar:
+            for future in as_completed(futures):
+                try:
+                    files[futures[future]] = future.result()
+                except OSError:
+                    pass
+                pbar.update(1)
+
+    save_index(chunk_index, chunks_file_path)
+    return len(todo), chunk_index
+
 
+def _update_similarity_index(
+    index: MutableMapping[str, Any],
+    chunk_index: MutableMapping[str, Any],
+    similarity_file_path: str,
+) -> int:
+    """
+    Computes perceptual hashes for images and MinHash sketches over chunk
+    digests for other contents. Returns the number of new signatures.
+    """
+    from bff.core.similarity import image_dhash, minhash
+
+    similarity = load_index(similarity_file_path)
+    images = similarity.setdefault("images", {})
+    sketches = similarity.setdefault("sketches", {})
+    for table in (images, sketches):
+        for file_hash in list(table):
+            if file_hash not in index:
+                del table[file_hash]
+
+    todo_images = {
+        file_hash: entry["paths"][0]
+        for file_hash, entry in index.items()
+        if str(entry.get("mimetype", "")).startswith("image/")
+        and file_hash not in images
+        and entry.get("paths")
+    }
+    added = 0
+    max_workers = min(32, (os.cpu_count() or 1) + 4)
     with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        futures = {
-            executor.submit(_process_file_incremental, f, index, filters, path_cache): f
-            for f in all_files
-        }
+        futures = {executor.submit(image_dhash, p): h for h, p in todo_images.items()}
+        for future in as_completed(futures):
+            value = future.result()
+            if value is not None:
+                images[futures[future]] = f"{value:016x}"
+                added += 1
 
-        with tqdm(total=len(all_files), unit="file", desc="Processing") as pbar:
-            for future in as_completed(futures):
-                path = futures[future]
-                result = future.result()
+    # Everything else (including images Pillow could not read) is sketched
+    # from its chunks; single-chunk contents only ever match exactly.
+    chunk_files = chunk_index.get("files", {})
+    for file_hash in index:
+        chunks = chunk_files.get(file_hash)
+        if file_hash in images or file_hash in sketches or not chunks:
+            continue
+        if len(chunks) < 2:
+            continue
+        sketches[file_hash] = minhash(digest for digest, _ in chunks)
+        added += 1
 
-                if result in ["indexed", "skipped"]:
-                    seen_paths_on_disk.add(os.path.abspath(path))
+    save_index(similarity, similarity_file_path)
+    return added
 
-                if result in stats:
-                    stats[result] += 1
 
-                pbar.update(1)
+def index_command(
+    filters: IndexFilters,
+    trust_dirs: bool = False,
+    chunks: bool = False,
+    similarity: bool = False,
+    order: str = "walk",
+    check_moves: bool = False,
+) -> None:
+    """
+    Indexes the repository incrementally.
 
-    print("bff: Pruning deleted files from index...")
-    pruned_count = 0
-    hashes_to_delete = []
+    With trust_dirs, already indexed files in unchanged directories are
+    assumed unchanged and not even stat-ed. With chunks, contents are also
+    split into content-defined chunks for block-level statistics. With
+    similarity, near-duplicate signatures are computed (implies chunks).
+    order picks the hashing queue policy, one of INDEX_ORDERS.
 
-    for file_hash, entry in index.items():
-        current_paths = entry.get("paths", [])
-        new_paths = [p for p in current_paths if p in seen_paths_on_disk]
+    Files that were moved or renamed since the last run (same device,
+    inode, size and mtime as a vanished path) keep their hash without
+    being read; with check_moves, only if their first and last blocks
+    still match.
+    """
+    root_dir = find_repository_root()
+    if not root_dir:
+        print("Error: No .bff repository found. Run 'init' inside the project.")
+        return
+
+    index_file_path = os.path.join(root_dir, BFF_DIR, "index.json")
+    dirs_file_path = os.path.join(root_dir, DIRS_FILE)
+    print(f"bff: Indexing root: {root_dir}")
+    if filters.root is None:
+        # Relative globs and regexes apply from the root, not the cwd
+        filters.root = root_dir
 
-        pruned_this_hash = len(current_paths) - len(new_paths)
-        pruned_count += pruned_this_hash
+    # Held until every file is saved: another writer would overwrite them
+    with writer_lock(root_dir):
+        index = load_compact_index(index_file_path)
+        path_cache = _build_path_cache(index)
 
-        if not new_paths:
-            hashes_to_delete.append(file_hash)
-        else:
-            index[file_hash]["paths"] = new_paths
+        print("bff: Scanning file system...")
+        with metrics.timer("walk"):
+            stored_dirs = load_index(dirs_file_path)
+            all_files, unchanged_files, dir_cache = _scan_files(
+                root_dir,
+                {absolute_path(d, root_dir): v for d, v in stored_dirs.items()},
+                filters.compile().prunes_dir,
+            )
 
-    for h in hashes_to_delete:
-        del index[h]
+        print(f"bff: Found {len(all_files)} candidates.")
+
+        to_process = all_files
+        trusted: Set[str] = set()
+        if trust_dirs:
+            trusted = {
+                p
+                for p in unchanged_files
+                if p in path_cache and _cached_file_matches(p, path_cache[p], filters)
+            }
+            to_process = [p for p in all_files if p not in trusted]
+
+        stats, seen_paths_on_disk = _process_all(
+            to_process,
+            len(to_process),
+            index,
+            filters,
+            path_cache,
+            order,
+            tree_hash_min_size(load_config(root_dir)),
+            _build_move_seed(index, set(all_files)),
+            check_moves,
+        )
+        stats["skipped"] += len(trusted)
+        seen_paths_on_disk |= trusted
+
+        print("bff: Pruning deleted files from index...")
+        pruned_count = _prune_unseen(index, seen_paths_on_disk)
+
+        save_index(index, index_file_path)
+        save_index(
+            {relative_path(d, root_dir): v for d, v in dir_cache.items()},
+            dirs_file_path,
+        )
+
+        chunks = chunks or similarity
+        chunked_count = 0
+        if chunks:
+            print("bff: Updating chunk index...")
+            chunked_count, chunk_index = _update_chunk_index(
+                index, os.path.join(root_dir, CHUNKS_FILE)
+            )
 
-    save_index(index, index_file_path)
+        signature_count = 0
+        if similarity:
+            print("bff: Computing similarity signatures...")
+            signature_count = _update_similarity_index(
+                index, chunk_index, os.path.join(root_dir, SIMILARITY_FILE)
+            )
 
     print("-" * 40)
     print("bff: Operation complete.")
     print(f" - Cached    : {stats['skipped']} (Unchanged)")
     print(f" - Indexed   : {stats['indexed']} (New/Modified)")
+    print(f" - Moved     : {stats['moved']} (Hash reused)")
     print(f" - Pruned    : {pruned_count} (Deleted)")
+    if chunks:
+        print(f" - Chunked   : {chunked_count} (New contents)")
+    if similarity:
+        print(f" - Signatures: {signature_count} (New contents)")
@@ -1,7 +1,8 @@
 import os
 
-from bff.core.hash import hash_file
-from bff.core.index_manager import load_index
+from bff.core.hash import hash_file, hash_tree
+from bff.core.index_manager import load_config, load_compact_index, tree_hash_min_size
+from bff.core.locking import snapshot_lock
 
 
 def locate_command(target_filepath: str) -> None:
@@ -19,13 +20,21 @@ def locate_command(target_filepath: str) -> None:
     print(f"bff: Analyzing signature of '{target_filepath}'...")
 
     try:
-        # Calculate hash of the external file
-        target_hash = hash_file(target_filepath)
+        # Calculate hash of the external file, the way the index would
+        tree_min_size = tree_hash_min_size(load_config())
+        if (
+            tree_min_size is not None
+            and os.path.getsize(target_filepath) >= tree_min_size
+        ):
+            target_hash = hash_tree(target_filepath)[0]
+        else:
+            target_hash = hash_file(target_filepath)
     except Exception as e:
         print(f"Error reading file: {e}")
         return
 
-    index = load_index()
+    with snapshot_lock():
+        index = load_compact_index()
     entry = index.get(target_hash)
 
     if entry:
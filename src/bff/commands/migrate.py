@@ -0,0 +1,47 @@
+import os
+from typing import Optional
+
+from bff.core.constants import BFF_DIR, INDEX_FILE
+from bff.core.index_manager import (
+    index_root,
+    load_compact_index,
+    rebase_paths,
+    relative_path,
+    save_index,
+)
+from bff.core.locking import writer_lock
+
+
+def migrate_command(old_root: Optional[str] = None) -> None:
+    """
+    Rewrites the index with paths relative to the repository root. Indexes
+    written before paths were stored relative hold absolute paths; with
+    old_root, those recorded under it (a repository moved or remounted
+    since) are rebased onto the current root so that they stay cached.
+    """
+    if not os.path.exists(BFF_DIR):
+        print("Error: No bff repository found.")
+        return
+
+    with writer_lock():
+        index = load_compact_index()
+        root = index_root(INDEX_FILE)
+
+        rebased = 0
+        if old_root:
+            rebased = rebase_paths(index, os.path.abspath(old_root), root)
+
+        outside = sum(
+            1
+            for entry in index.values()
+            for path in entry.get("paths", [])
+            if os.path.isabs(relative_path(path, root))
+        )
+
+        save_index(index)
+    print(f"bff: Index migrated to root-relative paths ({len(index)} entries).")
+    if old_root:
+        print(f"bff: Rebased {rebased} paths from {os.path.abspath(old_root)}.")
+    if outside:
+        print(f"bff: {outside} paths lie outside {root} and stay absolute.")
+        print("Tip: Use 'bff migrate --from OLD_ROOT' if the repository was moved.")
@@ -3,6 +3,7 @@ import sys
 
 from bff.core.constants import BFF_DIR
 from bff.core.index_manager import find_repository_root
+from bff.core.locking import snapshot_lock, writer_lock
 
 
 def reset_command(force: bool = False) -> None:
@@ -34,7 +35,9 @@ def reset_command(force: bool = False) -> None:
             return
 
     try:
-        shutil.rmtree(f"{root}/{BFF_DIR}")
+        # Waits for running writers, and for readers loading the index
+        with writer_lock(root), snapshot_lock(root, exclusive=True):
+            shutil.rmtree(f"{root}/{BFF_DIR}")
         print(f"bff: Repository reset. {BFF_DIR}/ has been removed.")
     except OSError as e:
         print(f"Error: Could not remove directory ({e}). Check permissions.")
@@ -0,0 +1,152 @@
+import gzip
+import json
+import os
+import threading
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Optional, Tuple
+
+from bff.core.compact import CompactIndex, Entry
+from bff.core.constants import INDEX_FILE
+from bff.core.index_manager import find_repository_root, load_compact_index
+from bff.core.journal import open_changes
+from bff.core.locking import snapshot_lock
+from bff.core.remote import CONTENT_ENDPOINT, INDEX_ENDPOINT, copy_stream, open_copy
+
+
+class _IndexServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address: Any, root_dir: str, allow_content: bool) -> None:
+        super().__init__(address, _IndexHandler)
+        self.root_dir = root_dir
+        self.allow_content = allow_content
+        # Loaded on the first content request, again once the index is saved
+        self._index: Optional[CompactIndex] = None
+        self._version: Optional[Tuple[int, int]] = None
+        self._index_lock = threading.Lock()
+
+    def entry(self, file_hash: str) -> Optional[Entry]:
+        index_path = os.path.join(self.root_dir, INDEX_FILE)
+        with self._index_lock:
+            try:
+                st = os.stat(index_path)
+            except OSError:
+                return None
+            if (st.st_ino, st.st_mtime_ns) != self._version:
+                with snapshot_lock(self.root_dir):
+                    self._index = load_compact_index(index_path)
+                self._version = (st.st_ino, st.st_mtime_ns)
+            return self._index.get(file_hash) if self._index is not None else None
+
+
+class _IndexHandler(BaseHTTPRequestHandler):
+    """
+    GET /index[?repo=ID&since=SEQ]: see bff.core.remote for the format.
+    GET /content/HASH: the content, from an unchanged copy under the root
+    (only with allow_content).
+    """
+
+    server: _IndexServer
+
+    def do_GET(self) -> None:
+        url = urllib.parse.urlparse(self.path)
+        if url.path.startswith(CONTENT_ENDPOINT):
+            if not self.server.allow_content:
+                self.send_error(
+                    403, "Content serving is off (bff serve --allow-content)"
+                )
+                return
+            self._send_content(urllib.parse.unquote(url.path[len(CONTENT_ENDPOINT) :]))
+            return
+        if url.path != INDEX_ENDPOINT:
+            self.send_error(404)
+            return
+        query = urllib.parse.parse_qs(url.query)
+        repo = query.get("repo", [None])[0]
+        try:
+            since = int(query["since"][0]) if "since" in query else None
+        except ValueError:
+            self.send_error(400, "Invalid since")
+            return
+
+        header, body = open_changes(self.server.root_dir, repo, since)
+        with body:
+            compress = "gzip" in self.headers.get("Accept-Encoding", "")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            if compress:
+                self.send_header("Content-Encoding", "gzip")
+            self.end_headers()
+            # Level 1: indexes compress well anyway, and faster than most links
+            out: Any = (
+                gzip.GzipFile(fileobj=self.wfile, mode="wb", compresslevel=1)
+                if compress
+                else self.wfile
+            )
+            out.write(json.dumps(header).encode() + b"\n")
+            copy_stream(body, out)
+            if compress:
+                out.close()  # Writes the gzip trailer, keeps the socket open
+
+    def _send_content(self, file_hash: str) -> None:
+        entry = self.server.entry(file_hash)
+        try:
+            if entry is None:
+                raise FileNotFoundError
+            f = open_copy(entry, self.server.root_dir)
+        except FileNotFoundError:
+            self.send_error(404)
+            return
+        with f:
+            self.send_response(200)
+            self.send_header("Content-Type", "application/octet-stream")
+            self.send_header("Content-Length", str(os.fstat(f.fileno()).st_size))
+            self.end_headers()
+            # sendfile(2): the content never goes through Python
+            self.wfile.flush()
+            self.connection.sendfile(f)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        print(f"bff: {self.address_string()} {format % args}")
+
+
+def make_server(
+    root_dir: str,
+    host: str = "127.0.0.1",
+    port: int = 0,
+    allow_content: bool = False,
+) -> _IndexServer:
+    """An index server for root_dir (port 0 picks a free port)."""
+    return _IndexServer((host, port), root_dir, allow_content)
+
+
+def serve_command(
+    host: str = "127.0.0.1", port: int = 8765, allow_content: bool = False
+) -> None:
+    """
+    Serves the repository index over HTTP, read-only, for 'bff diff' on
+    other machines. Clients get the journal records they miss, or the whole
+    index when they have none. With allow_content, file contents are served
+    too, for 'bff sync http://host:port'.
+    """
+    root_dir: Optional[str] = find_repository_root()
+    if not root_dir:
+        print("Error: No .bff repository found. Run 'init' inside the project.")
+        return
+
+    server = make_server(root_dir, host, port, allow_content)
+    print(f"bff: Serving the index of {root_dir} on http://{host}:{server.server_port}")
+    if allow_content:
+        print(
+            "bff: Warning: anyone who can reach this address can read the file "
+            "list and download the contents of every indexed file."
+        )
+    else:
+        print("bff: Anyone who can reach this address can read the file list.")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nbff: Server stopped.")
+    finally:
+        server.server_close()
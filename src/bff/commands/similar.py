@@ -0,0 +1,83 @@
+import os
+from typing import Any, Dict, List, Mapping, Set, Tuple
+
+from bff.commands.stats import _format_size
+from bff.core.constants import BFF_DIR, SIMILARITY_FILE
+from bff.core.index_manager import load_compact_index, load_index
+from bff.core.locking import snapshot_lock
+from bff.core.similarity import (
+    BKTree,
+    cluster_pairs,
+    estimate_jaccard,
+    lsh_pairs,
+)
+
+
+def find_similar_clusters(
+    index: Mapping[str, Any],
+    similarity: Dict[str, Any],
+    threshold: float = 0.5,
+    max_distance: int = 10,
+) -> List[Set[str]]:
+    """Groups index hashes whose signatures are close enough."""
+    pairs: Set[Tuple[str, str]] = set()
+
+    images = {
+        h: int(value, 16)
+        for h, value in similarity.get("images", {}).items()
+        if h in index
+    }
+    tree: BKTree[str] = BKTree()
+    for file_hash, value in images.items():
+        tree.add(value, file_hash)
+    for file_hash, value in images.items():
+        for _, other in tree.search(value, max_distance):
+            if other != file_hash:
+                pairs.add((min(file_hash, other), max(file_hash, other)))
+
+    sketches = {
+        h: sketch for h, sketch in similarity.get("sketches", {}).items() if h in index
+    }
+    for a, b in lsh_pairs(sketches):
+        if estimate_jaccard(sketches[a], sketches[b]) >= threshold:
+            pairs.add((a, b))
+
+    return cluster_pairs(pairs)
+
+
+def _reclaimable(index: Mapping[str, Any], cluster: Set[str]) -> int:
+    """Keeping only the largest member frees the size of all the others."""
+    sizes = [index[h].get("size", 0) for h in cluster]
+    return sum(sizes) - max(sizes)
+
+
+def similar_command(threshold: float = 0.5, max_distance: int = 10) -> None:
+    if not os.path.exists(BFF_DIR):
+        print("Error: No bff repository found.")
+        return
+
+    with snapshot_lock():
+        similarity = load_index(SIMILARITY_FILE)
+        index = load_compact_index()
+    if not similarity:
+        print("bff: No similarity data. Run 'bff index --similarity' first.")
+        return
+    clusters = find_similar_clusters(index, similarity, threshold, max_distance)
+    clusters.sort(key=lambda c: _reclaimable(index, c), reverse=True)
+
+    if not clusters:
+        print("bff: No near-duplicates found.")
+        return
+
+    total = 0
+    print(f"bff: Found {len(clusters)} near-duplicate clusters.")
+    for n, cluster in enumerate(clusters, start=1):
+        freed = _reclaimable(index, cluster)
+        total += freed
+        print(f"\n[{n}] {len(cluster)} files, {_format_size(freed)} reclaimable")
+        for file_hash in sorted(cluster, key=lambda h: -index[h].get("size", 0)):
+            entry = index[file_hash]
+            print(f" - {entry['paths'][0]} ({_format_size(entry.get('size', 0))})")
+
+    print("-" * 30)
+    print(f"Near-duplicate reclaimable: {_format_size(total)}")
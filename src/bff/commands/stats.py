@@ -1,7 +1,10 @@
 import os
+from typing import Any, Dict, Mapping, Optional, Tuple
 
-from bff.core.constants import BFF_DIR
-from bff.core.index_manager import load_index
+from bff.core.constants import BFF_DIR, CHUNKS_FILE
+from bff.core.filtering import IndexFilters, select
+from bff.core.index_manager import disk_copies, load_compact_index, load_index
+from bff.core.locking import snapshot_lock
 
 
 def _format_size(size_bytes: int) -> str:
@@ -14,39 +17,100 @@ def _format_size(size_bytes: int) -> str:
     return f"{size_bytes_f:.2f} TB"
 
 
-def stats_command() -> None:
+def _chunk_savings(
+    index: Mapping[str, Any], chunk_index: Dict[str, Any]
+) -> Tuple[int, int, int]:
+    """
+    Returns (on-disk bytes, unique chunk bytes, chunked contents) over the
+    index entries that have a chunk list.
+    """
+    files = chunk_index.get("files", {})
+    logical_size = 0
+    unique_chunks: Dict[str, int] = {}
+    chunked = 0
+    for file_hash, data in index.items():
+        chunks = files.get(file_hash)
+        if chunks is None:
+            continue
+        chunked += 1
+        logical_size += data.get("size", 0) * len(disk_copies(data))
+        for digest, length in chunks:
+            unique_chunks[digest] = length
+    return logical_size, sum(unique_chunks.values()), chunked
+
+
+def stats_command(filters: Optional[IndexFilters] = None) -> None:
+    """
+    Prints repository statistics. With filters, only the matching paths
+    count, evaluated against the index alone: a matching copy is
+    reclaimable unless it is the master (or a hardlink to it), whether
+    the master matches or not.
+    """
     if not os.path.exists(BFF_DIR):
         print("Error: No bff repository found.")
         return
 
-    index = load_index()
+    # Both files as of the same moment, even while 'index' is running
+    with snapshot_lock():
+        index = load_compact_index()
+        chunk_index = load_index(CHUNKS_FILE)
 
     total_files = 0
-    unique_files = len(index)
+    unique_files = 0
+    logical_size = 0
     total_size = 0
     wasted_size = 0
     duplicate_count = 0
+    hardlink_count = 0
+    selected: Dict[str, Any] = {}
 
-    for _, data in index.items():
-        paths = data.get("paths", [])
-        count = len(paths)
-        size = data.get("size", 0)
+    for file_hash, data, positions in select(index, filters):
+        unique_files += 1
+        if filters is not None:
+            selected[file_hash] = data
+        count_paths = (
+            len(data.get("paths", [])) if positions is None else len(positions)
+        )
+        # Hardlinks share one copy on disk: deleting them frees nothing.
+        # Copies are weighed by allocated blocks, so sparse files count
+        # for what they really occupy. Wasted space = every copy but the
+        # master.
+        if positions is None or positions[0] == 0:
+            copies = disk_copies(data, positions)
+            wasted = copies[1:]
+        else:
+            # Hardlinks to the master merge into its copy, then it is left out
+            copies = disk_copies(data, [0] + positions)[1:]
+            wasted = copies
+        count = len(copies)
 
-        total_files += count
-        total_size += count * size
+        total_files += count_paths
+        hardlink_count += count_paths - count
+        logical_size += count * data.get("size", 0)
+        total_size += sum(copies)
 
-        if count > 1:
-            # Wasted space = size * (number of copies - 1 master)
-            wasted_size += size * (count - 1)
-            duplicate_count += count - 1
+        if wasted:
+            wasted_size += sum(wasted)
+            duplicate_count += len(wasted)
 
     print("-" * 30)
     print("BFF REPOSITORY STATISTICS")
     print("-" * 30)
     print(f"Unique Content : {unique_files}")
     print(f"Total Files    : {total_files}")
+    print(f"Logical Size   : {_format_size(logical_size)}")
     print(f"Total Size     : {_format_size(total_size)}")
     print("-" * 30)
+    print(f"Hardlinks      : {hardlink_count}")
     print(f"Duplicates     : {duplicate_count}")
     print(f"Reclaimable    : {_format_size(wasted_size)}")
     print("-" * 30)
+
+    if chunk_index.get("files"):
+        logical_size, unique_size, chunked = _chunk_savings(
+            index if filters is None else selected, chunk_index
+        )
+        print(f"Chunked        : {chunked}/{unique_files} contents")
+        print(f"Unique Blocks  : {_format_size(unique_size)}")
+        print(f"Block Reclaim  : {_format_size(logical_size - unique_size)}")
+        print("-" * 30)
@@ -0,0 +1,351 @@
+import os
+import shutil
+import stat
+import sys
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import IO, Any, Dict, List, Mapping, Optional, Set, Tuple
+
+from tqdm import tqdm  # type: ignore[import-untyped]
+
+try:
+    import fcntl
+except ImportError:  # Windows: no reflinks
+    fcntl = None  # type: ignore[assignment]
+
+from bff.commands.diff import _resolve_index_path
+from bff.commands.index import _inode_record
+from bff.core.compact import CompactIndex
+from bff.core.constants import BFF_DIR
+from bff.core.filtering import IndexFilters, select
+from bff.core.index_manager import (
+    find_repository_root,
+    index_root,
+    load_compact_index,
+    path_records,
+    relative_path,
+    save_index,
+    set_entry_paths,
+)
+from bff.core.locking import snapshot_lock, writer_lock
+from bff.core.remote import FileTransport, Transport, is_remote, pull
+
+# Linux ioctl cloning a whole file (btrfs, XFS, bcachefs...)
+_FICLONE = 0x40049409
+_COPY_CHUNK = 64 * 1024 * 1024
+_BUFFER_SIZE = 1024 * 1024
+
+# (destination path, mtime in ns to restore)
+Destination = Tuple[str, int]
+# (path, inode record) of the copies of a content already indexed here
+LocalCopies = List[Tuple[str, Optional[List[int]]]]
+
+
+def _reflink(source: str, dest: str) -> bool:
+    """Clones source into a new dest, sharing its blocks. False if unsupported."""
+    if fcntl is None:
+        return False
+    with open(source, "rb") as src, open(dest, "xb") as dst:
+        try:
+            fcntl.ioctl(dst.fileno(), _FICLONE, src.fileno())
+            return True
+        except OSError:
+            pass
+    os.remove(dest)
+    return False
+
+
+def _copy_stream(source: IO[bytes], out: IO[bytes]) -> None:
+    """
+    Copies with copy_file_range(2) between regular files (in the kernel,
+    possibly sharing blocks), with large buffers otherwise.
+    """
+    if hasattr(os, "copy_file_range"):
+        try:
+            in_fd = source.fileno()
+            regular = stat.S_ISREG(os.fstat(in_fd).st_mode)
+        except (OSError, ValueError, AttributeError):
+            # Not backed by a file descriptor
+            regular = False
+        if regular:
+            try:
+                while os.copy_file_range(in_fd, out.fileno(), _COPY_CHUNK):
+                    pass
+                return
+            except OSError:
+                # Cross-device on old kernels, unsupported filesystem...
+                pass
+    shutil.copyfileobj(source, out, _BUFFER_SIZE)
+
+
+def _link_local(source: str, dest: str, link_mode: str) -> None:
+    """Gives dest the content of source without fetching it again."""
+    if link_mode != "copy" and _reflink(source, dest):
+        return
+    if link_mode == "auto":
+        try:
+            os.link(source, dest)
+            return
+        except OSError:
+            pass
+    with open(source, "rb") as src, open(dest, "xb") as dst:
+        _copy_stream(src, dst)
+
+
+def _place(partial: str, dest: str) -> None:
+    """Moves a finished transfer into place, never over an existing file."""
+    try:
+        os.link(partial, dest)
+    except FileExistsError:
+        raise
+    except OSError:
+        # No hardlinks on this filesystem
+        if os.path.lexists(dest):
+            raise FileExistsError(f"{dest} already exists") from None
+        os.replace(partial, dest)
+
+
+def _local_copy(copies: LocalCopies, size: Any) -> Optional[Tuple[str, int]]:
+    """(path, mtime_ns) of a local copy still matching the index, if any."""
+    for path, record in copies:
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        if st.st_size == size and (record is None or st.st_mtime_ns == record[2]):
+            return path, st.st_mtime_ns
+    return None
+
+
+def _fetch(
+    transport: Transport,
+    file_hash: str,
+    entry: Mapping[str, Any],
+    destinations: List[Destination],
+    link_mode: str,
+    local: Optional[LocalCopies] = None,
+) -> Tuple[List[Tuple[str, os.stat_result]], bool, Optional[OSError]]:
+    """
+    Transfers one content to its first destination, then links or copies
+    it locally to the others. A content with an unchanged local copy is
+    not transferred: every destination is made from that copy, and keeps
+    its mtime (a hardlink shares it anyway). Returns the (path, stat) of
+    the files made, whether the content was transferred, and the error
+    that stopped it early, if any: the files already made stay, to be
+    recorded.
+    """
+    first = destinations[0][0]
+    os.makedirs(os.path.dirname(first), exist_ok=True)
+    source = _local_copy(local, entry.get("size")) if local else None
+    if source is not None:
+        _link_local(source[0], first, link_mode)
+        destinations = [(dest, source[1]) for dest, _ in destinations]
+    else:
+        _transfer(transport, file_hash, entry, first)
+
+    done = destinations[:1]
+    error = None
+    for dest, mtime_ns in destinations[1:]:
+        try:
+            os.makedirs(os.path.dirname(dest), exist_ok=True)
+            _link_local(first, dest, link_mode)
+        except OSError as e:
+            error = e
+            break
+        done.append((dest, mtime_ns))
+    # Hardlinks share their mtime: restore them all before stat-ing any
+    for dest, mtime_ns in done:
+        os.utime(dest, ns=(mtime_ns, mtime_ns))
+    return [(dest, os.stat(dest)) for dest, _ in done], source is None, error
+
+
+def _transfer(
+    transport: Transport, file_hash: str, entry: Mapping[str, Any], dest: str
+) -> None:
+    """Downloads one content to dest, through a partial file next to it."""
+    partial = os.path.join(
+        os.path.dirname(dest), f".{os.path.basename(dest)}.bff-partial"
+    )
+    try:
+        with transport.open_content(file_hash, entry) as source:
+            with open(partial, "wb") as out:
+                _copy_stream(source, out)
+        if os.path.getsize(partial) != entry.get("size"):
+            raise OSError(f"Truncated transfer of {file_hash[:8]}")
+        _place(partial, dest)
+    finally:
+        if os.path.exists(partial):
+            os.remove(partial)
+
+
+def _load_target(target: str) -> Tuple[CompactIndex, Transport]:
+    """The target index (pulled if remote) and a transport for its contents."""
+    if is_remote(target):
+        print(f"bff: Pulling remote index from '{target}'...")
+        index, transport = pull(target)
+        print(f"bff: Received {transport.received / 1024:.1f} KB.")
+        return index, transport
+    index_path = _resolve_index_path(target)
+    print(f"bff: Loading remote index from '{index_path}'...")
+    root = index_root(index_path)
+    with snapshot_lock(root):
+        index = load_compact_index(index_path)
+    return index, FileTransport("file://" + urllib.request.pathname2url(root))
+
+
+def _plan(
+    index: Mapping[str, Any],
+    remote_index: CompactIndex,
+    filters: Optional[IndexFilters],
+    root_dir: str,
+) -> Tuple[Dict[str, List[Destination]], Dict[str, LocalCopies], Dict[str, int]]:
+    """
+    Destinations of every path of the target missing locally, at the same
+    paths relative to the root, and the local copies of the contents that
+    are already indexed here under other paths. Paths outside the target
+    root, or already taken locally, are skipped.
+    """
+    remote_root = remote_index.table.root or ""
+    root_prefix = os.path.join(root_dir, "")
+    plan: Dict[str, List[Destination]] = {}
+    local: Dict[str, LocalCopies] = {}
+    claimed: Set[str] = set()
+    skipped = {"outside": 0, "existing": 0}
+    for file_hash, entry, positions in select(remote_index, filters):
+        pairs = path_records(entry)
+        if positions is not None:
+            pairs = [pairs[i] for i in positions]
+        destinations = []
+        for path, record in pairs:
+            rel = relative_path(path, remote_root)
+            dest = os.path.normpath(os.path.join(root_dir, rel))
+            if os.path.isabs(rel) or not dest.startswith(root_prefix):
+                skipped["outside"] += 1
+            elif dest in claimed or os.path.lexists(dest):
+                skipped["existing"] += 1
+            else:
+                claimed.add(dest)
+                mtime_ns = record[2] if record else int(entry.get("mtime", 0) * 1e9)
+                destinations.append((dest, mtime_ns))
+        if destinations:
+            plan[file_hash] = destinations
+            if file_hash in index:
+                local[file_hash] = path_records(index[file_hash])
+    return plan, local, skipped
+
+
+def _record(
+    index: CompactIndex,
+    file_hash: str,
+    entry: Mapping[str, Any],
+    made: List[Tuple[str, os.stat_result]],
+) -> None:
+    """
+    Adds a fetched content to the local index under the target's hash, or
+    its new paths if it was indexed here meanwhile.
+    """
+    existing = index.get(file_hash)
+    if existing is not None:
+        paths = list(existing["paths"])
+        new = [(path, st) for path, st in made if path not in paths]
+        set_entry_paths(existing, paths + [path for path, _ in new])
+        for path, st in new:
+            existing["inodes"][path] = _inode_record(st)
+        return
+    # size, mimetype, sample, tree leaves... describe the content itself
+    data = {k: v for k, v in entry.items() if k not in ("paths", "inodes")}
+    first_stat = made[0][1]
+    data["created_at"] = first_stat.st_ctime
+    data["mtime"] = first_stat.st_mtime
+    data["paths"] = [path for path, _ in made]
+    data["inodes"] = {path: _inode_record(st) for path, st in made}
+    index[file_hash] = data
+
+
+def sync_command(
+    target: str,
+    link_mode: str = "auto",
+    jobs: int = 4,
+    filters: Optional[IndexFilters] = None,
+) -> None:
+    """
+    Copies the files present in the target repository but missing
+    locally, to the same relative paths. Each content is transferred once,
+    or not at all when an unchanged copy is already indexed here; its
+    other paths get it from that copy (a reflink, else a hardlink with
+    link_mode "auto", a local copy with "copy"). The local index records
+    the target's hashes: nothing is hashed again.
+    """
+    root_dir = find_repository_root()
+    if not root_dir:
+        print("Error: No .bff repository found. Run 'init' inside the project.")
+        return
+
+    try:
+        remote_index, transport = _load_target(target)
+    except (OSError, ValueError) as e:
+        print(f"Error: Could not read '{target}' ({e}).")
+        sys.exit(1)
+
+    index_file_path = os.path.join(root_dir, BFF_DIR, "index.json")
+    with snapshot_lock(root_dir):
+        local_index = load_compact_index(index_file_path)
+    plan, local, skipped = _plan(local_index, remote_index, filters, root_dir)
+    del local_index
+    total = sum(remote_index[h].get("size", 0) for h in plan if h not in local)
+    print(
+        f"bff: {len(plan) - len(local)} contents to fetch "
+        f"({total / (1024 * 1024):.2f} MB), {len(local)} already here."
+    )
+
+    # Transfers run unlocked: files are only ever created, never replaced
+    results: Dict[str, List[Tuple[str, os.stat_result]]] = {}
+    fetched = linked = failed = 0
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as executor:
+        futures = {
+            executor.submit(
+                _fetch,
+                transport,
+                h,
+                remote_index[h],
+                plan[h],
+                link_mode,
+                local.get(h),
+            ): h
+            for h in plan
+        }
+        with tqdm(total=total, unit="B", unit_scale=True, desc="Syncing") as pbar:
+            for future in as_completed(futures):
+                file_hash = futures[future]
+                if file_hash not in local:
+                    pbar.update(remote_index[file_hash].get("size", 0))
+                try:
+                    made, transferred, error = future.result()
+                except OSError as e:
+                    made, transferred, error = [], False, e
+                if error is not None:
+                    print(f"Error fetching {file_hash[:8]}: {error}")
+                    failed += 1
+                if not made:
+                    continue
+                results[file_hash] = made
+                if transferred:
+                    fetched += 1
+                linked += len(made) - transferred
+
+    if results:
+        with writer_lock(root_dir):
+            index = load_compact_index(index_file_path)
+            for file_hash, made in results.items():
+                _record(index, file_hash, remote_index[file_hash], made)
+            save_index(index, index_file_path)
+
+    print("-" * 40)
+    print("bff: Sync complete.")
+    print(f" - Fetched   : {fetched} (Contents transferred once)")
+    print(f" - Linked    : {linked} (Extra paths, made locally)")
+    print(f" - Existing  : {skipped['existing']} (Paths already taken, skipped)")
+    if skipped["outside"]:
+        print(f" - Outside   : {skipped['outside']} (Paths outside the target root)")
+    if failed:
+        print(f" - Failed    : {failed}")
@@ -1,16 +1,25 @@
 import os
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from typing import Tuple
+from typing import List, Optional, Tuple
 
 from tqdm import tqdm
 
-from bff.core.hash import hash_file
-from bff.core.index_manager import load_index
+from bff.core.hash import corrupt_ranges, hash_file, hash_tree, is_tree_hash
+from bff.core.index_manager import load_compact_index
+from bff.core.locking import snapshot_lock
+from bff.core.scheduler import Location, run_by_device
 
 
-def _verify_file(stored_hash: str, filepath: str) -> Tuple[str, str, str]:
+def _format_ranges(ranges: List[Tuple[int, int]], size: int) -> str:
+    return ", ".join(f"bytes {start}-{min(end, size)}" for start, end in ranges)
+
+
+def _verify_file(
+    stored_hash: str, filepath: str, leaves: Optional[List[str]] = None
+) -> Tuple[str, str, str]:
     """
     Worker function to verify a single file.
+    Tree-hashed contents are checked chunk by chunk, so that a mismatch can
+    be narrowed down to byte ranges when the stored leaves are known.
     Returns tuple: (status, filepath, message)
     Status codes: 'OK', 'CORRUPT', 'MISSING', 'ERROR'
     """
@@ -18,13 +27,22 @@ def _verify_file(stored_hash: str, filepath: str) -> Tuple[str, str, str]:
         return "MISSING", filepath, "File not found"
 
     try:
-        current_hash = hash_file(filepath)
+        current_leaves: List[str] = []
+        if is_tree_hash(stored_hash):
+            current_hash, current_leaves = hash_tree(filepath)
+        else:
+            current_hash = hash_file(filepath)
+
         if current_hash != stored_hash:
-            return (
-                "CORRUPT",
-                filepath,
-                f"Hash mismatch. Expected {stored_hash[:8]}, got {current_hash[:8]}",
-            )
+            # Tree keys carry an algorithm tag before the digest
+            expected = stored_hash.rsplit(":", 1)[-1]
+            got = current_hash.rsplit(":", 1)[-1]
+            msg = f"Hash mismatch. Expected {expected[:8]}, got {got[:8]}"
+            if leaves and current_leaves:
+                ranges = corrupt_ranges(leaves, current_leaves)
+                size = os.path.getsize(filepath)
+                msg += f"; differs in {_format_ranges(ranges, size)}"
+            return "CORRUPT", filepath, msg
         return "OK", filepath, ""
     except Exception as e:
         return "ERROR", filepath, str(e)
@@ -32,17 +50,21 @@ def _verify_file(stored_hash: str, filepath: str) -> Tuple[str, str, str]:
 
 def verify_command() -> None:
     print("bff: Loading index for integrity check...")
-    index = load_index()
+    with snapshot_lock():
+        index = load_compact_index()
 
     if not index:
         print("bff: Index is empty or missing.")
         return
 
-    # Prepare tasks
-    tasks = []
+    # Prepare tasks, located by their recorded inode (no stat needed)
+    tasks: List[Tuple[Tuple[str, str], Location]] = []
     for stored_hash, entry in index.items():
+        inodes = entry.get("inodes", {})
         for path in entry.get("paths", []):
-            tasks.append((stored_hash, path))
+            record = inodes.get(path)
+            location = (record[0], record[1]) if record else None
+            tasks.append(((stored_hash, path), location))
 
     total_files = len(tasks)
     print(f"bff: Verifying {total_files} files against stored signatures...")
@@ -51,24 +73,25 @@ def verify_command() -> None:
     missing_files = []
     errors = []
 
-    # Use CPU count + 4 for I/O bound tasks
-    max_workers = min(32, (os.cpu_count() or 1) + 4)
+    with tqdm(total=total_files, unit="file", desc="Verifying") as pbar:
 
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        futures = {executor.submit(_verify_file, h, p): p for h, p in tasks}
+        def on_done(task: Tuple[str, str], result: Tuple[str, str, str]) -> None:
+            status, filepath, msg = result
 
-        with tqdm(total=total_files, unit="file", desc="Verifying") as pbar:
-            for future in as_completed(futures):
-                status, filepath, msg = future.result()
+            if status == "CORRUPT":
+                corrupted_files.append((filepath, msg))
+            elif status == "MISSING":
+                missing_files.append(filepath)
+            elif status == "ERROR":
+                errors.append((filepath, msg))
 
-                if status == "CORRUPT":
-                    corrupted_files.append((filepath, msg))
-                elif status == "MISSING":
-                    missing_files.append(filepath)
-                elif status == "ERROR":
-                    errors.append((filepath, msg))
+            pbar.update(1)
 
-                pbar.update(1)
+        run_by_device(
+            tasks,
+            lambda task: _verify_file(*task, index[task[0]].get("leaves")),
+            on_done,
+        )
 
     print("\n" + "-" * 40)
     print("INTEGRITY CHECK REPORT")
@@ -0,0 +1,235 @@
+import os
+import time
+from typing import Any, Dict, MutableMapping, Optional, Set, Tuple
+
+from bff.commands.index import (
+    InodeKey,
+    _build_inode_seed,
+    _build_path_cache,
+    _hash_and_record,
+    _InodeHashes,
+    _is_cached,
+    _remove_path,
+    index_command,
+)
+from bff.core import inotify
+from bff.core.constants import BFF_DIR, IGNORED_DIRS
+from bff.core.filtering import IndexFilters, should_index
+from bff.core.index_manager import (
+    find_repository_root,
+    load_config,
+    load_compact_index,
+    path_records,
+    save_index,
+    tree_hash_min_size,
+)
+from bff.core.locking import writer_lock
+
+# Upper bound on how long a busy tree can postpone a flush, as a multiple
+# of the debounce delay.
+_MAX_DELAY_FACTOR = 10
+
+
+def _build_path_hashes(index: MutableMapping[str, Any]) -> Dict[str, str]:
+    """Build lookup map: Path -> Hash."""
+    return {p: h for h, entry in index.items() for p in entry.get("paths", [])}
+
+
+def _index_version(index_file_path: str) -> Optional[Tuple[int, int]]:
+    """Identifies a saved index: every save replaces the file."""
+    try:
+        st = os.stat(index_file_path)
+    except OSError:
+        return None
+    return st.st_ino, st.st_mtime_ns
+
+
+def _collect_batch(watcher: inotify.RecursiveWatcher, debounce: float) -> Set[str]:
+    """
+    Blocks until events arrive, then keeps coalescing them until the tree
+    has been quiet for `debounce` seconds (or the maximum delay is reached).
+    """
+    changed = watcher.poll(None)
+    deadline = time.monotonic() + debounce * _MAX_DELAY_FACTOR
+    while time.monotonic() < deadline:
+        more = watcher.poll(debounce)
+        if not more and not watcher.overflowed:
+            break
+        changed |= more
+    return changed
+
+
+def _gone(abs_path: str) -> bool:
+    return not os.path.isfile(abs_path) and not os.path.isdir(abs_path)
+
+
+def _vanished_inodes(
+    index: MutableMapping[str, Any], changed: Set[str], path_hashes: Dict[str, str]
+) -> Dict[InodeKey, str]:
+    """
+    Inode versions of the indexed paths among changed (or beneath them)
+    that are gone: files found elsewhere with one of them were moved.
+    """
+    vanished = set()
+    for path in changed:
+        abs_path = os.path.abspath(path)
+        if not _gone(abs_path):
+            continue
+        if abs_path in path_hashes:
+            vanished.add(abs_path)
+            continue
+        prefix = abs_path + os.sep
+        vanished.update(p for p in path_hashes if p.startswith(prefix))
+
+    moves = {}
+    for path in vanished:
+        file_hash = path_hashes[path]
+        entry = index.get(file_hash)
+        if entry is None:
+            continue
+        for p, record in path_records(entry):
+            if p == path and record is not None:
+                dev, ino, mtime_ns = record[:3]
+                moves[(dev, ino, entry.get("size", 0), mtime_ns)] = file_hash
+    return moves
+
+
+def _apply_changes(
+    index: MutableMapping[str, Any],
+    changed: Set[str],
+    filters: IndexFilters,
+    path_hashes: Dict[str, str],
+    path_cache: Dict[str, Tuple[float, int]],
+    tree_min_size: Optional[int] = None,
+    inode_hashes: Optional[_InodeHashes] = None,
+) -> Dict[str, int]:
+    """
+    Re-indexes only the given paths. Directories that disappeared take
+    every indexed path beneath them out of the index. With inode_hashes,
+    as in 'bff index', hardlinks to known inodes and files moved within
+    the batch keep their hash without being read.
+    """
+    counts = {"indexed": 0, "removed": 0}
+    if inode_hashes is not None:
+        inode_hashes.expect_moves(_vanished_inodes(index, changed, path_hashes))
+    bff_prefix = os.sep + BFF_DIR + os.sep
+
+    for path in sorted(changed):
+        abs_path = os.path.abspath(path)
+        if bff_prefix in abs_path + os.sep:
+            continue
+
+        if _gone(abs_path):
+            # Deleted or moved away: may be a file or a whole directory
+            prefix = abs_path + os.sep
+            stale = [p for p in path_hashes if p == abs_path or p.startswith(prefix)]
+            for p in stale:
+                _remove_path(index, path_hashes.pop(p), p)
+                path_cache.pop(p, None)
+                counts["removed"] += 1
+            continue
+
+        if os.path.isdir(abs_path):
+            # Its files are reported individually by the watcher
+            continue
+
+        old_hash = path_hashes.get(abs_path)
+        try:
+            if should_index(abs_path, filters):
+                stat = os.stat(abs_path)
+                if old_hash is not None and _is_cached(abs_path, stat, path_cache):
+                    continue
+                if old_hash is not None:
+                    _remove_path(index, old_hash, abs_path)
+                path_hashes[abs_path] = _hash_and_record(
+                    abs_path, index, stat, inode_hashes, tree_min_size
+                )
+                path_cache[abs_path] = (stat.st_mtime, stat.st_size)
+                counts["indexed"] += 1
+                continue
+        except OSError:
+            # Vanished or unreadable while we looked at it: drop it below
+            pass
+
+        if abs_path in path_hashes:
+            _remove_path(index, path_hashes.pop(abs_path), abs_path)
+            path_cache.pop(abs_path, None)
+            counts["removed"] += 1
+
+    return counts
+
+
+def watch_command(filters: IndexFilters, debounce: float = 1.0) -> None:
+    """
+    Keeps the index up to date from filesystem events. Starts with a normal
+    scan so that changes made while no watcher was running are reconciled.
+    """
+    root_dir = find_repository_root()
+    if not root_dir:
+        print("Error: No .bff repository found. Run 'init' inside the project.")
+        return
+
+    if not inotify.is_supported():
+        print("Error: 'watch' requires inotify (Linux only).")
+        return
+
+    # Watches go in before the scan so nothing slips between the two.
+    try:
+        watcher = inotify.RecursiveWatcher(root_dir, IGNORED_DIRS)
+    except OSError as e:
+        print(f"Error: Could not watch {root_dir} ({e}).")
+        print("Tip: Raise fs.inotify.max_user_watches for very large trees.")
+        return
+
+    index_file_path = os.path.join(root_dir, BFF_DIR, "index.json")
+    tree_min_size = tree_hash_min_size(load_config(root_dir))
+
+    def load() -> Tuple[Any, Dict[str, str], Dict[str, Any], _InodeHashes]:
+        index = load_compact_index(index_file_path)
+        inode_hashes = _InodeHashes(_build_inode_seed(index), tree_min_size)
+        return index, _build_path_hashes(index), _build_path_cache(index), inode_hashes
+
+    try:
+        index_command(filters)
+        version = _index_version(index_file_path)
+        index, path_hashes, path_cache, inode_hashes = load()
+        print(f"bff: Watching {root_dir} (Ctrl+C to stop)...")
+
+        while True:
+            changed = _collect_batch(watcher, debounce)
+
+            if watcher.overflowed:
+                print("bff: Event queue overflowed, falling back to a full scan...")
+                watcher.overflowed = False
+                index_command(filters)
+                version = _index_version(index_file_path)
+                index, path_hashes, path_cache, inode_hashes = load()
+                continue
+
+            # The lock is only held per batch, so that other commands
+            # (a scheduled 'clean', say) can write in between
+            with writer_lock(root_dir):
+                if _index_version(index_file_path) != version:
+                    # Another process saved the index: start from its version
+                    index, path_hashes, path_cache, inode_hashes = load()
+                counts = _apply_changes(
+                    index,
+                    changed,
+                    filters,
+                    path_hashes,
+                    path_cache,
+                    tree_min_size,
+                    inode_hashes,
+                )
+                if counts["indexed"] or counts["removed"]:
+                    save_index(index, index_file_path)
+                version = _index_version(index_file_path)
+            if counts["indexed"] or counts["removed"]:
+                print(
+                    f"bff: Updated index ({counts['indexed']} indexed, "
+                    f"{counts['removed']} removed)."
+                )
+    except KeyboardInterrupt:
+        print("\nbff: Watch stopped.")
+    finally:
+        watcher.close()
@@ -0,0 +1,201 @@
+"""
+Content-defined chunking (FastCDC-style) for block-level deduplication.
+
+Boundaries come from a 64-byte gear hash with normalized chunking: a
+stricter mask before the average chunk size, a looser one after it, and
+hard minimum/maximum sizes. Since the hash only depends on the last 64
+bytes, an insertion shifts boundaries locally and the following chunks
+keep their digests.
+
+Files are streamed through a bounded buffer (read size + max chunk size).
+When numpy is installed, boundary candidates are found with a vectorized
+windowed hash; otherwise a pure Python loop produces the same cuts.
+"""
+
+import hashlib
+from typing import Any, Iterator, List, NamedTuple, Optional, Tuple
+
+from bff.core import metrics
+
+try:
+    import numpy as np  # type: ignore[import-not-found]
+except ImportError:  # Optional dependency: pip install bff[chunking]
+    np = None
+
+_MASK64 = (1 << 64) - 1
+_WINDOW = 64
+_READ_SIZE = 4 * 1024 * 1024
+
+GEAR = [
+    int.from_bytes(hashlib.sha256(b"bff-gear-%d" % i).digest()[:8], "little")
+    for i in range(256)
+]
+_GEAR_NP = np.array(GEAR, dtype=np.uint64) if np is not None else None
+
+
+class ChunkParams(NamedTuple):
+    """Chunk size bounds. avg_size must be a power of two."""
+
+    min_size: int = 16 * 1024
+    avg_size: int = 64 * 1024
+    max_size: int = 256 * 1024
+
+    def masks(self) -> Tuple[int, int]:
+        """(small-chunk mask, large-chunk mask), keeping the top hash bits."""
+        bits = self.avg_size.bit_length() - 1
+        mask_s = ((1 << (bits + 2)) - 1) << (64 - bits - 2)
+        mask_l = ((1 << (bits - 2)) - 1) << (64 - bits + 2)
+        return mask_s, mask_l
+
+    def validate(self) -> None:
+        if self.min_size < _WINDOW:
+            raise ValueError(f"min_size must be at least {_WINDOW} bytes")
+        if self.avg_size & (self.avg_size - 1):
+            raise ValueError("avg_size must be a power of two")
+        if not self.min_size < self.avg_size < self.max_size:
+            raise ValueError("chunk sizes must satisfy min < avg < max")
+
+
+DEFAULT_PARAMS = ChunkParams()
+
+
+def _find_cut(buf: bytes, start: int, params: ChunkParams, eof: bool) -> Optional[int]:
+    """
+    Pure Python boundary search. Returns the end offset of the chunk that
+    starts at `start`, or None when more data is needed to decide.
+    """
+    end = len(buf)
+    if end - start <= params.min_size:
+        return end if eof else None
+
+    mask_s, mask_l = params.masks()
+    gear = GEAR
+    max_end = start + params.max_size
+    limit = min(end, max_end)
+    small_end = min(start + params.avg_size - 1, limit)
+
+    # Prime the window so the first candidate sees exactly 64 bytes
+    h = 0
+    j = start + params.min_size - _WINDOW
+    check_from = start + params.min_size - 1
+    while j < check_from:
+        h = ((h << 1) + gear[buf[j]]) & _MASK64
+        j += 1
+
+    while j < small_end:
+        h = ((h << 1) + gear[buf[j]]) & _MASK64
+        if not h & mask_s:
+            return j + 1
+        j += 1
+    while j < limit:
+        h = ((h << 1) + gear[buf[j]]) & _MASK64
+        if not h & mask_l:
+            return j + 1
+        j += 1
+
+    if limit == max_end:
+        return max_end
+    return end if eof else None
+
+
+def _find_cuts_python(buf: bytes, params: ChunkParams, eof: bool) -> List[int]:
+    cuts = []
+    start = 0
+    while start < len(buf):
+        cut = _find_cut(buf, start, params, eof)
+        if cut is None:
+            break
+        cuts.append(cut)
+        start = cut
+    return cuts
+
+
+def _find_cuts_numpy(buf: bytes, params: ChunkParams, eof: bool) -> List[int]:
+    """Vectorized equivalent of _find_cuts_python."""
+    assert np is not None and _GEAR_NP is not None
+    size = len(buf)
+    if not size:
+        return []
+
+    # Windowed gear hash by doubling: h[i] = sum_k gear[b[i-k]] << k, k < 64
+    h = np.take(_GEAR_NP, np.frombuffer(buf, dtype=np.uint8))
+    shift = 1
+    while shift < _WINDOW:
+        # The shifted operand is materialized before the in-place add
+        h[shift:] += h[:-shift] << np.uint64(shift)
+        shift *= 2
+
+    mask_s, mask_l = params.masks()
+    cand_s = np.flatnonzero((h & np.uint64(mask_s)) == 0)
+    cand_l = np.flatnonzero((h & np.uint64(mask_l)) == 0)
+
+    cuts = []
+    start = 0
+    while start < size:
+        if size - start <= params.min_size:
+            if eof:
+                cuts.append(size)
+            break
+
+        max_end = start + params.max_size
+        limit = min(size, max_end)
+        small_end = min(start + params.avg_size - 1, limit)
+
+        k = np.searchsorted(cand_s, start + params.min_size - 1)
+        if k < len(cand_s) and cand_s[k] < small_end:
+            cut = int(cand_s[k]) + 1
+        else:
+            k = np.searchsorted(cand_l, small_end)
+            if k < len(cand_l) and cand_l[k] < limit:
+                cut = int(cand_l[k]) + 1
+            elif limit == max_end:
+                cut = max_end
+            elif eof:
+                cut = size
+            else:
+                break
+
+        cuts.append(cut)
+        start = cut
+    return cuts
+
+
+def find_cuts(
+    buf: bytes, params: ChunkParams = DEFAULT_PARAMS, eof: bool = True
+) -> List[int]:
+    """Chunk end offsets within buf (the last chunk may wait for more data)."""
+    if np is not None:
+        return _find_cuts_numpy(buf, params, eof)
+    return _find_cuts_python(buf, params, eof)
+
+
+def chunk_digest(data: Any) -> str:
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def iter_chunks(
+    filepath: str, params: ChunkParams = DEFAULT_PARAMS, read_size: int = _READ_SIZE
+) -> Iterator[Tuple[str, int]]:
+    """Streams (digest, length) for each chunk of a file in bounded memory."""
+    params.validate()
+    pending = b""
+    eof = False
+    with open(filepath, "rb") as f:
+        while not eof:
+            data = f.read(read_size)
+            eof = not data
+            buf = pending + data if pending else data
+            view = memoryview(buf)
+            start = 0
+            for cut in find_cuts(buf, params, eof):
+                yield chunk_digest(view[start:cut]), cut - start
+                start = cut
+            pending = bytes(view[start:])
+
+
+def chunk_file(filepath: str, params: ChunkParams = DEFAULT_PARAMS) -> List[List[Any]]:
+    """Returns [[digest, length], ...] for a file."""
+    with metrics.timer("chunk"):
+        chunks = list(iter_chunks(filepath, params))
+    metrics.incr("chunk_bytes", sum(length for _, length in chunks))
+    return [[digest, length] for digest, length in chunks]
@@ -0,0 +1,585 @@
+"""
+Compact in-memory representation of the index.
+
+Decoded as plain JSON, every entry costs a dict, a list of full absolute
+paths (each repeating its directory) and a dict of per-path inode lists.
+CompactIndex keeps the same mapping interface (hash -> entry, with
+entry["paths"] and entry["inodes"]) over:
+- binary digests as keys,
+- a shared directory table, with each path stored as a directory id and
+  an interned file name,
+- __slots__ entry records with one int64 array holding, per path, its
+  directory id and inode record.
+Commands keep using it like the decoded JSON. Paths and records are
+materialized on access only.
+
+On disk, paths under the repository root are stored relative to it, so a
+repository keeps its index when moved or mounted elsewhere. In memory
+they are always absolute: relative paths are resolved against the root
+when loading and made relative again when dumping.
+"""
+
+import json
+from json.encoder import encode_basestring_ascii as _encode_str
+import os
+import sys
+from array import array
+from typing import (
+    IO,
+    Any,
+    Callable,
+    Dict,
+    ItemsView,
+    Iterable,
+    Iterator,
+    List,
+    MutableMapping,
+    MutableSequence,
+    Optional,
+    Tuple,
+    Union,
+    ValuesView,
+    overload,
+)
+
+_FIELDS = ("size", "mimetype", "created_at", "mtime", "sample")
+_KNOWN = frozenset(_FIELDS + ("paths", "inodes"))
+_MISSING: Any = object()
+
+# Per path, _data holds [dir id, st_dev, st_ino, st_mtime_ns, allocated].
+# dev/ino are unsigned 64-bit in the kernel and wrap around here. A path
+# without an inode record has _NO_RECORD as its dev; a record from before
+# allocation was tracked has _NO_ALLOC as its allocated bytes.
+_SLOTS = 5
+_NO_RECORD = -(2**63)
+_NO_ALLOC = -1
+_EMPTY_RECORD = (_NO_RECORD, 0, 0, _NO_ALLOC)
+_U64 = 2**64
+_INF = float("inf")
+_I63 = 2**63
+
+
+def _to_i64(value: int) -> int:
+    return value - _U64 if value >= _I63 else value
+
+
+def _to_u64(value: int) -> int:
+    return value + _U64 if value < 0 else value
+
+
+def _pack_record(record: Optional[List[int]]) -> Tuple[int, int, int, int]:
+    if record is None:
+        return _EMPTY_RECORD
+    allocated = record[3] if len(record) > 3 else _NO_ALLOC
+    return _to_i64(record[0]), _to_i64(record[1]), record[2], allocated
+
+
+def pack_key(key: str) -> bytes:
+    """Flat SHA-256 keys are kept as their 32 raw bytes, others encoded."""
+    if len(key) == 64:
+        try:
+            return bytes.fromhex(key)
+        except ValueError:
+            pass
+    return key.encode()
+
+
+def unpack_key(key: bytes) -> str:
+    # Tagged keys (e.g. tree hashes) are never 32 bytes long
+    return key.hex() if len(key) == 32 else key.decode()
+
+
+def _encode(value: Any, pad: str) -> str:
+    """
+    json.dumps(value, indent=4) for an object nested at `pad`, without the
+    pure-Python encoder's per-value generator machinery (indented output
+    cannot use the C encoder).
+    """
+    kind = type(value)
+    if kind is str:
+        return _encode_str(value)
+    if kind is int:
+        return int.__repr__(value)
+    if kind is float and value == value and value not in (_INF, -_INF):
+        return float.__repr__(value)
+    if kind is list:
+        if not value:
+            return "[]"
+        inner = pad + "    "
+        sep = ",\n" + inner
+        items = sep.join([_encode(v, inner) for v in value])
+        return f"[\n{inner}{items}\n{pad}]"
+    if kind is dict and all(type(k) is str for k in value):
+        if not value:
+            return "{}"
+        inner = pad + "    "
+        sep = ",\n" + inner
+        items = sep.join(
+            [f"{_encode_str(k)}: {_encode(v, inner)}" for k, v in value.items()]
+        )
+        return f"{{\n{inner}{items}\n{pad}}}"
+    # bool, None, non-finite floats, subclasses...
+    return json.dumps(value, indent=4).replace("\n", "\n" + pad)
+
+
+def dump_entries(
+    f: IO[str],
+    entries: Iterable[Tuple[str, Dict[str, Any]]],
+    on_entry: Optional[Callable[[str, str], None]] = None,
+) -> int:
+    """
+    Writes (key, entry in its on-disk form) pairs as a JSON index, in the
+    format of CompactIndex.dump, as they come. Returns the entry count.
+    """
+    f.write("{")
+    count = 0
+    for key, entry in entries:
+        body = _encode(entry, "    ")
+        f.write(",\n    " if count else "\n    ")
+        f.write(f"{_encode_str(key)}: {body}")
+        if on_entry is not None:
+            on_entry(key, body)
+        count += 1
+    f.write("\n}" if count else "}")
+    return count
+
+
+class PathTable:
+    """
+    Directory table shared by all the entries of an index. A path is split
+    after its last separator, so prefix + name gives it back exactly.
+    Relative prefixes are resolved against root (when given).
+    """
+
+    __slots__ = ("dirs", "root", "_root_prefix", "_ids")
+
+    def __init__(self, root: Optional[str] = None) -> None:
+        self.dirs: List[str] = []
+        self.root = root
+        self._root_prefix = os.path.join(root, "") if root else ""
+        # Both resolved and relative prefixes map to the directory id
+        self._ids: Dict[str, int] = {}
+
+    def split(self, path: str) -> Tuple[int, str]:
+        cut = path.rfind(os.sep) + 1
+        prefix = path[:cut]
+        dir_id = self._ids.get(prefix)
+        if dir_id is None:
+            resolved = prefix
+            if self.root and not os.path.isabs(prefix):
+                resolved = self._root_prefix + prefix
+            dir_id = self._ids.get(resolved)
+            if dir_id is None:
+                dir_id = self._ids[resolved] = len(self.dirs)
+                self.dirs.append(resolved)
+            self._ids[prefix] = dir_id
+        return dir_id, sys.intern(path[cut:])
+
+    def relative_dirs(self) -> List[str]:
+        """The directories as stored on disk: relative if under root."""
+        if not self.root:
+            return self.dirs
+        root_prefix = self._root_prefix
+        cut = len(root_prefix)
+        return [d[cut:] if d.startswith(root_prefix) else d for d in self.dirs]
+
+    def lookup(self, path: str) -> Tuple[int, str]:
+        """Like split, without registering an unknown directory (id -1)."""
+        cut = path.rfind(os.sep) + 1
+        return self._ids.get(path[:cut], -1), path[cut:]
+
+
+class Entry(MutableMapping[str, Any]):
+    """One index entry, readable and writable like its JSON dict."""
+
+    __slots__ = (
+        "_table",
+        "size",
+        "mimetype",
+        "created_at",
+        "mtime",
+        "sample",
+        "_names",
+        "_data",
+        "_extra",
+    )
+
+    def __init__(self, table: PathTable) -> None:
+        self._table = table
+        self.size: Any = _MISSING
+        self.mimetype: Any = _MISSING
+        self.created_at: Any = _MISSING
+        self.mtime: Any = _MISSING
+        self.sample: Any = _MISSING
+        self._names: Tuple[str, ...] = ()
+        self._data = array("q")
+        self._extra: Optional[Dict[str, Any]] = None
+
+    @classmethod
+    def from_dict(cls, table: PathTable, data: Dict[str, Any]) -> "Entry":
+        entry = cls.__new__(cls)
+        entry._table = table
+        get = data.get
+        entry.size = get("size", _MISSING)
+        mimetype = get("mimetype", _MISSING)
+        entry.mimetype = sys.intern(mimetype) if type(mimetype) is str else mimetype
+        entry.created_at = get("created_at", _MISSING)
+        entry.mtime = get("mtime", _MISSING)
+        entry.sample = get("sample", _MISSING)
+        extra = {k: v for k, v in data.items() if k not in _KNOWN}
+        entry._extra = extra or None
+        entry._store(get("paths", []), get("inodes") or {})
+        return entry
+
+    def to_dict(self, dirs: Optional[List[str]] = None) -> Dict[str, Any]:
+        result: Dict[str, Any] = {}
+        for key in _FIELDS:
+            value = getattr(self, key)
+            if value is not _MISSING:
+                result[key] = value
+        paths = self.paths(dirs)
+        result["paths"] = paths
+        inodes = {p: r for p, r in zip(paths, self.records()) if r is not None}
+        if inodes:
+            result["inodes"] = inodes
+        if self._extra:
+            result.update(self._extra)
+        return result
+
+    # --- Path storage ---
+
+    def paths(self, dirs: Optional[List[str]] = None) -> List[str]:
+        """Absolute paths, or relative to the given directory table."""
+        if dirs is None:
+            dirs = self._table.dirs
+        return [dirs[d] + n for d, n in zip(self._data[::_SLOTS], self._names)]
+
+    def records(self) -> List[Optional[List[int]]]:
+        """Inode record of every path, in path order (None if unknown)."""
+        data = self._data
+        records: List[Optional[List[int]]] = []
+        for base in range(0, len(data), _SLOTS):
+            dev = data[base + 1]
+            if dev == _NO_RECORD:
+                records.append(None)
+                continue
+            record = [_to_u64(dev), _to_u64(data[base + 2]), data[base + 3]]
+            if data[base + 4] != _NO_ALLOC:
+                record.append(data[base + 4])
+            records.append(record)
+        return records
+
+    def _store(self, paths: List[str], records: Dict[str, List[int]]) -> None:
+        split = self._table.split
+        names = []
+        values: List[int] = []
+        for path in paths:
+            dir_id, name = split(path)
+            names.append(name)
+            record = records.get(path)
+            if record is None:
+                values.append(dir_id)
+                values.extend(_EMPTY_RECORD)
+            else:
+                values += (
+                    dir_id,
+                    _to_i64(record[0]),
+                    _to_i64(record[1]),
+                    record[2],
+                    record[3] if len(record) > 3 else _NO_ALLOC,
+                )
+        self._names = tuple(names)
+        self._data = array("q", values)
+
+    def _find(self, path: str) -> int:
+        dir_id, name = self._table.lookup(path)
+        if dir_id >= 0:
+            data = self._data
+            for i, n in enumerate(self._names):
+                if n == name and data[i * _SLOTS] == dir_id:
+                    return i
+        return -1
+
+    def _record(self, i: int) -> Optional[List[int]]:
+        base = i * _SLOTS
+        dev, ino, mtime_ns, allocated = self._data[base + 1 : base + _SLOTS]
+        if dev == _NO_RECORD:
+            return None
+        record = [_to_u64(dev), _to_u64(ino), mtime_ns]
+        if allocated != _NO_ALLOC:
+            record.append(allocated)
+        return record
+
+    def _set_record(self, i: int, record: Optional[List[int]]) -> None:
+        base = i * _SLOTS
+        self._data[base + 1 : base + _SLOTS] = array("q", _pack_record(record))
+
+    def _insert_path(self, i: int, path: str) -> None:
+        dir_id, name = self._table.split(path)
+        names = list(self._names)
+        names.insert(i, name)
+        self._names = tuple(names)
+        base = i * _SLOTS
+        self._data[base:base] = array("q", (dir_id,) + _EMPTY_RECORD)
+
+    def _delete_paths(self, index: Union[int, slice]) -> None:
+        positions = range(len(self._names))[index]
+        if isinstance(positions, int):
+            positions = range(positions, positions + 1)
+        names = list(self._names)
+        for i in sorted(positions, reverse=True):
+            del names[i]
+            del self._data[i * _SLOTS : (i + 1) * _SLOTS]
+        self._names = tuple(names)
+
+    # --- Mapping interface ---
+
+    def __getitem__(self, key: str) -> Any:
+        if key in _FIELDS:
+            value = getattr(self, key)
+            if value is _MISSING:
+                raise KeyError(key)
+            return value
+        if key == "paths":
+            return _PathList(self)
+        if key == "inodes":
+            return _InodeMap(self)
+        if self._extra is None:
+            raise KeyError(key)
+        return self._extra[key]
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        if key in _FIELDS:
+            if key == "mimetype" and isinstance(value, str):
+                value = sys.intern(value)
+            setattr(self, key, value)
+        elif key == "paths":
+            # Records follow their path
+            paths = self.paths()
+            records = self.records()
+            self._store(
+                list(value), {p: r for p, r in zip(paths, records) if r is not None}
+            )
+        elif key == "inodes":
+            # Records of paths the entry does not have are dropped
+            self._store(self.paths(), dict(value.items()))
+        else:
+            if self._extra is None:
+                self._extra = {}
+            self._extra[key] = value
+
+    def __delitem__(self, key: str) -> None:
+        if key in _FIELDS:
+            if getattr(self, key) is _MISSING:
+                raise KeyError(key)
+            setattr(self, key, _MISSING)
+        elif key == "paths":
+            self._store([], {})
+        elif key == "inodes":
+            self._store(self.paths(), {})
+        elif self._extra is not None and key in self._extra:
+            del self._extra[key]
+        else:
+            raise KeyError(key)
+
+    def __iter__(self) -> Iterator[str]:
+        # Same keys, in the same order, as to_dict()
+        for key in _FIELDS:
+            if getattr(self, key) is not _MISSING:
+                yield key
+        yield "paths"
+        # "inodes" is always readable (so that setdefault hands out the
+        # live view) but only listed when there is something in it
+        if self._has_records():
+            yield "inodes"
+        if self._extra:
+            yield from self._extra
+
+    def __len__(self) -> int:
+        fields = sum(getattr(self, key) is not _MISSING for key in _FIELDS)
+        return fields + 1 + self._has_records() + len(self._extra or ())
+
+    def _has_records(self) -> bool:
+        return any(dev != _NO_RECORD for dev in self._data[1::_SLOTS])
+
+    def __repr__(self) -> str:
+        return f"Entry({self.to_dict()!r})"
+
+
+class _PathList(MutableSequence[str]):
+    """Live view of an entry's paths, usable as the JSON list."""
+
+    __slots__ = ("_entry",)
+
+    def __init__(self, entry: Entry) -> None:
+        self._entry = entry
+
+    @overload
+    def __getitem__(self, index: int) -> str: ...
+
+    @overload
+    def __getitem__(self, index: slice) -> List[str]: ...
+
+    def __getitem__(self, index: Union[int, slice]) -> Union[str, List[str]]:
+        if isinstance(index, slice):
+            return self._entry.paths()[index]
+        entry = self._entry
+        i = range(len(entry._names))[index]
+        return entry._table.dirs[entry._data[i * _SLOTS]] + entry._names[i]
+
+    def __setitem__(self, index: Any, value: Any) -> None:
+        paths = self._entry.paths()
+        paths[index] = value
+        self._entry["paths"] = paths
+
+    def __delitem__(self, index: Union[int, slice]) -> None:
+        self._entry._delete_paths(index)
+
+    def __len__(self) -> int:
+        return len(self._entry._names)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._entry.paths())
+
+    def __contains__(self, path: object) -> bool:
+        return isinstance(path, str) and self._entry._find(path) >= 0
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, (list, _PathList)):
+            return self._entry.paths() == list(other)
+        return NotImplemented
+
+    def insert(self, index: int, value: str) -> None:
+        self._entry._insert_path(index, value)
+
+    def __repr__(self) -> str:
+        return repr(self._entry.paths())
+
+
+class _InodeMap(MutableMapping[str, List[int]]):
+    """Live view of an entry's inode records, keyed by path."""
+
+    __slots__ = ("_entry",)
+
+    def __init__(self, entry: Entry) -> None:
+        self._entry = entry
+
+    def __getitem__(self, path: str) -> List[int]:
+        i = self._entry._find(path)
+        record = self._entry._record(i) if i >= 0 else None
+        if record is None:
+            raise KeyError(path)
+        return record
+
+    def __setitem__(self, path: str, record: List[int]) -> None:
+        i = self._entry._find(path)
+        if i < 0:
+            raise KeyError(f"{path} is not a path of this entry")
+        self._entry._set_record(i, record)
+
+    def __delitem__(self, path: str) -> None:
+        i = self._entry._find(path)
+        if i < 0 or self._entry._record(i) is None:
+            raise KeyError(path)
+        self._entry._set_record(i, None)
+
+    def __iter__(self) -> Iterator[str]:
+        entry = self._entry
+        for path, record in zip(entry.paths(), entry.records()):
+            if record is not None:
+                yield path
+
+    def __len__(self) -> int:
+        devs = self._entry._data[1::_SLOTS]
+        return sum(1 for dev in devs if dev != _NO_RECORD)
+
+    def __repr__(self) -> str:
+        return repr(dict(self.items()))
+
+
+class _Items(ItemsView[str, Entry]):
+    def __iter__(self) -> Iterator[Tuple[str, Entry]]:
+        for key, entry in list(self._mapping._entries.items()):  # type: ignore
+            yield unpack_key(key), entry
+
+
+class _Values(ValuesView[Entry]):
+    def __iter__(self) -> Iterator[Entry]:
+        return iter(list(self._mapping._entries.values()))  # type: ignore
+
+
+class CompactIndex(MutableMapping[str, Entry]):
+    """Index mapping hash -> Entry, interchangeable with the decoded JSON."""
+
+    __slots__ = ("table", "_entries")
+
+    def __init__(
+        self, data: Optional[Dict[str, Any]] = None, root: Optional[str] = None
+    ) -> None:
+        self.table = PathTable(root)
+        self._entries: Dict[bytes, Entry] = {}
+        for key, value in (data or {}).items():
+            self[key] = value
+
+    def __getitem__(self, key: str) -> Entry:
+        return self._entries[pack_key(key)]
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        if not (isinstance(value, Entry) and value._table is self.table):
+            value = Entry.from_dict(self.table, dict(value))
+        self._entries[pack_key(key)] = value
+
+    def __delitem__(self, key: str) -> None:
+        del self._entries[pack_key(key)]
+
+    def __contains__(self, key: object) -> bool:
+        return isinstance(key, str) and pack_key(key) in self._entries
+
+    def __iter__(self) -> Iterator[str]:
+        for key in list(self._entries):
+            yield unpack_key(key)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def items(self) -> _Items:
+        return _Items(self)
+
+    def values(self) -> _Values:
+        return _Values(self)
+
+    def dump(
+        self, f: IO[str], on_entry: Optional[Callable[[str, str], None]] = None
+    ) -> None:
+        """
+        Writes the index as JSON, one entry at a time. on_entry, if given,
+        is called with each key and the JSON text written for its entry.
+        """
+        dirs = self.table.relative_dirs()
+        dump_entries(
+            f,
+            ((unpack_key(k), e.to_dict(dirs)) for k, e in self._entries.items()),
+            on_entry,
+        )
+
+    @classmethod
+    def load(cls, f: IO[str], root: Optional[str] = None) -> "CompactIndex":
+        """
+        Decodes a JSON index, turning each entry into a record as soon as it
+        is parsed so that the plain dicts never pile up. Relative paths are
+        resolved against root.
+        """
+        index = cls(root=root)
+        table = index.table
+
+        def hook(obj: Dict[str, Any]) -> Any:
+            if isinstance(obj.get("paths"), list) and isinstance(obj.get("size"), int):
+                return Entry.from_dict(table, obj)
+            return obj
+
+        data = json.load(f, object_hook=hook)
+        if not isinstance(data, dict):
+            return index
+        for key, value in data.items():
+            index[key] = value
+        return index
@@ -3,6 +3,24 @@ import os
 BFF_DIR = ".bff"
 INDEX_FILE = os.path.join(BFF_DIR, "index.json")
 CONFIG_FILE = os.path.join(BFF_DIR, "config.json")
+DIRS_FILE = os.path.join(BFF_DIR, "dirs.json")
+CHUNKS_FILE = os.path.join(BFF_DIR, "chunks.json")
+SIMILARITY_FILE = os.path.join(BFF_DIR, "similarity.json")
+# Change journal of the index, for remote pulls (see bff.core.journal)
+JOURNAL_FILE = os.path.join(BFF_DIR, "journal.jsonl")
+JOURNAL_STATE_FILE = os.path.join(BFF_DIR, "journal.json")
+FINGERPRINTS_FILE = os.path.join(BFF_DIR, "fingerprints.bin")
+# Cached copies of remote indexes (see bff.core.remote)
+REMOTES_DIR = os.path.join(BFF_DIR, "remotes")
+# Cross-process locks (see bff.core.locking)
+LOCK_FILE = os.path.join(BFF_DIR, "lock")
+SNAPSHOT_LOCK_FILE = os.path.join(BFF_DIR, "snapshot.lock")
+# How 'bff sync' makes the extra paths of a content from its first copy
+LINK_MODES = ("auto", "reflink", "copy")
+# Formats of 'bff export' / 'bff import' (see bff.core.exchange)
+EXPORT_FORMATS = ("jsonl", "csv", "parquet")
+# Hashing queue policies of 'bff index --order'
+INDEX_ORDERS = ("walk", "smallest", "largest", "size-collision")
 IGNORED_DIRS = {
     ".git",
     ".bff",
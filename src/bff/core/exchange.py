@@ -0,0 +1,550 @@
+"""
+Streaming export and import of the index ('bff export' / 'bff import').
+
+Formats, picked from the file name or given explicitly:
+- jsonl: one line per entry, {"hash": ..., <entry as on disk>}. Lossless.
+- csv: one row per path (see COLUMNS). Entry fields without a column go
+  to "extra", as JSON, on the first row of each hash. Lossless too, as
+  long as the rows of a hash follow each other, as export writes them.
+- parquet: the csv rows in columns, with pyarrow (pip install bff[export]).
+
+Text formats are compressed by suffix: .gz, or .zst with zstandard
+(pip install bff[zstd]). Paths stay as stored on disk, relative to the
+repository root.
+
+Neither direction holds the index in memory: iter_entries decodes one
+top-level entry of index.json at a time. Export splits the index file
+into shards at entry boundaries and converts them in parallel, each shard
+into a part file that is appended to the output (gzip members; zstd
+output is compressed once, on all threads; Parquet parts have their row
+groups copied into one file). Shard processes are forked
+and read the file the command opened, so a save can replace the index
+meanwhile; without fork (Windows), export runs in one process.
+"""
+
+import codecs
+import csv
+import gzip
+import io
+import json
+import multiprocessing
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+from typing import IO, Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+try:
+    import zstandard  # type: ignore[import-not-found]
+except ImportError:  # Optional dependency: pip install bff[zstd]
+    zstandard = None
+
+try:
+    import pyarrow as pa  # type: ignore[import-not-found]
+    import pyarrow.parquet as pq  # type: ignore[import-not-found]
+except ImportError:  # Optional dependency: pip install bff[export]
+    pa = pq = None
+
+COLUMNS = (
+    "hash",
+    "path",
+    "size",
+    "mimetype",
+    "created_at",
+    "mtime",
+    "dev",
+    "ino",
+    "mtime_ns",
+    "allocated",
+    "extra",
+)
+_BASE_FIELDS = ("size", "mimetype", "created_at", "mtime")
+_CONVERTERS: Dict[str, Callable[[str], Any]] = {
+    "size": int,
+    "created_at": float,
+    "mtime": float,
+    "dev": int,
+    "ino": int,
+    "mtime_ns": int,
+    "allocated": int,
+}
+
+# Shards smaller than this are not worth a process
+SHARD_MIN_BYTES = 16 * 1024 * 1024
+_READ_SIZE = 1024 * 1024
+_PARQUET_BATCH = 64 * 1024
+_GZIP_LEVEL = 6
+
+
+def detect_format(path: str) -> str:
+    """jsonl, csv or parquet, from the file name (compression suffix aside)."""
+    name = path.lower()
+    for suffix in (".gz", ".zst"):
+        if name.endswith(suffix):
+            name = name[: -len(suffix)]
+    for fmt, suffixes in (
+        ("jsonl", (".jsonl", ".ndjson")),
+        ("csv", (".csv",)),
+        ("parquet", (".parquet", ".pq")),
+    ):
+        if name.endswith(suffixes):
+            return fmt
+    raise ValueError(f"Unknown format for '{path}' (use --format)")
+
+
+def _compression(path: str) -> Optional[str]:
+    if path.endswith(".gz"):
+        return "gzip"
+    if path.endswith(".zst"):
+        if zstandard is None:
+            raise ValueError(
+                "zstd compression needs the zstandard package (pip install bff[zstd])"
+            )
+        return "zstd"
+    return None
+
+
+def _require_pyarrow() -> None:
+    if pa is None:
+        raise ValueError("Parquet needs the pyarrow package (pip install bff[export])")
+
+
+def open_input(path: str) -> IO[bytes]:
+    """The decompressed bytes of an export."""
+    compression = _compression(path)
+    if compression == "gzip":
+        return gzip.open(path, "rb")  # type: ignore[return-value]
+    if compression == "zstd":
+        return zstandard.ZstdDecompressor().stream_reader(  # type: ignore[no-any-return]
+            open(path, "rb"), read_across_frames=True, closefd=True
+        )
+    return open(path, "rb")
+
+
+def _open_output(path: str) -> IO[bytes]:
+    compression = _compression(path)
+    if compression == "gzip":
+        return gzip.open(path, "wb", _GZIP_LEVEL)  # type: ignore[return-value]
+    if compression == "zstd":
+        # threads=-1: one frame, compressed on every core
+        compressor = zstandard.ZstdCompressor(threads=-1)
+        return compressor.stream_writer(  # type: ignore[no-any-return]
+            open(path, "wb"), closefd=True
+        )
+    return open(path, "wb")
+
+
+def _text(stream: IO[bytes]) -> IO[str]:
+    return io.TextIOWrapper(stream, encoding="utf-8", newline="")
+
+
+# --- Reading index.json one entry at a time ---
+
+
+class _Scanner:
+    """Decodes the members of a JSON object from a stream, one at a time."""
+
+    def __init__(self, read: Callable[[int], str]) -> None:
+        self.read = read
+        self.decoder = json.JSONDecoder()
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self) -> bool:
+        if self.eof:
+            return False
+        # Grow as fast as the buffer: huge entries are not parsed again and again
+        data = self.read(max(_READ_SIZE, len(self.buf) - self.pos))
+        if not data:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos :] + data
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        """Next non-blank character ('' at the end), skipping separators."""
+        while True:
+            buf, pos = self.buf, self.pos
+            while pos < len(buf) and buf[pos] in " \t\r\n,:":
+                pos += 1
+            self.pos = pos
+            if pos < len(buf):
+                return buf[pos]
+            if not self._fill():
+                return ""
+
+    def value(self) -> Any:
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                if self._fill():
+                    continue
+                raise
+            # A number may go on in the next read
+            if end == len(self.buf) and self._fill():
+                continue
+            self.pos = end
+            return value
+
+    def members(self) -> Iterator[Tuple[str, Any]]:
+        """Members up to the closing brace, or to the end of the stream."""
+        while True:
+            char = self.peek()
+            if char in ("}", ""):
+                return
+            key = self.value()
+            if not isinstance(key, str) or self.peek() == "":
+                raise ValueError("Invalid index: expected an entry")
+            yield key, self.value()
+
+
+def iter_entries(f: IO[str]) -> Iterator[Tuple[str, Any]]:
+    """(hash, entry) pairs of a JSON index, as stored on disk."""
+    return iter_entries_from(_Scanner(f.read))
+
+
+def iter_entries_from(scanner: _Scanner) -> Iterator[Tuple[str, Any]]:
+    """iter_entries over a scanner."""
+    char = scanner.peek()
+    if char == "":
+        return
+    if char != "{":
+        raise ValueError("Invalid index: expected an object")
+    scanner.pos += 1
+    yield from scanner.members()
+
+
+def _decoding(read: Callable[[int], bytes]) -> Callable[[int], str]:
+    """read, decoded from UTF-8 (a character may span two reads)."""
+    decoder = codecs.getincrementaldecoder("utf-8")()
+
+    def read_text(size: int) -> str:
+        data = read(size)
+        return decoder.decode(data, final=not data)
+
+    return read_text
+
+
+def shard_offsets(f: IO[bytes], count: int) -> List[Tuple[int, int]]:
+    """
+    Byte ranges of an open index.json, each made of whole entries. Splitting
+    relies on the layout of saved indexes (indent of 4: a line starting with
+    four spaces and a quote opens an entry); other files are one shard.
+    """
+    size = os.fstat(f.fileno()).st_size
+    f.seek(0)
+    if f.readline() != b"{\n":
+        return [(0, size)]
+    starts = [f.tell()]
+    for n in range(1, count):
+        f.seek(max(size * n // count, starts[-1]))
+        f.readline()  # Most likely in the middle of a line
+        while True:
+            offset = f.tell()
+            line = f.readline()
+            if not line or line.startswith(b'    "'):
+                break
+        if line and offset > starts[-1]:
+            starts.append(offset)
+    return list(zip(starts, starts[1:] + [size]))
+
+
+def _read_range(fd: int, start: int, end: int) -> Iterator[Tuple[str, Any]]:
+    """
+    The entries of a shard of index.json (see shard_offsets). pread leaves
+    the file offset, shared with the other processes, alone.
+    """
+    position = start
+
+    def read(size: int) -> bytes:
+        nonlocal position
+        data = os.pread(fd, min(size, end - position), position)
+        position += len(data)
+        return data
+
+    yield from _Scanner(_decoding(read)).members()
+
+
+def _read_all(f: IO[bytes]) -> Iterator[Tuple[str, Any]]:
+    f.seek(0)
+    scanner = _Scanner(_decoding(f.read))
+    yield from iter_entries_from(scanner)
+
+
+# --- Entries to rows and back ---
+
+
+def path_rows(file_hash: str, entry: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    """One row per path of an entry (one row without a path if it has none)."""
+    extra = {
+        k: v for k, v in entry.items() if k not in _BASE_FIELDS + ("paths", "inodes")
+    }
+    inodes = entry.get("inodes") or {}
+    for n, path in enumerate(entry.get("paths") or [None]):
+        record = inodes.get(path) if path is not None else None
+        row = {"hash": file_hash, "path": path}
+        for field in _BASE_FIELDS:
+            row[field] = entry.get(field)
+        row["dev"], row["ino"], row["mtime_ns"] = record[:3] if record else (None,) * 3
+        row["allocated"] = record[3] if record and len(record) > 3 else None
+        row["extra"] = json.dumps(extra) if extra and n == 0 else None
+        yield row
+
+
+def _entry_from_row(row: Dict[str, Any]) -> Dict[str, Any]:
+    entry: Dict[str, Any] = {
+        field: row[field] for field in _BASE_FIELDS if row[field] is not None
+    }
+    if row["extra"]:
+        entry.update(json.loads(row["extra"]))
+    entry["paths"] = []
+    entry["inodes"] = {}
+    return entry
+
+
+def entries_from_rows(rows: Iterator[Dict[str, Any]]) -> Iterator[Tuple[str, Any]]:
+    """
+    Groups consecutive rows of the same hash back into entries. Rows of a
+    hash apart from each other would make it twice: refused.
+    """
+    seen = set()
+    current: Optional[Tuple[str, Dict[str, Any]]] = None
+    for row in rows:
+        file_hash = row["hash"]
+        if current is None or current[0] != file_hash:
+            if current is not None:
+                yield _finish(current)
+            if file_hash in seen:
+                raise ValueError(f"Rows of {file_hash[:8]} do not follow each other")
+            seen.add(file_hash)
+            current = (file_hash, _entry_from_row(row))
+        path = row["path"]
+        if path:
+            entry = current[1]
+            entry["paths"].append(path)
+            if row["dev"] is not None:
+                record = [row["dev"], row["ino"], row["mtime_ns"]]
+                if row["allocated"] is not None:
+                    record.append(row["allocated"])
+                entry["inodes"][path] = record
+    if current is not None:
+        yield _finish(current)
+
+
+def _finish(item: Tuple[str, Dict[str, Any]]) -> Tuple[str, Dict[str, Any]]:
+    if not item[1]["inodes"]:
+        del item[1]["inodes"]
+    return item
+
+
+def _csv_rows(f: IO[str]) -> Iterator[Dict[str, Any]]:
+    reader = csv.DictReader(f)
+    if tuple(reader.fieldnames or ()) != COLUMNS:
+        raise ValueError("Not a bff CSV export (unexpected columns)")
+    for row in reader:
+        parsed: Dict[str, Any] = {}
+        for column, text in row.items():
+            convert = _CONVERTERS.get(column)
+            if text == "":
+                parsed[column] = None
+            else:
+                parsed[column] = convert(text) if convert else text
+        yield parsed
+
+
+def _parquet_rows(path: str) -> Iterator[Dict[str, Any]]:
+    _require_pyarrow()
+    for batch in pq.ParquetFile(path).iter_batches(batch_size=_PARQUET_BATCH):
+        yield from batch.to_pylist()
+
+
+def read_export(path: str, fmt: Optional[str] = None) -> Iterator[Tuple[str, Any]]:
+    """(hash, entry) pairs of an export, checked as they are read."""
+    for file_hash, entry in _read_export(path, fmt or detect_format(path)):
+        if not (
+            isinstance(file_hash, str)
+            and isinstance(entry.get("size"), int)
+            and isinstance(entry.get("paths"), list)
+        ):
+            raise ValueError(f"Invalid entry {str(file_hash)[:8]}")
+        yield file_hash, entry
+
+
+def _read_export(path: str, fmt: str) -> Iterator[Tuple[str, Any]]:
+    if fmt == "parquet":
+        yield from entries_from_rows(_parquet_rows(path))
+        return
+    with _text(open_input(path)) as f:
+        if fmt == "csv":
+            yield from entries_from_rows(_csv_rows(f))
+            return
+        seen = set()
+        for n, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                entry = json.loads(line)
+                file_hash = entry.pop("hash")
+                duplicate = file_hash in seen
+            except (ValueError, KeyError, AttributeError, TypeError):
+                raise ValueError(f"Invalid entry on line {n}") from None
+            if duplicate:
+                raise ValueError(f"Entry {str(file_hash)[:8]} appears twice")
+            seen.add(file_hash)
+            yield file_hash, entry
+
+
+# --- Writing ---
+
+
+def _write_entries(
+    entries: Iterator[Tuple[str, Any]], fmt: str, out: IO[str]
+) -> Tuple[int, int]:
+    """Writes jsonl or csv rows (no header). Returns (entries, paths)."""
+    count = paths = 0
+    writer = csv.writer(out, lineterminator="\n") if fmt == "csv" else None
+    for file_hash, entry in entries:
+        count += 1
+        paths += len(entry.get("paths") or ())
+        if writer is None:
+            out.write(json.dumps({"hash": file_hash, **entry}) + "\n")
+            continue
+        for row in path_rows(file_hash, entry):
+            writer.writerow(["" if v is None else v for v in row.values()])
+    return count, paths
+
+
+def _export_shard(
+    fd: int, start: int, end: int, fmt: str, part: str, compress: bool
+) -> Tuple[int, int]:
+    raw = gzip.open(part, "wb", _GZIP_LEVEL) if compress else open(part, "wb")
+    with _text(raw) as out:  # type: ignore[arg-type]
+        return _write_entries(_read_range(fd, start, end), fmt, out)
+
+
+def _parquet_schema() -> Any:
+    return pa.schema(
+        [
+            ("hash", pa.string()),
+            ("path", pa.string()),
+            ("size", pa.int64()),
+            ("mimetype", pa.string()),
+            ("created_at", pa.float64()),
+            ("mtime", pa.float64()),
+            ("dev", pa.uint64()),
+            ("ino", pa.uint64()),
+            ("mtime_ns", pa.int64()),
+            ("allocated", pa.int64()),
+            ("extra", pa.string()),
+        ]
+    )
+
+
+def _write_parquet(entries: Iterator[Tuple[str, Any]], output: str) -> Tuple[int, int]:
+    """Writes the path rows of entries as Parquet. Returns (entries, paths)."""
+    schema = _parquet_schema()
+    count = paths = 0
+    batch: List[Dict[str, Any]] = []
+    with pq.ParquetWriter(output, schema, compression="zstd") as writer:
+        for file_hash, entry in entries:
+            count += 1
+            paths += len(entry.get("paths") or ())
+            batch.extend(path_rows(file_hash, entry))
+            if len(batch) >= _PARQUET_BATCH:
+                writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+                batch = []
+        if batch or not count:
+            writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+    return count, paths
+
+
+def _export_parquet_shard(fd: int, start: int, end: int, part: str) -> Tuple[int, int]:
+    return _write_parquet(_read_range(fd, start, end), part)
+
+
+def _merge_parquet(parts: List[str], output: str) -> None:
+    """Copies the row groups of the part files, in order, into one file."""
+    with pq.ParquetWriter(output, _parquet_schema(), compression="zstd") as writer:
+        for part in parts:
+            source = pq.ParquetFile(part)
+            for n in range(source.num_row_groups):
+                writer.write_table(source.read_row_group(n))
+
+
+def _fork_context() -> Optional[multiprocessing.context.BaseContext]:
+    """Shards read the index through an inherited descriptor: fork only."""
+    if "fork" not in multiprocessing.get_all_start_methods():
+        return None
+    return multiprocessing.get_context("fork")
+
+
+def export_index(
+    index_file: IO[bytes], output: str, fmt: Optional[str] = None, jobs: int = 1
+) -> Tuple[int, int]:
+    """
+    Writes an open index file to output. Only this open file is read, so
+    the index may be replaced meanwhile. Returns the number of entries and
+    of paths written.
+    """
+    fmt = fmt or detect_format(output)
+    if fmt == "parquet":
+        _require_pyarrow()
+    compression = _compression(output)
+
+    size = os.fstat(index_file.fileno()).st_size
+    context = _fork_context()
+    shards = min(jobs, size // SHARD_MIN_BYTES) if context is not None else 1
+    ranges = shard_offsets(index_file, shards) if shards > 1 else []
+    header = ",".join(COLUMNS) + "\n" if fmt == "csv" else ""
+    if len(ranges) < 2:
+        if fmt == "parquet":
+            return _write_parquet(_read_all(index_file), output)
+        with _text(_open_output(output)) as out:
+            out.write(header)
+            return _write_entries(_read_all(index_file), fmt, out)
+
+    fds = [index_file.fileno()] * len(ranges)
+    starts = [start for start, _ in ranges]
+    ends = [end for _, end in ranges]
+    # gzip members can follow each other: shards are compressed in parallel
+    parallel_gzip = compression == "gzip"
+    parts = [f"{output}.{os.getpid()}.part{n}" for n in range(len(ranges))]
+    try:
+        with ProcessPoolExecutor(len(ranges), mp_context=context) as executor:
+            if fmt == "parquet":
+                counts = list(
+                    executor.map(_export_parquet_shard, fds, starts, ends, parts)
+                )
+            else:
+                counts = list(
+                    executor.map(
+                        _export_shard,
+                        fds,
+                        starts,
+                        ends,
+                        [fmt] * len(ranges),
+                        parts,
+                        [parallel_gzip] * len(ranges),
+                    )
+                )
+        if fmt == "parquet":
+            # Row groups are copied as decoded columns, without the JSON work
+            _merge_parquet(parts, output)
+        else:
+            out_raw = open(output, "wb") if parallel_gzip else _open_output(output)
+            with out_raw as out:
+                if header:
+                    data = header.encode()
+                    out.write(
+                        gzip.compress(data, _GZIP_LEVEL) if parallel_gzip else data
+                    )
+                for part in parts:
+                    with open(part, "rb") as f:
+                        shutil.copyfileobj(f, out, _READ_SIZE)
+    finally:
+        for part in parts:
+            if os.path.exists(part):
+                os.remove(part)
+    return sum(c for c, _ in counts), sum(p for _, p in counts)
@@ -1,49 +1,285 @@
+import fnmatch
 import os
-from typing import List, Optional
+import re
+import stat as stat_module
+from typing import (
+    Any,
+    Dict,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+    Pattern,
+    Tuple,
+)
+
+from bff.core.compact import CompactIndex
 
 
 class IndexFilters:
-    """Configuration object for file filtering criteria."""
+    """
+    Configuration object for file filtering criteria.
+
+    Globs without a separator match the name of a file or of any of its
+    parent directories, others the path relative to the repository root.
+    A directory matching an exclude glob is excluded with all its contents
+    (and not even walked by 'index'). Include globs only apply to files.
+    Dates are timestamps: after_date bounds st_ctime, modified_after and
+    modified_before bound st_mtime.
+    """
 
     def __init__(
         self,
         extensions: Optional[List[str]] = None,
         min_size_bytes: int = 0,
         after_date: Optional[float] = None,
+        include: Optional[List[str]] = None,
+        exclude: Optional[List[str]] = None,
+        mimetypes: Optional[List[str]] = None,
+        path_regex: Optional[str] = None,
+        modified_after: Optional[float] = None,
+        modified_before: Optional[float] = None,
+        root: Optional[str] = None,
     ):
         self.extensions = [e.lower() for e in extensions] if extensions else None
         self.min_size_bytes = min_size_bytes
         self.after_date = after_date
+        self.include = include
+        self.exclude = exclude
+        self.mimetypes = mimetypes
+        self.path_regex = path_regex
+        self.modified_after = modified_after
+        self.modified_before = modified_before
+        # Relative globs and the regex match against paths under this root
+        # (the current directory when unset)
+        self.root = root
+        self._compiled: Dict[str, CompiledFilters] = {}
+
+    def compile(self, root: Optional[str] = None) -> "CompiledFilters":
+        """The compiled form for a root (default: self.root), built once."""
+        root = os.path.abspath(root or self.root or os.getcwd())
+        compiled = self._compiled.get(root)
+        if compiled is None:
+            compiled = self._compiled[root] = CompiledFilters(self, root)
+        return compiled
 
 
-def should_index(filepath: str, filters: IndexFilters) -> bool:
+def _glob_regexes(
+    patterns: Optional[List[str]],
+) -> Tuple[Optional[Pattern[str]], Optional[Pattern[str]]]:
+    """(name regex, relative path regex) matching any of the globs."""
+    by_name: List[str] = []
+    by_path: List[str] = []
+    for pattern in patterns or []:
+        pattern = pattern.rstrip(os.sep) or os.sep
+        target = by_path if os.sep in pattern else by_name
+        target.append(fnmatch.translate(pattern))
+    return (
+        re.compile("|".join(by_name)) if by_name else None,
+        re.compile("|".join(by_path)) if by_path else None,
+    )
+
+
+class CompiledFilters:
     """
-    Determines if a file matches the filtering criteria.
-    Public function used by both index and clean commands.
+    IndexFilters prepared for evaluation: extensions as a set, globs and
+    mimetypes merged into one regex each, and directory exclusion cached
+    per directory, so that the cost per path is a few lookups.
     """
-    # 1. Symlink check
-    if os.path.islink(filepath):
-        return False
 
-    # 2. Extension check
-    if filters.extensions:
-        _, ext = os.path.splitext(filepath)
-        if ext.lower() not in filters.extensions:
+    def __init__(self, filters: IndexFilters, root: str) -> None:
+        self.root = root
+        self._root_prefix = os.path.join(root, "")
+        self.extensions = frozenset(filters.extensions or ())
+        self.min_size = filters.min_size_bytes
+        self.after_date = filters.after_date
+        self.modified_after = filters.modified_after
+        self.modified_before = filters.modified_before
+        self.include_name, self.include_path = _glob_regexes(filters.include)
+        self.exclude_name, self.exclude_path = _glob_regexes(filters.exclude)
+        self.has_include = bool(filters.include)
+        self.mimetypes = (
+            re.compile("|".join(fnmatch.translate(m) for m in filters.mimetypes))
+            if filters.mimetypes
+            else None
+        )
+        self.regex = re.compile(filters.path_regex) if filters.path_regex else None
+
+        self.checks_path = bool(
+            self.extensions or filters.include or filters.exclude or self.regex
+        )
+        self.checks_mtime = (
+            self.modified_after is not None or self.modified_before is not None
+        )
+        self.trivial = not (
+            self.checks_path
+            or self.checks_mtime
+            or self.min_size
+            or self.after_date
+            or self.mimetypes
+        )
+        self._excluded_dirs: Dict[str, bool] = {"": False}
+
+    # --- Path criteria ---
+
+    def _relative(self, path: str) -> str:
+        if path.startswith(self._root_prefix):
+            return path[len(self._root_prefix) :]
+        return "" if path == self.root else path
+
+    def _excluded(self, rel: str, name: str) -> bool:
+        return bool(
+            (self.exclude_name and self.exclude_name.match(name))
+            or (self.exclude_path and self.exclude_path.match(rel))
+        )
+
+    def _dir_excluded(self, rel_dir: str) -> bool:
+        excluded = self._excluded_dirs.get(rel_dir)
+        if excluded is None:
+            cut = rel_dir.rfind(os.sep)
+            excluded = self._dir_excluded(rel_dir[:cut] if cut > 0 else "") or (
+                self._excluded(rel_dir, rel_dir[cut + 1 :])
+            )
+            self._excluded_dirs[rel_dir] = excluded
+        return excluded
+
+    def prunes_dir(self, dirpath: str) -> bool:
+        """True if the directory is excluded, and everything under it."""
+        if self.exclude_name is None and self.exclude_path is None:
+            return False
+        return self._dir_excluded(self._relative(dirpath))
+
+    def match_path(self, path: str) -> bool:
+        """Path criteria only: globs, extensions and regex."""
+        if not self.checks_path:
+            return True
+        rel = self._relative(path)
+        cut = rel.rfind(os.sep)
+        name = rel[cut + 1 :]
+        if self._dir_excluded(rel[:cut] if cut > 0 else ""):
+            return False
+        if self._excluded(rel, name):
+            return False
+        if self.has_include and not (
+            (self.include_name and self.include_name.match(name))
+            or (self.include_path and self.include_path.match(rel))
+        ):
+            return False
+        if self.extensions and os.path.splitext(name)[1].lower() not in self.extensions:
+            return False
+        return self.regex is None or self.regex.search(rel) is not None
+
+    # --- Attribute criteria ---
+
+    def _match_size_ctime(self, size: int, ctime: float) -> bool:
+        if size < self.min_size:
+            return False
+        return not (self.after_date and ctime < self.after_date)
+
+    def match_content(self, size: int, ctime: float, mimetype: Optional[str]) -> bool:
+        """Criteria shared by every copy of a content."""
+        if not self._match_size_ctime(size, ctime):
             return False
+        return self.mimetypes is None or bool(
+            mimetype and self.mimetypes.match(mimetype)
+        )
 
-    try:
-        stat = os.stat(filepath)
+    def match_mtime(self, mtime: float) -> bool:
+        if self.modified_after is not None and mtime < self.modified_after:
+            return False
+        return self.modified_before is None or mtime < self.modified_before
+
+    # --- Evaluation ---
 
-        # 3. Size check
-        if stat.st_size < filters.min_size_bytes:
+    def match_file(self, filepath: str, st: Optional[os.stat_result] = None) -> bool:
+        """
+        Evaluates a file on disk. st may be an lstat result taken by the
+        caller; libmagic only runs when a mimetype criterion is set and
+        everything else matched.
+        """
+        if self.checks_path and not self.match_path(os.path.abspath(filepath)):
+            return False
+        if st is None:
+            if os.path.islink(filepath):
+                return False
+            try:
+                st = os.stat(filepath)
+            except OSError:
+                # File might be locked or deleted during check
+                return False
+        elif stat_module.S_ISLNK(st.st_mode):
             return False
 
-        # 4. Date check
-        if filters.after_date and stat.st_ctime < filters.after_date:
+        if not (
+            self._match_size_ctime(st.st_size, st.st_ctime)
+            and self.match_mtime(st.st_mtime)
+        ):
             return False
+        if self.mimetypes is None:
+            return True
+        # Deferred: libmagic is only loaded when needed
+        from bff.core.index_manager import detect_mimetype
+
+        return self.mimetypes.match(detect_mimetype(filepath)) is not None
+
+    def select(
+        self, index: Mapping[str, Any]
+    ) -> Iterator[Tuple[str, Any, Optional[List[int]]]]:
+        """
+        Evaluates an in-memory index without touching the disk. Yields
+        (hash, entry, positions of the matching paths) for every entry with
+        at least one match; positions is None when all paths match.
+        """
+        # Deferred: index_manager imports the index representation
+        from bff.core.index_manager import inode_records
 
-        return True
+        if self.trivial:
+            for file_hash, entry in index.items():
+                yield file_hash, entry, None
+            return
 
-    except OSError:
-        # File might be locked or deleted during check
-        return False
+        for file_hash, entry in index.items():
+            if not self.match_content(
+                entry.get("size", 0),
+                entry.get("created_at", 0.0),
+                entry.get("mimetype"),
+            ):
+                continue
+            paths = entry.get("paths", [])
+            if self.checks_mtime:
+                mtime = entry.get("mtime", 0.0)
+                mtimes = [r[2] / 1e9 if r else mtime for r in inode_records(entry)]
+            positions = [
+                i
+                for i, path in enumerate(paths)
+                if self.match_path(path)
+                and (not self.checks_mtime or self.match_mtime(mtimes[i]))
+            ]
+            if len(positions) == len(paths):
+                yield file_hash, entry, None
+            elif positions:
+                yield file_hash, entry, positions
+
+
+def select(
+    index: Mapping[str, Any], filters: Optional[IndexFilters]
+) -> Iterator[Tuple[str, Any, Optional[List[int]]]]:
+    """
+    CompiledFilters.select, or every entry when there are no filters.
+    Relative globs apply from the root of the index when it knows it.
+    """
+    if filters is None:
+        return ((h, entry, None) for h, entry in index.items())
+    root = index.table.root if isinstance(index, CompactIndex) else None
+    return filters.compile(root).select(index)
+
+
+def should_index(
+    filepath: str, filters: IndexFilters, stat: Optional[os.stat_result] = None
+) -> bool:
+    """
+    Determines if a file matches the filtering criteria.
+    Public function used by both index and watch commands. A stat (or
+    lstat) taken by the caller is reused.
+    """
+    return filters.compile().match_file(filepath, stat)
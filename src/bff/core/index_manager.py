@@ -1,14 +1,28 @@
 import json
 import os
 import threading
-from typing import Any, Dict, Optional
+from typing import (
+    IO,
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Mapping,
+    MutableMapping,
+    Optional,
+    Set,
+    Tuple,
+)
 
-import magic
+from bff.core import metrics
+from bff.core.compact import CompactIndex, Entry, dump_entries
+from bff.core.constants import BFF_DIR, CONFIG_FILE, INDEX_FILE
+from bff.core.journal import Recorder
+from bff.core.locking import snapshot_lock
 
-from bff.core.constants import BFF_DIR, INDEX_FILE
-
-# Global lock for thread-safe operations if needed,
-# though file operations themselves are not atomic without strict locking.
+# Global lock for thread-safe operations within one process; other bff
+# processes are kept out by the repository locks (bff.core.locking).
 _LOCK = threading.Lock()
 
 
@@ -26,30 +40,249 @@ def load_index(index_path: Optional[str] = None) -> Dict[str, Any]:
     path = index_path or INDEX_FILE
     if not os.path.exists(path):
         return {}
-    with open(path, "r") as f:
+    with metrics.timer("index_load"), open(path, "r") as f:
         try:
             return json.load(f)
         except json.JSONDecodeError:
             return {}
 
 
-def save_index(index_data: Dict[str, Any], index_path: Optional[str] = None) -> None:
+def save_index(index_data: Mapping[str, Any], index_path: Optional[str] = None) -> None:
     """
-    Save the index to disk atomically.
+    Save the index to disk atomically. Files of a repository are replaced
+    under its exclusive snapshot lock, so readers see either version. The
+    changes made to the repository index are journaled (bff.core.journal).
 
     Args:
         index_data: Dictionary containing the index data to save.
         index_path: Optional path to the index file. Defaults to global constant.
     """
     target_path = index_path or INDEX_FILE
+    root_dir, journaled = _save_target(target_path)
+    if journaled and not isinstance(index_data, CompactIndex):
+        index_data = CompactIndex(dict(index_data), root_dir)
+
+    def write(f: IO[str], recorder: Optional[Recorder]) -> None:
+        if isinstance(index_data, CompactIndex):
+            index_data.dump(f, recorder)
+        else:
+            json.dump(index_data, f, indent=4)
+
+    _replace_index(target_path, root_dir, journaled, write)
+
+
+def save_index_entries(
+    entries: Iterable[Tuple[str, Dict[str, Any]]], index_path: Optional[str] = None
+) -> int:
+    """
+    Like save_index, for (hash, entry) pairs already in their on-disk form
+    (paths relative to the root), written as they come instead of being
+    held in memory together. If entries raises, the index is left as it
+    was. Returns the number of entries saved.
+    """
+    target_path = index_path or INDEX_FILE
+    root_dir, journaled = _save_target(target_path)
+    count = 0
+
+    def write(f: IO[str], recorder: Optional[Recorder]) -> None:
+        nonlocal count
+        count = dump_entries(f, entries, recorder)
+
+    _replace_index(target_path, root_dir, journaled, write)
+    return count
+
+
+def _save_target(target_path: str) -> Tuple[Optional[str], bool]:
+    """(repository root or None outside .bff/, whether it is the journaled index)"""
+    bff_dir = os.path.dirname(os.path.abspath(target_path))
+    if os.path.basename(bff_dir) != BFF_DIR:
+        return None, False
+    journaled = os.path.basename(target_path) == os.path.basename(INDEX_FILE)
+    return os.path.dirname(bff_dir), journaled
+
+
+def _replace_index(
+    target_path: str,
+    root_dir: Optional[str],
+    journaled: bool,
+    write: Callable[[IO[str], Optional[Recorder]], None],
+) -> None:
     temp_file = target_path + ".tmp"
 
     # Ensure directory exists
     os.makedirs(os.path.dirname(target_path), exist_ok=True)
+    recorder = Recorder(root_dir) if root_dir and journaled else None
+
+    with metrics.timer("index_save"):
+        f = open(temp_file, "w")
+        try:
+            with f:
+                write(f, recorder)
+        except BaseException:
+            os.remove(temp_file)
+            raise
+        if root_dir is None:
+            os.replace(temp_file, target_path)
+            return
+        with snapshot_lock(root_dir, exclusive=True):
+            os.replace(temp_file, target_path)
+            if recorder is not None:
+                recorder.commit()
+
+
+def load_compact_index(index_path: Optional[str] = None) -> CompactIndex:
+    """
+    Load the index from disk into its compact in-memory form (see
+    bff.core.compact), with paths resolved against the repository holding
+    it. Returns an empty index if the file doesn't exist or is corrupted.
+    """
+    path = index_path or INDEX_FILE
+    root = index_root(path)
+    if not os.path.exists(path):
+        return CompactIndex(root=root)
+    with metrics.timer("index_load"), open(path, "r") as f:
+        try:
+            return CompactIndex.load(f, root)
+        except json.JSONDecodeError:
+            return CompactIndex(root=root)
+
+
+def index_root(index_path: str) -> str:
+    """Repository root of an index file: the directory holding .bff/."""
+    return os.path.dirname(os.path.dirname(os.path.abspath(index_path)))
+
+
+def relative_path(path: str, root: str) -> str:
+    """Path as stored on disk: relative to root if under it ('' for root)."""
+    if path == root:
+        return ""
+    root_prefix = os.path.join(root, "")
+    return path[len(root_prefix) :] if path.startswith(root_prefix) else path
+
+
+def absolute_path(path: str, root: str) -> str:
+    """Inverse of relative_path."""
+    return os.path.join(root, path) if path else root
 
-    with open(temp_file, "w") as f:
-        json.dump(index_data, f, indent=4)
-    os.replace(temp_file, target_path)
+
+def rebase_paths(index: MutableMapping[str, Any], old_root: str, new_root: str) -> int:
+    """
+    Moves the paths recorded under old_root to new_root, keeping their
+    inode records. Returns the number of paths rewritten.
+    """
+    old_prefix = os.path.join(old_root, "")
+    rewritten = 0
+    for entry in index.values():
+        pairs = path_records(entry)
+        if not any(p.startswith(old_prefix) for p, _ in pairs):
+            continue
+        records: Dict[str, Optional[List[int]]] = {}
+        for p, record in pairs:
+            if p.startswith(old_prefix):
+                p = os.path.join(new_root, p[len(old_prefix) :])
+                rewritten += 1
+            # The repository may already have been indexed at its new place
+            if p not in records or records[p] is None:
+                records[p] = record
+        entry["paths"] = list(records)
+        inodes = {p: r for p, r in records.items() if r is not None}
+        if inodes:
+            entry["inodes"] = inodes
+        else:
+            entry.pop("inodes", None)
+    return rewritten
+
+
+def load_config(root_dir: Optional[str] = None) -> Dict[str, Any]:
+    """Repository settings from .bff/config.json (empty if missing)."""
+    return load_index(os.path.join(root_dir, CONFIG_FILE) if root_dir else CONFIG_FILE)
+
+
+def tree_hash_min_size(config: Dict[str, Any]) -> Optional[int]:
+    """
+    Size from which files are tree-hashed ("tree_hash_min_size" in the
+    config), or None when tree hashing is disabled.
+    """
+    value = config.get("tree_hash_min_size")
+    if isinstance(value, int) and not isinstance(value, bool) and value >= 0:
+        return value
+    return None
+
+
+def set_entry_paths(entry: MutableMapping[str, Any], paths: List[str]) -> None:
+    """Replaces the paths of an entry, keeping per-path records in sync."""
+    entry["paths"] = paths
+    if isinstance(entry, Entry):
+        return  # Records already follow their paths
+    inodes = entry.get("inodes")
+    if inodes:
+        entry["inodes"] = {p: inodes[p] for p in paths if p in inodes}
+
+
+def allocated_bytes(stat: os.stat_result) -> int:
+    """Bytes actually allocated on disk (smaller than st_size if sparse)."""
+    blocks = getattr(stat, "st_blocks", None)
+    return blocks * 512 if blocks is not None else stat.st_size
+
+
+def inode_records(entry: Mapping[str, Any]) -> List[Optional[List[int]]]:
+    """Inode record (or None) of every path of an entry, in path order."""
+    if isinstance(entry, Entry):
+        return entry.records()
+    inodes = entry.get("inodes", {})
+    return [inodes.get(p) for p in entry.get("paths", [])]
+
+
+def path_records(entry: Mapping[str, Any]) -> List[Tuple[str, Optional[List[int]]]]:
+    """(path, inode record or None) for every path of an entry."""
+    if isinstance(entry, Entry):
+        return list(zip(entry.paths(), entry.records()))
+    return list(zip(entry.get("paths", []), inode_records(entry)))
+
+
+def disk_copies(
+    entry: Mapping[str, Any], positions: Optional[List[int]] = None
+) -> List[int]:
+    """
+    Allocated bytes of each distinct on-disk copy of an entry, in path
+    order (the master comes first), optionally only over the paths at the
+    given positions. Hardlinks to the same (device, inode) count once.
+    Paths recorded before inodes or allocation were tracked count
+    individually, at their logical size.
+    """
+    size = entry.get("size", 0)
+    records = inode_records(entry)
+    if positions is not None:
+        records = [records[i] for i in positions]
+    seen: Set[Tuple[int, int]] = set()
+    copies = []
+    for record in records:
+        if record is None:
+            copies.append(size)
+            continue
+        key = (record[0], record[1])
+        if key not in seen:
+            seen.add(key)
+            copies.append(record[3] if len(record) > 3 else size)
+    return copies
+
+
+def physical_copies(entry: Mapping[str, Any]) -> int:
+    """Number of distinct on-disk copies of an entry (see disk_copies)."""
+    return len(disk_copies(entry))
+
+
+def detect_mimetype(filepath: str) -> str:
+    """Mimetype of a file according to libmagic ("unknown" on failure)."""
+    # Imported lazily: libmagic initialization is costly and most commands
+    # never need it.
+    import magic
+
+    try:
+        with metrics.timer("magic"):
+            return magic.from_file(filepath, mime=True)
+    except Exception:
+        return "unknown"
 
 
 def get_metadata(filepath: str) -> Dict[str, Any]:
@@ -60,16 +293,15 @@ def get_metadata(filepath: str) -> Dict[str, Any]:
         filepath: Absolute path to the file.
 
     Returns:
-        Dict containing size, mimetype, created_at, and mtime.
+        Dict containing size, allocated, mimetype, created_at, and mtime.
     """
-    try:
-        mime = magic.from_file(filepath, mime=True)
-    except Exception:
-        mime = "unknown"
+    mime = detect_mimetype(filepath)
 
-    stat = os.stat(filepath)
+    with metrics.timer("stat"):
+        stat = os.stat(filepath)
     return {
         "size": stat.st_size,
+        "allocated": allocated_bytes(stat),
         "mimetype": mime,
         "created_at": stat.st_ctime,
         "mtime": stat.st_mtime,
@@ -0,0 +1,194 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+from typing import Dict, List, NamedTuple, Optional, Set
+
+# Flags from <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_CLOEXEC = 0o2000000
+IN_NONBLOCK = 0o0004000
+
+WATCH_MASK = (
+    IN_MODIFY
+    | IN_ATTRIB
+    | IN_CLOSE_WRITE
+    | IN_MOVED_FROM
+    | IN_MOVED_TO
+    | IN_CREATE
+    | IN_DELETE
+    | IN_DELETE_SELF
+    | IN_MOVE_SELF
+    | IN_ONLYDIR
+)
+
+_EVENT_HEADER = struct.Struct("iIII")
+_READ_SIZE = 64 * 1024
+
+
+class InotifyEvent(NamedTuple):
+    wd: int
+    mask: int
+    cookie: int
+    name: str
+
+
+def is_supported() -> bool:
+    """True when the running platform exposes inotify."""
+    return sys.platform.startswith("linux") and _load_libc() is not None
+
+
+def _load_libc() -> Optional[ctypes.CDLL]:
+    name = ctypes.util.find_library("c") or "libc.so.6"
+    try:
+        libc = ctypes.CDLL(name, use_errno=True)
+    except OSError:
+        return None
+    if not hasattr(libc, "inotify_init1"):
+        return None
+    return libc
+
+
+class Inotify:
+    """Minimal ctypes binding around a single inotify file descriptor."""
+
+    def __init__(self) -> None:
+        libc = _load_libc()
+        if libc is None:
+            raise OSError("inotify is not available on this platform")
+        self._libc = libc
+        self.fd = libc.inotify_init1(IN_CLOEXEC | IN_NONBLOCK)
+        if self.fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+
+    def add_watch(self, path: str, mask: int = WATCH_MASK) -> int:
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err), path)
+        return int(wd)
+
+    def rm_watch(self, wd: int) -> None:
+        # The kernel may already have dropped it (IN_IGNORED); ignore errors.
+        self._libc.inotify_rm_watch(self.fd, wd)
+
+    def read_events(self, timeout: Optional[float]) -> List[InotifyEvent]:
+        """Waits up to timeout seconds and returns pending events."""
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return []
+        try:
+            buf = os.read(self.fd, _READ_SIZE)
+        except BlockingIOError:
+            return []
+
+        events = []
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(buf):
+            wd, mask, cookie, length = _EVENT_HEADER.unpack_from(buf, offset)
+            offset += _EVENT_HEADER.size
+            raw_name = buf[offset : offset + length].rstrip(b"\0")
+            offset += length
+            events.append(InotifyEvent(wd, mask, cookie, os.fsdecode(raw_name)))
+        return events
+
+    def close(self) -> None:
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+class RecursiveWatcher:
+    """
+    Watches a directory tree, translating inotify events into changed paths.
+    Directories named in ignored_dirs are never watched.
+    """
+
+    def __init__(self, root_dir: str, ignored_dirs: Set[str]) -> None:
+        self.root_dir = os.path.abspath(root_dir)
+        self.ignored_dirs = ignored_dirs
+        self.overflowed = False
+        self._inotify = Inotify()
+        self._dirs: Dict[int, str] = {}
+        self.watch_tree(self.root_dir)
+
+    def watch_tree(self, top: str) -> List[str]:
+        """Adds watches for top and its subdirectories. Returns files found."""
+        found: List[str] = []
+        for root, dirs, files in os.walk(top):
+            dirs[:] = [d for d in dirs if d not in self.ignored_dirs]
+            try:
+                wd = self._inotify.add_watch(root)
+            except FileNotFoundError:
+                continue
+            self._dirs[wd] = root
+            found.extend(os.path.join(root, f) for f in files)
+        return found
+
+    def _forget_tree(self, top: str) -> None:
+        """Drops watches under a directory that left its watched location."""
+        prefix = top + os.sep
+        for wd, path in list(self._dirs.items()):
+            if path == top or path.startswith(prefix):
+                self._inotify.rm_watch(wd)
+                del self._dirs[wd]
+
+    def poll(self, timeout: Optional[float]) -> Set[str]:
+        """
+        Returns the set of paths touched by events received within timeout.
+        Paths may be files or directories that were removed or moved out.
+        """
+        changed: Set[str] = set()
+        for event in self._inotify.read_events(timeout):
+            if event.mask & IN_Q_OVERFLOW:
+                self.overflowed = True
+                continue
+
+            parent = self._dirs.get(event.wd)
+            if event.mask & IN_IGNORED:
+                self._dirs.pop(event.wd, None)
+                continue
+            if parent is None:
+                continue
+
+            if not event.name:
+                # Event on the watched directory itself (DELETE_SELF/MOVE_SELF)
+                if event.mask & (IN_DELETE_SELF | IN_MOVE_SELF):
+                    self._inotify.rm_watch(event.wd)
+                    self._dirs.pop(event.wd, None)
+                    changed.add(parent)
+                continue
+
+            path = os.path.join(parent, event.name)
+            if event.mask & IN_ISDIR:
+                if event.name in self.ignored_dirs:
+                    continue
+                if event.mask & (IN_CREATE | IN_MOVED_TO):
+                    # Files may land before the watch exists, so list them now.
+                    changed.update(self.watch_tree(path))
+                else:
+                    if event.mask & IN_MOVED_FROM:
+                        self._forget_tree(path)
+                    changed.add(path)
+            else:
+                changed.add(path)
+
+        return changed
+
+    def close(self) -> None:
+        self._inotify.close()
@@ -0,0 +1,215 @@
+"""
+Change journal of the repository index, so that remote clients (see
+bff.core.remote) fetch what changed instead of the whole index.
+
+Every save of .bff/index.json is compared with the previous one entry by
+entry, through a fingerprint of the JSON text of each entry (a 128-bit
+BLAKE2b digest, so that no edit goes unnoticed), and the entries that changed or
+disappeared are appended to journal.jsonl as one record under the next
+sequence number:
+
+    {"seq":12,"put":{hash: entry, ...},"del":[hash, ...]}
+
+Entries are in their on-disk form (paths relative to the root). A client
+holding the index as of sequence n gets the records after n, as long as
+the journal still has them: it is trimmed from its oldest records once it
+outgrows a quarter of the index. journal.json holds the repository id
+(a new one after a reset), the current sequence and the oldest sequence
+the journal can start from ("base").
+"""
+
+import hashlib
+import io
+import json
+import os
+import uuid
+from typing import IO, Any, Dict, List, Optional, Tuple
+
+from bff.core.compact import pack_key, unpack_key
+from bff.core.constants import (
+    FINGERPRINTS_FILE,
+    INDEX_FILE,
+    JOURNAL_FILE,
+    JOURNAL_STATE_FILE,
+)
+from bff.core.locking import snapshot_lock
+
+# The journal is never trimmed below this size
+JOURNAL_MIN_BYTES = 1024 * 1024
+
+
+_FINGERPRINT_SIZE = 16
+# Fingerprint files of another layout are not read: the journal starts over
+_FINGERPRINTS_MAGIC = b"bff-fingerprints-blake2b-128\n"
+
+
+def _fingerprint(body: str) -> bytes:
+    return hashlib.blake2b(body.encode(), digest_size=_FINGERPRINT_SIZE).digest()
+
+
+def load_state(root_dir: str) -> Dict[str, Any]:
+    """journal.json of a repository (empty if it was never journaled)."""
+    try:
+        with open(os.path.join(root_dir, JOURNAL_STATE_FILE)) as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return state if isinstance(state, dict) and state.get("repo") else {}
+
+
+def _load_fingerprints(path: str) -> Optional[Dict[bytes, bytes]]:
+    """
+    Records of (key length, packed key, fingerprint) after a magic line,
+    see _save_fingerprints. None if the file is missing or of another layout.
+    """
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except OSError:
+        return None
+    if not data.startswith(_FINGERPRINTS_MAGIC):
+        return None
+    fingerprints = {}
+    pos = len(_FINGERPRINTS_MAGIC)
+    while pos < len(data):
+        end = pos + 1 + data[pos]
+        fingerprints[data[pos + 1 : end]] = data[end : end + _FINGERPRINT_SIZE]
+        pos = end + _FINGERPRINT_SIZE
+    if pos != len(data):
+        return None
+    return fingerprints
+
+
+def _save_fingerprints(path: str, fingerprints: Dict[bytes, bytes]) -> None:
+    with open(path + ".tmp", "wb") as f:
+        f.write(_FINGERPRINTS_MAGIC)
+        f.write(b"".join(bytes([len(k)]) + k + v for k, v in fingerprints.items()))
+    os.replace(path + ".tmp", path)
+
+
+def _write_json(path: str, data: Dict[str, Any]) -> None:
+    with open(path + ".tmp", "w") as f:
+        json.dump(data, f, indent=4)
+    os.replace(path + ".tmp", path)
+
+
+def _record_seq(line: bytes) -> int:
+    # Records are written compactly, starting with {"seq":N,
+    return int(line[7 : line.index(b",")])
+
+
+class Recorder:
+    """
+    Collects the changes made by one save of the index: pass it as the
+    on_entry callback of CompactIndex.dump, then commit once the new index
+    is in place.
+    """
+
+    def __init__(self, root_dir: str) -> None:
+        self.root_dir = root_dir
+        self.state = load_state(root_dir)
+        previous = (
+            _load_fingerprints(os.path.join(root_dir, FINGERPRINTS_FILE))
+            if self.state
+            else None
+        )
+        if previous is None:
+            # Nothing to compare with (first save, or fingerprints lost or
+            # of an older layout): this save starts the journal over
+            self.state = {}
+        self.previous = previous or {}
+        self.fingerprints: Dict[bytes, bytes] = {}
+        self.put: Dict[str, Any] = {}
+
+    def __call__(self, key: str, body: str) -> None:
+        packed = pack_key(key)
+        fingerprint = _fingerprint(body)
+        self.fingerprints[packed] = fingerprint
+        if self.state and self.previous.get(packed) != fingerprint:
+            self.put[key] = json.loads(body)
+
+    def commit(self) -> int:
+        """
+        Appends the changes to the journal and returns the new sequence.
+        Called under the exclusive snapshot lock, right after the index
+        file was replaced, so that readers see both or neither.
+        """
+        journal_path = os.path.join(self.root_dir, JOURNAL_FILE)
+        state = self.state
+        if not state:
+            state = {"repo": uuid.uuid4().hex, "seq": 0, "base": 0}
+            open(journal_path, "wb").close()
+        else:
+            deleted = [
+                unpack_key(k) for k in self.previous if k not in self.fingerprints
+            ]
+            if self.put or deleted:
+                state["seq"] += 1
+                record = {"seq": state["seq"], "put": self.put, "del": deleted}
+                with open(journal_path, "ab") as f:
+                    f.write(json.dumps(record, separators=(",", ":")).encode() + b"\n")
+                self._trim(journal_path, state)
+
+        _save_fingerprints(
+            os.path.join(self.root_dir, FINGERPRINTS_FILE), self.fingerprints
+        )
+        _write_json(os.path.join(self.root_dir, JOURNAL_STATE_FILE), state)
+        return state["seq"]
+
+    def _trim(self, journal_path: str, state: Dict[str, Any]) -> None:
+        """Drops the oldest records once the journal outgrows its budget."""
+        try:
+            index_size = os.path.getsize(os.path.join(self.root_dir, INDEX_FILE))
+        except OSError:
+            index_size = 0
+        limit = max(JOURNAL_MIN_BYTES, index_size // 4)
+        if os.path.getsize(journal_path) <= limit:
+            return
+        with open(journal_path, "rb") as f:
+            lines = f.readlines()
+        kept: List[bytes] = []
+        size = 0
+        for line in reversed(lines):
+            size += len(line)
+            if size > limit // 2:
+                break
+            kept.append(line)
+        kept.reverse()
+        state["base"] = _record_seq(kept[0]) - 1 if kept else state["seq"]
+        with open(journal_path + ".tmp", "wb") as f:
+            f.writelines(kept)
+        os.replace(journal_path + ".tmp", journal_path)
+
+
+def open_changes(
+    root_dir: str, repo: Optional[str], since: Optional[int]
+) -> Tuple[Dict[str, Any], IO[bytes]]:
+    """
+    What a client holding the index of repository repo as of sequence
+    since needs: a header and a body, either the journal records after
+    since ("full": false) or the whole index file when the journal no
+    longer reaches back that far ("full": true).
+    """
+    with snapshot_lock(root_dir):
+        state = load_state(root_dir)
+        header: Dict[str, Any] = {
+            "repo": state.get("repo"),
+            "seq": state.get("seq", 0),
+            "root": root_dir,
+            "full": True,
+        }
+        if (
+            state
+            and repo == state["repo"]
+            and since is not None
+            and state["base"] <= since <= state["seq"]
+        ):
+            with open(os.path.join(root_dir, JOURNAL_FILE), "rb") as f:
+                records = [line for line in f if _record_seq(line) > since]
+            header["full"] = False
+            return header, io.BytesIO(b"".join(records))
+        try:
+            # Opened under the lock: a later save replaces the file, not this one
+            return header, open(os.path.join(root_dir, INDEX_FILE), "rb")
+        except FileNotFoundError:
+            return header, io.BytesIO(b"{}")
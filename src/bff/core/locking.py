@@ -0,0 +1,79 @@
+import os
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+from bff.core import metrics
+from bff.core.constants import LOCK_FILE, SNAPSHOT_LOCK_FILE
+
+try:
+    import fcntl
+except ImportError:  # Windows: no advisory locks, commands run unguarded
+    fcntl = None  # type: ignore[assignment]
+
+# Two lock files, both taken with flock(2):
+# - LOCK_FILE is held exclusively by writing commands (index, clean,
+#   check --prune, migrate, watch, reset) from before they load the
+#   index until they have saved it, so two of them never interleave and
+#   overwrite each other's results.
+# - SNAPSHOT_LOCK_FILE is held shared by read-only commands while they
+#   load the files they need, and exclusively by save_index only around
+#   the rename that publishes a file. Readers thus never wait for a whole
+#   'index' run, and no save lands between the files they load: they see
+#   the repository as it was at one moment.
+
+
+@contextmanager
+def _flock(path: str, exclusive: bool, waiting_message: str) -> Iterator[None]:
+    fd = None
+    if fcntl is not None:
+        for flags in (os.O_RDWR | os.O_CREAT, os.O_RDONLY):
+            try:
+                fd = os.open(path, flags, 0o644)
+                break
+            except OSError:
+                # Read-only repository: the lock file may still exist;
+                # no repository at all: nothing to guard
+                continue
+    if fd is None:
+        yield
+        return
+    try:
+        mode = fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH
+        try:
+            fcntl.flock(fd, mode | fcntl.LOCK_NB)
+        except BlockingIOError:
+            if waiting_message:
+                print(waiting_message)
+            with metrics.timer("lock_wait"):
+                fcntl.flock(fd, mode)
+        yield
+    finally:
+        # Closing the descriptor releases the lock
+        os.close(fd)
+
+
+@contextmanager
+def writer_lock(root_dir: Optional[str] = None) -> Iterator[None]:
+    """
+    Exclusive lock on the repository for a read-modify-write of its index.
+    Waits for the running writer, if any. The index must be loaded after
+    the lock is taken, so that the previous writer's changes are seen.
+    """
+    path = os.path.join(root_dir, LOCK_FILE) if root_dir else LOCK_FILE
+    with _flock(path, True, "bff: Waiting for another bff process to finish..."):
+        yield
+
+
+@contextmanager
+def snapshot_lock(
+    root_dir: Optional[str] = None, exclusive: bool = False
+) -> Iterator[None]:
+    """
+    Shared lock for reading a consistent set of repository files, or
+    exclusive lock for replacing them (see save_index).
+    """
+    path = (
+        os.path.join(root_dir, SNAPSHOT_LOCK_FILE) if root_dir else SNAPSHOT_LOCK_FILE
+    )
+    with _flock(path, exclusive, ""):
+        yield
@@ -0,0 +1,236 @@
+"""
+Lightweight counters and latency histograms for the indexing pipeline.
+
+Collection is off by default: the module-level helpers then return
+immediately (a single global check), so instrumented hot paths cost nothing
+measurable. `enable()` installs a registry that records counters and
+power-of-two latency buckets under a lock, cheap enough to leave on.
+"""
+
+import json
+import math
+import threading
+import time
+from contextlib import nullcontext
+from typing import Any, ContextManager, Dict, List, Optional, Tuple
+
+# Bucket upper bounds are 2**e seconds for e in [_MIN_EXP, _MAX_EXP]
+# (~1us to ~68s); anything slower lands in the +Inf bucket.
+_MIN_EXP = -20
+_MAX_EXP = 6
+_BOUNDS = [2.0**e for e in range(_MIN_EXP, _MAX_EXP + 1)]
+
+_NULL_TIMER: ContextManager[None] = nullcontext()
+
+
+class Histogram:
+    """Latency histogram with fixed power-of-two buckets."""
+
+    __slots__ = ("count", "total", "min", "max", "buckets")
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = 0.0
+        self.buckets = [0] * (len(_BOUNDS) + 1)
+
+    def observe(self, seconds: float) -> None:
+        if seconds > 0:
+            mantissa, exp = math.frexp(seconds)
+            if mantissa == 0.5:
+                exp -= 1
+            idx = min(max(exp - _MIN_EXP, 0), len(_BOUNDS))
+        else:
+            idx = 0
+        self.buckets[idx] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds < self.min:
+            self.min = seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-quantile."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, n in zip(_BOUNDS, self.buckets):
+            seen += n
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def cumulative_buckets(self) -> List[Tuple[float, int]]:
+        result = []
+        seen = 0
+        for bound, n in zip(_BOUNDS, self.buckets):
+            seen += n
+            result.append((bound, seen))
+        result.append((math.inf, self.count))
+        return result
+
+
+class _Timer:
+    __slots__ = ("_registry", "_name", "_start")
+
+    def __init__(self, registry: "Metrics", name: str) -> None:
+        self._registry = registry
+        self._name = name
+        self._start = 0.0
+
+    def __enter__(self) -> None:
+        self._start = time.perf_counter()
+
+    def __exit__(self, *exc: Any) -> None:
+        self._registry.observe(self._name, time.perf_counter() - self._start)
+
+
+class Metrics:
+    """Thread-safe registry of counters and per-stage histograms."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.counters: Dict[str, float] = {}
+        self.stages: Dict[str, Histogram] = {}
+        self.started = time.perf_counter()
+        self.command = ""
+
+    def incr(self, name: str, value: float = 1) -> None:
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def observe(self, name: str, seconds: float) -> None:
+        with self._lock:
+            hist = self.stages.get(name)
+            if hist is None:
+                hist = self.stages[name] = Histogram()
+            hist.observe(seconds)
+
+    def timer(self, name: str) -> ContextManager[None]:
+        return _Timer(self, name)
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    # --- Exporters ---
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "command": self.command,
+            "wall_s": self.elapsed(),
+            "counters": dict(self.counters),
+            "stages": {
+                name: {
+                    "count": h.count,
+                    "sum_s": h.total,
+                    "min_s": h.min if h.count else 0.0,
+                    "max_s": h.max,
+                    "p50_s": h.quantile(0.50),
+                    "p90_s": h.quantile(0.90),
+                    "p99_s": h.quantile(0.99),
+                }
+                for name, h in sorted(self.stages.items())
+            },
+        }
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict(), indent=4)
+
+    def to_prometheus(self) -> str:
+        lines = [
+            "# HELP bff_stage_seconds Latency of bff pipeline stages.",
+            "# TYPE bff_stage_seconds histogram",
+        ]
+        for name, h in sorted(self.stages.items()):
+            for bound, n in h.cumulative_buckets():
+                le = "+Inf" if math.isinf(bound) else repr(bound)
+                lines.append(
+                    f'bff_stage_seconds_bucket{{stage="{name}",le="{le}"}} {n}'
+                )
+            lines.append(f'bff_stage_seconds_sum{{stage="{name}"}} {h.total!r}')
+            lines.append(f'bff_stage_seconds_count{{stage="{name}"}} {h.count}')
+        for name, value in sorted(self.counters.items()):
+            lines.append(f"# TYPE bff_{name}_total counter")
+            lines.append(f"bff_{name}_total {value}")
+        lines.append("# TYPE bff_command_seconds gauge")
+        lines.append(
+            f'bff_command_seconds{{command="{self.command}"}} {self.elapsed()!r}'
+        )
+        return "\n".join(lines) + "\n"
+
+    def to_summary(self) -> str:
+        wall = self.elapsed()
+        lines = [
+            "-" * 72,
+            f"BFF METRICS ({self.command or 'bff'}, {wall:.3f}s wall)",
+            "-" * 72,
+            f"{'stage':<14}{'count':>9}{'total s':>10}{'mean ms':>10}"
+            f"{'p50 ms':>9}{'p99 ms':>9}{'max ms':>10}",
+        ]
+        for name, h in sorted(self.stages.items()):
+            mean = h.total / h.count if h.count else 0.0
+            lines.append(
+                f"{name:<14}{h.count:>9}{h.total:>10.3f}{mean * 1e3:>10.3f}"
+                f"{h.quantile(0.5) * 1e3:>9.3f}{h.quantile(0.99) * 1e3:>9.3f}"
+                f"{h.max * 1e3:>10.3f}"
+            )
+        if self.counters:
+            lines.append("-" * 72)
+            for name, value in sorted(self.counters.items()):
+                lines.append(f"{name:<24}{value:>16.0f}{value / wall:>16.1f} /s")
+        hash_bytes = self.counters.get("hash_bytes")
+        hash_stage = self.stages.get("hash")
+        if hash_bytes and hash_stage and hash_stage.total:
+            lines.append(
+                f"{'hash throughput':<24}{hash_bytes / hash_stage.total / 2**20:>16.1f}"
+                " MB/s per worker"
+            )
+        lines.append("-" * 72)
+        return "\n".join(lines) + "\n"
+
+    def render(self, fmt: str) -> str:
+        if fmt == "json":
+            return self.to_json()
+        if fmt == "prometheus":
+            return self.to_prometheus()
+        return self.to_summary()
+
+
+_registry: Optional[Metrics] = None
+
+
+def enable(command: str = "") -> Metrics:
+    """Starts collecting and returns the active registry."""
+    global _registry
+    _registry = Metrics()
+    _registry.command = command
+    return _registry
+
+
+def disable() -> None:
+    global _registry
+    _registry = None
+
+
+def active() -> Optional[Metrics]:
+    return _registry
+
+
+def timer(name: str) -> ContextManager[None]:
+    """Times the enclosed block as one observation of stage `name`."""
+    if _registry is None:
+        return _NULL_TIMER
+    return _registry.timer(name)
+
+
+def incr(name: str, value: float = 1) -> None:
+    if _registry is not None:
+        _registry.incr(name, value)
+
+
+def observe(name: str, seconds: float) -> None:
+    if _registry is not None:
+        _registry.observe(name, seconds)
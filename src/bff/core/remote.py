@@ -0,0 +1,305 @@
+"""
+Pulling the index of another repository over a pluggable transport.
+
+A transport answers one request: "the index of this repository, given
+that I hold it as of (repo id, sequence)". The answer is a JSON header
+line, {"repo", "seq", "root", "full"}, followed either by the raw index
+file ("full": true) or by the journal records after that sequence (see
+bff.core.journal). Transports are registered per URL scheme:
+- http(s)://host:port talks to 'bff serve' (gzip-encoded),
+- file:///path/to/repository reads the repository directly, the way the
+  server does. It serves as a local stand-in, and for repositories on
+  network mounts.
+
+Pulled indexes are cached in .bff/remotes/<url digest>/ with the version
+they are at, so that the next pull only transfers what changed since.
+
+Transports also fetch contents by hash ('bff sync'), from a copy whose
+size and mtime still match the index.
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import urllib.parse
+import urllib.request
+from typing import IO, Any, Callable, Dict, Mapping, Optional, Protocol, Tuple
+
+from bff.core.compact import CompactIndex
+from bff.core.constants import REMOTES_DIR
+from bff.core.index_manager import path_records
+from bff.core.journal import open_changes
+
+# Paths of the endpoints of 'bff serve'
+INDEX_ENDPOINT = "/index"
+CONTENT_ENDPOINT = "/content/"
+_COPY_BUFFER = 1024 * 1024
+# Seconds without data before a remote is given up (raises OSError)
+_TIMEOUT = 30
+
+
+def copy_stream(source: IO[bytes], target: IO[bytes]) -> None:
+    while True:
+        block = source.read(_COPY_BUFFER)
+        if not block:
+            break
+        target.write(block)
+
+
+def open_copy(entry: Mapping[str, Any], root: Optional[str] = None) -> IO[bytes]:
+    """
+    Opens a copy of the content of an entry whose size and mtime still
+    match the index, so that what is read is what was hashed. With root,
+    paths outside of it are never opened. Raises FileNotFoundError if
+    there is no such copy.
+    """
+    root_prefix = os.path.join(root, "") if root else ""
+    for path, record in path_records(entry):
+        if not path.startswith(root_prefix):
+            continue
+        try:
+            f = open(path, "rb")
+        except OSError:
+            continue
+        st = os.fstat(f.fileno())
+        if st.st_size == entry.get("size") and (
+            record is None or st.st_mtime_ns == record[2]
+        ):
+            return f
+        f.close()
+    raise FileNotFoundError("No unchanged copy of this content")
+
+
+class _Stream(Protocol):
+    """What transports read an index from."""
+
+    def read(self, size: int = -1, /) -> bytes: ...
+
+    def readline(self, size: int = -1, /) -> bytes: ...
+
+    def close(self) -> None: ...
+
+
+class _CountingReader:
+    """Counts the bytes read from a stream."""
+
+    def __init__(self, raw: _Stream) -> None:
+        self.raw = raw
+        self.count = 0
+
+    def read(self, size: int = -1) -> bytes:
+        data = self.raw.read(size)
+        self.count += len(data)
+        return data
+
+    def readline(self, size: int = -1) -> bytes:
+        data = self.raw.readline(size)
+        self.count += len(data)
+        return data
+
+    def close(self) -> None:
+        self.raw.close()
+
+
+class Transport:
+    """Fetches the index of one remote repository."""
+
+    def __init__(self, url: str) -> None:
+        self.url = url
+        self._counter: Optional[_CountingReader] = None
+        # Set by _open when the response is gzip-encoded
+        self._compressed = False
+
+    @property
+    def received(self) -> int:
+        """Bytes transferred so far by the last fetch."""
+        return self._counter.count if self._counter else 0
+
+    def fetch(
+        self, repo: Optional[str], since: Optional[int]
+    ) -> Tuple[Dict[str, Any], IO[bytes]]:
+        """(header, body) as described in the module docstring."""
+        self._counter = _CountingReader(self._open(repo, since))
+        stream: Any = self._counter
+        if self._compressed:
+            stream = gzip.GzipFile(fileobj=stream)
+        return json.loads(stream.readline()), stream
+
+    def _open(self, repo: Optional[str], since: Optional[int]) -> _Stream:
+        raise NotImplementedError
+
+    def open_content(self, file_hash: str, entry: Mapping[str, Any]) -> IO[bytes]:
+        """
+        A stream of the content of an entry of the fetched index. Raises
+        OSError if no copy of it is available.
+        """
+        raise NotImplementedError
+
+
+class HttpTransport(Transport):
+    """Talks to 'bff serve'."""
+
+    def _open(self, repo: Optional[str], since: Optional[int]) -> _Stream:
+        url = self.url.rstrip("/") + INDEX_ENDPOINT
+        if repo is not None and since is not None:
+            url += "?" + urllib.parse.urlencode({"repo": repo, "since": since})
+        request = urllib.request.Request(url, headers={"Accept-Encoding": "gzip"})
+        response = urllib.request.urlopen(request, timeout=_TIMEOUT)
+        self._compressed = response.headers.get("Content-Encoding") == "gzip"
+        return response
+
+    def open_content(self, file_hash: str, entry: Mapping[str, Any]) -> IO[bytes]:
+        url = self.url.rstrip("/") + CONTENT_ENDPOINT + urllib.parse.quote(file_hash)
+        return urllib.request.urlopen(url, timeout=_TIMEOUT)
+
+
+class FileTransport(Transport):
+    """Reads a repository on a local or mounted filesystem."""
+
+    @property
+    def root(self) -> str:
+        path = urllib.parse.unquote(urllib.parse.urlparse(self.url).path)
+        return os.path.abspath(path)
+
+    def _open(self, repo: Optional[str], since: Optional[int]) -> _Stream:
+        header, body = open_changes(self.root, repo, since)
+        return _Prefixed(json.dumps(header).encode() + b"\n", body)
+
+    def open_content(self, file_hash: str, entry: Mapping[str, Any]) -> IO[bytes]:
+        return open_copy(entry)
+
+
+class _Prefixed:
+    """A stream made of some bytes, then another stream."""
+
+    def __init__(self, prefix: bytes, rest: IO[bytes]) -> None:
+        self.prefix = prefix
+        self.rest = rest
+
+    def read(self, size: int = -1) -> bytes:
+        if not self.prefix:
+            return self.rest.read(size)
+        if size < 0:
+            data, self.prefix = self.prefix + self.rest.read(), b""
+            return data
+        data, self.prefix = self.prefix[:size], self.prefix[size:]
+        return data
+
+    def readline(self, size: int = -1) -> bytes:
+        if not self.prefix:
+            return self.rest.readline(size)
+        cut = self.prefix.find(b"\n") + 1 or len(self.prefix)
+        if size >= 0:
+            cut = min(cut, size)
+        data, self.prefix = self.prefix[:cut], self.prefix[cut:]
+        return data
+
+    def close(self) -> None:
+        self.rest.close()
+
+
+TRANSPORTS: Dict[str, Callable[[str], Transport]] = {
+    "http": HttpTransport,
+    "https": HttpTransport,
+    "file": FileTransport,
+}
+
+
+def is_remote(target: str) -> bool:
+    """True if target is a URL with a registered transport."""
+    return urllib.parse.urlparse(target).scheme in TRANSPORTS
+
+
+def open_transport(url: str) -> Transport:
+    scheme = urllib.parse.urlparse(url).scheme
+    if scheme not in TRANSPORTS:
+        raise ValueError(f"No transport for '{scheme}' URLs")
+    return TRANSPORTS[scheme](url)
+
+
+def cache_dir(url: str, root_dir: Optional[str] = None) -> str:
+    """Where the index pulled from url is cached."""
+    digest = hashlib.sha256(url.encode()).hexdigest()[:16]
+    remotes = os.path.join(root_dir, REMOTES_DIR) if root_dir else REMOTES_DIR
+    return os.path.join(remotes, digest)
+
+
+def _load_cached(cache: str) -> Tuple[Dict[str, Any], Optional[CompactIndex]]:
+    try:
+        with open(os.path.join(cache, "state.json")) as f:
+            state = json.load(f)
+        with open(os.path.join(cache, "index.json")) as f:
+            return state, CompactIndex.load(f, state["root"])
+    except (OSError, ValueError, KeyError):
+        return {}, None
+
+
+def _write_atomically(path: str, write: Callable[[IO[Any]], None], mode: str) -> None:
+    temp = f"{path}.{os.getpid()}.tmp"
+    with open(temp, mode) as f:
+        write(f)
+    os.replace(temp, path)
+
+
+def _apply_records(index: CompactIndex, body: IO[bytes], since: int) -> None:
+    """Applies the journal records after since, which must follow each other."""
+    seq = since
+    for line in iter(body.readline, b""):
+        record = json.loads(line)
+        if record["seq"] != seq + 1:
+            raise ValueError(f"Journal gap after sequence {seq}")
+        for key, entry in record["put"].items():
+            index[key] = entry
+        for key in record["del"]:
+            index.pop(key, None)
+        seq = record["seq"]
+
+
+def _update(
+    transport: Transport,
+    cache: str,
+    state: Dict[str, Any],
+    index: Optional[CompactIndex],
+) -> Tuple[Dict[str, Any], CompactIndex]:
+    since = state.get("seq") if index is not None else None
+    header, body = transport.fetch(state.get("repo"), since)
+    index_path = os.path.join(cache, "index.json")
+    try:
+        if index is not None and since is not None and not header["full"]:
+            _apply_records(index, body, since)
+            _write_atomically(index_path, index.dump, "w")
+        else:
+            _write_atomically(index_path, lambda f: copy_stream(body, f), "wb")
+            with open(index_path) as f:
+                index = CompactIndex.load(f, header["root"])
+    finally:
+        body.close()
+    return header, index
+
+
+def pull(url: str, root_dir: Optional[str] = None) -> Tuple[CompactIndex, Transport]:
+    """
+    Brings the cached copy of the index at url up to date and returns it
+    (paths resolved against the remote root), with the transport used.
+    """
+    transport = open_transport(url)
+    cache = cache_dir(url, root_dir)
+    os.makedirs(cache, exist_ok=True)
+    state, index = _load_cached(cache)
+    try:
+        header, index = _update(transport, cache, state, index)
+    except ValueError:
+        # Out of step with the remote journal: start over from a full copy
+        header, index = _update(transport, cache, {}, None)
+
+    state = {
+        "url": url,
+        "repo": header["repo"],
+        "seq": header["seq"],
+        "root": header["root"],
+    }
+    _write_atomically(
+        os.path.join(cache, "state.json"), lambda f: json.dump(state, f, indent=4), "w"
+    )
+    return index, transport
@@ -0,0 +1,156 @@
+"""
+Near-duplicate detection primitives.
+
+Images get a 64-bit difference hash (dHash, needs Pillow) compared by
+Hamming distance through a BK-tree. Other files get a MinHash sketch over
+their content-defined chunk digests, and candidates are found with LSH
+banding, so neither path compares every pair of files.
+"""
+
+from collections import defaultdict
+from typing import Any, Dict, Generic, Iterable, List, Optional, Set, Tuple, TypeVar
+
+try:
+    from PIL import Image  # type: ignore[import-not-found]
+except ImportError:  # Optional dependency: pip install bff[similarity]
+    Image = None
+
+T = TypeVar("T")
+
+NUM_PERM = 64
+LSH_BANDS = 16
+_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+
+def _permutations(count: int) -> List[Tuple[int, int]]:
+    # Fixed coefficients so that sketches stay comparable across runs
+    state = 0x9E3779B97F4A7C15
+    perms = []
+    for _ in range(count):
+        state = (state * 6364136223846793005 + 1442695040888963407) % (1 << 64)
+        a = state % (_PRIME - 1) + 1
+        state = (state * 6364136223846793005 + 1442695040888963407) % (1 << 64)
+        perms.append((a, state % _PRIME))
+    return perms
+
+
+_PERMS = _permutations(NUM_PERM)
+
+
+def minhash(tokens: Iterable[str]) -> List[int]:
+    """MinHash sketch of a set of hex digests (e.g. chunk digests)."""
+    values = {int(token[:16], 16) for token in tokens}
+    if not values:
+        return []
+    return [min(((a * v + b) % _PRIME) & _MAX_HASH for v in values) for a, b in _PERMS]
+
+
+def estimate_jaccard(a: List[int], b: List[int]) -> float:
+    if not a or len(a) != len(b):
+        return 0.0
+    return sum(x == y for x, y in zip(a, b)) / len(a)
+
+
+def lsh_pairs(sketches: Dict[T, List[int]], bands: int = LSH_BANDS) -> Set[Tuple[T, T]]:
+    """Candidate pairs sharing at least one band of their sketches."""
+    buckets: Dict[Tuple[int, Tuple[int, ...]], List[T]] = defaultdict(list)
+    for key, sketch in sketches.items():
+        if len(sketch) != NUM_PERM:
+            continue
+        rows = NUM_PERM // bands
+        for band in range(bands):
+            buckets[(band, tuple(sketch[band * rows : (band + 1) * rows]))].append(key)
+
+    pairs: Set[Tuple[T, T]] = set()
+    for members in buckets.values():
+        for i in range(len(members)):
+            for j in range(i + 1, len(members)):
+                a, b = members[i], members[j]
+                pairs.add((a, b) if str(a) < str(b) else (b, a))
+    return pairs
+
+
+def image_dhash(filepath: str) -> Optional[int]:
+    """64-bit difference hash of an image, or None if it cannot be read."""
+    if Image is None:
+        return None
+    try:
+        with Image.open(filepath) as img:
+            small = img.convert("L").resize((9, 8))
+            pixels = list(small.getdata())
+    except Exception:
+        return None
+
+    value = 0
+    for row in range(8):
+        for col in range(8):
+            left = pixels[row * 9 + col]
+            right = pixels[row * 9 + col + 1]
+            value = (value << 1) | (left > right)
+    return value
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+class BKTree(Generic[T]):
+    """Burkhard-Keller tree over 64-bit hashes with Hamming distance."""
+
+    def __init__(self) -> None:
+        self._root: Optional[List[Any]] = None
+
+    def add(self, value: int, item: T) -> None:
+        node = [value, [item], {}]
+        if self._root is None:
+            self._root = node
+            return
+        current = self._root
+        while True:
+            dist = hamming(value, current[0])
+            if dist == 0:
+                current[1].append(item)
+                return
+            child = current[2].get(dist)
+            if child is None:
+                current[2][dist] = node
+                return
+            current = child
+
+    def search(self, value: int, radius: int) -> List[Tuple[int, T]]:
+        """All (distance, item) within radius of value."""
+        results: List[Tuple[int, T]] = []
+        stack = [self._root] if self._root is not None else []
+        while stack:
+            node = stack.pop()
+            dist = hamming(value, node[0])
+            if dist <= radius:
+                results.extend((dist, item) for item in node[1])
+            # Triangle inequality: only subtrees at |d - dist| <= radius qualify
+            for edge, child in node[2].items():
+                if dist - radius <= edge <= dist + radius:
+                    stack.append(child)
+        return results
+
+
+def cluster_pairs(pairs: Iterable[Tuple[T, T]]) -> List[Set[T]]:
+    """Connected components (union-find) of a set of pairs."""
+    parent: Dict[T, T] = {}
+
+    def find(x: T) -> T:
+        parent.setdefault(x, x)
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    for a, b in pairs:
+        root_a, root_b = find(a), find(b)
+        if root_a != root_b:
+            parent[root_a] = root_b
+
+    groups: Dict[T, Set[T]] = defaultdict(set)
+    for x in parent:
+        groups[find(x)].add(x)
+    return list(groups.values())
@@ -1,17 +1,13 @@
 import argparse
-import multiprocessing
+import re
 import sys
 from datetime import datetime
 
-from bff.commands.check import check_command
-from bff.commands.clean import clean_command
-from bff.commands.diff import diff_command
-from bff.commands.index import IndexFilters, index_command
-from bff.commands.init import init_command
-from bff.commands.locate import locate_command
-from bff.commands.reset import reset_command
-from bff.commands.stats import stats_command
-from bff.commands.verify import verify_command
+from bff.core.constants import EXPORT_FORMATS, INDEX_ORDERS, LINK_MODES
+from bff.core.filtering import IndexFilters
+
+# Command modules are imported inside the dispatch below so that each
+# invocation only pays for what it uses (tqdm, libmagic, thread pools...).
 
 
 def parse_date(date_str: str) -> float:
@@ -23,8 +19,152 @@ def parse_date(date_str: str) -> float:
         sys.exit(1)
 
 
+def _add_filter_arguments(parser: argparse.ArgumentParser, verb: str) -> None:
+    parser.add_argument("--ext", nargs="+", help=f"Only {verb} these extensions")
+    parser.add_argument("--min-size", type=int, default=0, help="Min bytes")
+    parser.add_argument("--after", type=str, help="Created after (YYYY-MM-DD)")
+    parser.add_argument(
+        "--include",
+        nargs="+",
+        metavar="GLOB",
+        help="Only files matching a glob (name, or path from the root if it has a /)",
+    )
+    parser.add_argument(
+        "--exclude",
+        nargs="+",
+        metavar="GLOB",
+        help="Skip files and directories matching a glob",
+    )
+    parser.add_argument(
+        "--mime", nargs="+", metavar="TYPE", help="Only these mimetypes (globs)"
+    )
+    parser.add_argument(
+        "--regex", help="Only paths (relative to the root) matching this regex"
+    )
+    parser.add_argument(
+        "--modified-after", type=str, help="Modified on or after (YYYY-MM-DD)"
+    )
+    parser.add_argument(
+        "--modified-before", type=str, help="Modified before (YYYY-MM-DD)"
+    )
+
+
+def _filters(args: argparse.Namespace) -> IndexFilters:
+    if args.regex:
+        try:
+            re.compile(args.regex)
+        except re.error as e:
+            print(f"Error: Invalid --regex ({e})")
+            sys.exit(1)
+    return IndexFilters(
+        extensions=args.ext,
+        min_size_bytes=args.min_size,
+        after_date=parse_date(args.after) if args.after else None,
+        include=args.include,
+        exclude=args.exclude,
+        mimetypes=args.mime,
+        path_regex=args.regex,
+        modified_after=(
+            parse_date(args.modified_after) if args.modified_after else None
+        ),
+        modified_before=(
+            parse_date(args.modified_before) if args.modified_before else None
+        ),
+    )
+
+
+def _dispatch(args: argparse.Namespace) -> None:
+    if args.command == "init":
+        from bff.commands.init import init_command
+
+        init_command()
+    elif args.command == "index":
+        from bff.commands.index import index_command
+
+        index_command(
+            _filters(args),
+            trust_dirs=args.trust_dirs,
+            chunks=args.chunks,
+            similarity=args.similarity,
+            order=args.order,
+            check_moves=args.check_moves,
+        )
+    elif args.command == "stats":
+        from bff.commands.stats import stats_command
+
+        stats_command(_filters(args))
+    elif args.command == "check":
+        from bff.commands.check import check_command
+
+        check_command(prune=args.prune)
+    elif args.command == "clean":
+        from bff.commands.clean import clean_command
+
+        clean_command(use_symlinks=args.link, filters=_filters(args))
+    elif args.command == "reset":
+        from bff.commands.reset import reset_command
+
+        reset_command(force=args.force)
+    elif args.command == "locate":
+        from bff.commands.locate import locate_command
+
+        locate_command(args.file)
+    elif args.command == "verify":
+        from bff.commands.verify import verify_command
+
+        verify_command()
+    elif args.command == "diff":
+        from bff.commands.diff import diff_command
+
+        diff_command(args.target, _filters(args))
+    elif args.command == "watch":
+        from bff.commands.watch import watch_command
+
+        watch_command(_filters(args), debounce=args.debounce)
+    elif args.command == "similar":
+        from bff.commands.similar import similar_command
+
+        similar_command(threshold=args.threshold, max_distance=args.distance)
+    elif args.command == "sync":
+        from bff.commands.sync import sync_command
+
+        sync_command(
+            args.target,
+            link_mode=args.link_mode,
+            jobs=args.jobs,
+            filters=_filters(args),
+        )
+    elif args.command == "serve":
+        from bff.commands.serve import serve_command
+
+        serve_command(host=args.host, port=args.port, allow_content=args.allow_content)
+    elif args.command == "export":
+        from bff.commands.export import export_command
+
+        export_command(args.output, fmt=args.format, jobs=args.jobs)
+    elif args.command == "import":
+        from bff.commands.export import import_command
+
+        import_command(args.source, fmt=args.format, force=args.force)
+    elif args.command == "migrate":
+        from bff.commands.migrate import migrate_command
+
+        migrate_command(old_root=args.old_root)
+
+
 def main() -> None:
     parser = argparse.ArgumentParser(description="BFF: Box For File - Manager")
+    parser.add_argument(
+        "--metrics",
+        choices=["summary", "json", "prometheus"],
+        help="Record per-stage counters and latencies, then export them",
+    )
+    parser.add_argument(
+        "--profile", action="store_true", help="Shortcut for --metrics summary"
+    )
+    parser.add_argument(
+        "--metrics-file", help="Write the metrics report here instead of stderr"
+    )
     subparsers = parser.add_subparsers(dest="command", help="Commands")
 
     # 1. Init
@@ -32,19 +172,42 @@ def main() -> None:
 
     # 2. Index
     idx = subparsers.add_parser("index", help="Index files")
-    idx.add_argument("--ext", nargs="+", help="Whitelist extensions")
-    idx.add_argument("--after", type=str, help="Date YYYY-MM-DD")
-    idx.add_argument("--min-size", type=int, default=0, help="Min bytes")
+    _add_filter_arguments(idx, "index")
+    idx.add_argument(
+        "--trust-dirs",
+        action="store_true",
+        help="Skip stat-ing indexed files in directories whose mtime is unchanged",
+    )
+    idx.add_argument(
+        "--chunks",
+        action="store_true",
+        help="Also build the content-defined chunk index (block-level stats)",
+    )
+    idx.add_argument(
+        "--similarity",
+        action="store_true",
+        help="Also compute near-duplicate signatures (implies --chunks)",
+    )
+    idx.add_argument(
+        "--order",
+        choices=INDEX_ORDERS,
+        default="walk",
+        help="Hashing queue policy (default: walk order)",
+    )
+    idx.add_argument(
+        "--check-moves",
+        action="store_true",
+        help="Compare the first and last blocks of moved files before reusing their hash",
+    )
 
     # 3. Stats (Dashboard)
-    subparsers.add_parser("stats", help="Show repository statistics")
+    stats_parser = subparsers.add_parser("stats", help="Show repository statistics")
+    _add_filter_arguments(stats_parser, "count")
 
     # 4. Clean (Deduplicate)
     clean_parser = subparsers.add_parser("clean", help="Deduplicate files")
     clean_parser.add_argument("--link", "-l", action="store_true", help="Use symlinks")
-    # Add filters to clean command
-    clean_parser.add_argument("--ext", nargs="+", help="Only clean specific extensions")
-    clean_parser.add_argument("--min-size", type=int, default=0, help="Min size bytes")
+    _add_filter_arguments(clean_parser, "clean")
 
     # 5. Check (Integrity)
     chk = subparsers.add_parser("check", help="Verify index integrity")
@@ -69,37 +232,138 @@ def main() -> None:
     )
     diff_parser.add_argument(
         "target",
-        help="Path to the target BFF repository (directory) or an index.json file",
+        help=(
+            "Path to the target BFF repository (directory) or an index.json file, "
+            "or the URL of one (http://host:port from 'bff serve', file:///path)"
+        ),
+    )
+    _add_filter_arguments(diff_parser, "compare")
+
+    # --- WATCH ---
+    watch_parser = subparsers.add_parser(
+        "watch", help="Keep the index updated from filesystem events"
+    )
+    _add_filter_arguments(watch_parser, "index")
+    watch_parser.add_argument(
+        "--debounce",
+        type=float,
+        default=1.0,
+        help="Seconds of quiet before applying changes",
+    )
+
+    # --- SIMILAR ---
+    similar_parser = subparsers.add_parser(
+        "similar", help="List near-duplicate clusters"
+    )
+    similar_parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.5,
+        help="Minimum estimated chunk overlap (Jaccard) for non-image files",
+    )
+    similar_parser.add_argument(
+        "--distance",
+        type=int,
+        default=10,
+        help="Maximum perceptual hash distance (bits out of 64) for images",
+    )
+
+    # --- SYNC ---
+    sync_parser = subparsers.add_parser(
+        "sync", help="Copy the contents of another repository missing here"
+    )
+    sync_parser.add_argument(
+        "target", help="Path or URL of the target repository (as for diff)"
+    )
+    sync_parser.add_argument(
+        "--link-mode",
+        choices=LINK_MODES,
+        default="auto",
+        help=(
+            "How extra paths of a content are made from its first copy: "
+            "reflink, else hardlink (auto); reflink, else copy; or copy"
+        ),
+    )
+    sync_parser.add_argument(
+        "--jobs", type=int, default=4, help="Contents transferred in parallel"
+    )
+    _add_filter_arguments(sync_parser, "sync")
+
+    # --- SERVE ---
+    serve_parser = subparsers.add_parser(
+        "serve", help="Serve the index over HTTP for remote 'diff'"
+    )
+    serve_parser.add_argument(
+        "--host", default="127.0.0.1", help="Address to listen on (default: local only)"
+    )
+    serve_parser.add_argument("--port", type=int, default=8765, help="Port")
+    serve_parser.add_argument(
+        "--allow-content",
+        action="store_true",
+        help="Also serve file contents, for remote 'sync' (no authentication)",
+    )
+
+    # --- EXPORT / IMPORT ---
+    export_parser = subparsers.add_parser(
+        "export", help="Write the index as JSON Lines, CSV or Parquet"
+    )
+    export_parser.add_argument(
+        "output", help="Output file (.jsonl, .csv or .parquet; .gz or .zst compresses)"
+    )
+    export_parser.add_argument(
+        "--format", choices=EXPORT_FORMATS, help="Default: from the file name"
+    )
+    export_parser.add_argument(
+        "--jobs", type=int, help="Processes for large indexes (default: all cores)"
+    )
+    import_parser = subparsers.add_parser(
+        "import", help="Replace the index with an export"
+    )
+    import_parser.add_argument("source", help="File written by 'bff export'")
+    import_parser.add_argument(
+        "--format", choices=EXPORT_FORMATS, help="Default: from the file name"
+    )
+    import_parser.add_argument(
+        "--force", "-f", action="store_true", help="Skip confirmation"
+    )
+
+    # --- MIGRATE ---
+    migrate_parser = subparsers.add_parser(
+        "migrate", help="Rewrite the index with root-relative paths"
+    )
+    migrate_parser.add_argument(
+        "--from",
+        dest="old_root",
+        help="Previous repository root, to rebase paths after a move",
     )
 
     args = parser.parse_args()
 
-    if args.command == "init":
-        init_command()
-    elif args.command == "index":
-        ts = parse_date(args.after) if args.after else None
-        filters = IndexFilters(args.ext, args.min_size, ts)
-        index_command(filters)
-    elif args.command == "stats":
-        stats_command()
-    elif args.command == "check":
-        check_command(prune=args.prune)
-    elif args.command == "clean":
-        filters = IndexFilters(extensions=args.ext, min_size_bytes=args.min_size)
-        clean_command(use_symlinks=args.link, filters=filters)
-    elif args.command == "reset":
-        reset_command(force=args.force)
-    elif args.command == "locate":
-        locate_command(args.file)
-    elif args.command == "verify":
-        verify_command()
-    elif args.command == "diff":
-        diff_command(args.target)
-    else:
+    if args.command is None:
         parser.print_help()
         sys.exit(1)
 
+    metrics_format = args.metrics or ("summary" if args.profile else None)
+    if not metrics_format:
+        _dispatch(args)
+        return
+
+    from bff.core import metrics
+
+    registry = metrics.enable(args.command)
+    try:
+        _dispatch(args)
+    finally:
+        report = registry.render(metrics_format)
+        if args.metrics_file:
+            with open(args.metrics_file, "w") as f:
+                f.write(report)
+        else:
+            sys.stderr.write(report)
+
 
 if __name__ == "__main__":
+    import multiprocessing
+
     multiprocessing.freeze_support()
     main()
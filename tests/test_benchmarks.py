@@ -0,0 +1,54 @@
+# tests/test_benchmarks.py
+import hashlib
+import os
+import sys
+from dataclasses import replace
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "benchmarks"))
+
+from synthetic import TreeSpec, generate_tree, plan_tree  # noqa: E402
+
+
+def _digests(root):
+    result = {}
+    for dirpath, _, files in os.walk(root):
+        for name in files:
+            path = os.path.join(dirpath, name)
+            with open(path, "rb") as f:
+                result[os.path.relpath(path, root)] = hashlib.sha256(
+                    f.read()
+                ).hexdigest()
+    return result
+
+
+def test_generator_is_deterministic(tmp_path):
+    spec = TreeSpec(files=40, median_size=512, depth=2, fanout=3, seed=7)
+    first = generate_tree(str(tmp_path / "a"), spec)
+    second = generate_tree(str(tmp_path / "b"), spec)
+
+    assert first == second
+    assert _digests(tmp_path / "a") == _digests(tmp_path / "b")
+
+
+def test_generator_honors_duplicate_ratio_and_depth(tmp_path):
+    spec = TreeSpec(files=500, median_size=64, duplicate_ratio=0.5, depth=3, fanout=2)
+    plan = plan_tree(spec)
+
+    unique = len({item["content_id"] for item in plan})
+    assert 0.4 < 1 - unique / len(plan) < 0.6
+    assert all(item["path"].count(os.sep) == 3 for item in plan)
+
+    manifest = generate_tree(str(tmp_path / "tree"), spec)
+    assert len(set(_digests(tmp_path / "tree").values())) == manifest["unique_files"]
+
+
+def test_changed_variant_partly_matches_the_tree(tmp_path):
+    spec = TreeSpec(files=200, median_size=64, depth=1, fanout=2)
+    generate_tree(str(tmp_path / "a"), spec)
+    generate_tree(str(tmp_path / "b"), replace(spec, changed_ratio=0.25))
+    a, b = _digests(tmp_path / "a"), _digests(tmp_path / "b")
+
+    assert a.keys() == b.keys()
+    changed = sum(a[path] != b[path] for path in a)
+    assert 0.15 < changed / len(a) < 0.35
+    assert set(b.values()) - set(a.values())
@@ -0,0 +1,76 @@
+# tests/test_chunking.py
+import random
+
+import pytest
+
+from bff.commands.index import IndexFilters, index_command
+from bff.commands.init import init_command
+from bff.commands.stats import stats_command
+from bff.core import chunking
+from bff.core.chunking import ChunkParams, iter_chunks
+
+SMALL = ChunkParams(min_size=256, avg_size=1024, max_size=4096)
+
+
+def _random_bytes(n, seed=1):
+    return random.Random(seed).getrandbits(n * 8).to_bytes(n, "little")
+
+
+def test_chunks_cover_file_within_bounds(tmp_path):
+    p = tmp_path / "data.bin"
+    p.write_bytes(_random_bytes(100_000))
+
+    chunks = list(iter_chunks(str(p), SMALL))
+
+    assert sum(length for _, length in chunks) == 100_000
+    assert all(length <= SMALL.max_size for _, length in chunks)
+    assert all(length >= SMALL.min_size for _, length in chunks[:-1])
+
+
+def test_chunking_is_streaming_invariant(tmp_path):
+    p = tmp_path / "data.bin"
+    p.write_bytes(_random_bytes(50_000))
+
+    # Tiny reads force boundaries to be decided across buffer refills
+    assert list(iter_chunks(str(p), SMALL, read_size=1000)) == list(
+        iter_chunks(str(p), SMALL)
+    )
+
+
+def test_insertion_only_changes_nearby_chunks(tmp_path):
+    data = _random_bytes(200_000)
+    a, b = tmp_path / "a.bin", tmp_path / "b.bin"
+    a.write_bytes(data)
+    b.write_bytes(data[:1000] + b"inserted" + data[1000:])
+
+    chunks_a = {digest for digest, _ in iter_chunks(str(a), SMALL)}
+    chunks_b = {digest for digest, _ in iter_chunks(str(b), SMALL)}
+
+    assert len(chunks_a & chunks_b) >= 0.9 * len(chunks_a)
+
+
+@pytest.mark.skipif(chunking.np is None, reason="numpy not installed")
+def test_numpy_and_python_cuts_match():
+    buf = _random_bytes(300_000, seed=3)
+    for eof in (True, False):
+        assert chunking._find_cuts_numpy(buf, SMALL, eof) == chunking._find_cuts_python(
+            buf, SMALL, eof
+        )
+
+
+def test_stats_reports_block_level_savings(workspace, capsys):
+    data = _random_bytes(600_000, seed=5)
+    with open("image-v1.bin", "wb") as f:
+        f.write(data)
+    with open("image-v2.bin", "wb") as f:
+        f.write(data[:300_000] + b"patched" + data[300_000:])
+
+    init_command()
+    index_command(IndexFilters(), chunks=True)
+    capsys.readouterr()
+    stats_command()
+    out = capsys.readouterr().out
+
+    assert "Chunked        : 2/2 contents" in out
+    reclaim = out.split("Block Reclaim  :")[1].split()
+    assert reclaim[1] == "KB" and float(reclaim[0]) > 400
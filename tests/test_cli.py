@@ -1,11 +1,18 @@
 # tests/test_cli.py
+import hashlib
 import json
 import os
+import shutil
+import time
+
+import pytest
 
 from bff.commands.check import check_command
 from bff.commands.clean import clean_command
-from bff.commands.index import IndexFilters, index_command
+from bff.commands.index import IndexFilters, _scan_files, index_command
 from bff.commands.init import init_command
+from bff.commands.stats import stats_command
+from bff.core.index_manager import absolute_path
 
 
 def load_db():
@@ -111,3 +118,278 @@ def test_check_prune(populated_workspace):
     # DB should be updated
     data = load_db()
     assert len(data) == 1  # Only CONTENT_A remains
+
+
+def _age_directory(path, seconds=60):
+    old = time.time() - seconds
+    os.utime(path, (old, old))
+
+
+def test_index_reuses_unchanged_directory_listings(populated_workspace):
+    init_command()
+    _age_directory(".")
+    index_command(IndexFilters())
+
+    with open(".bff/dirs.json", "r") as f:
+        dir_cache = json.load(f)
+    root = os.getcwd()
+    # Directories are keyed relative to the root, which is ""
+    assert sorted(dir_cache[""]["files"]) == ["file1.txt", "file2.txt", "unique.txt"]
+    dir_cache = {absolute_path(d, root): v for d, v in dir_cache.items()}
+
+    files, unchanged, _ = _scan_files(root, dir_cache)
+    assert os.path.join(root, "file1.txt") in unchanged
+
+    # Adding an entry bumps the directory mtime, forcing a fresh listing
+    with open("new.txt", "w") as f:
+        f.write("CONTENT_C")
+    files, unchanged, _ = _scan_files(root, dir_cache)
+    assert os.path.join(root, "new.txt") in files
+    assert not unchanged
+
+
+def test_index_trust_dirs_keeps_cached_entries(populated_workspace):
+    init_command()
+    _age_directory(".")
+    index_command(IndexFilters())
+
+    index_command(IndexFilters(), trust_dirs=True)
+
+    data = load_db()
+    assert len(data) == 2
+    assert sum(len(v["paths"]) for v in data.values()) == 3
+
+
+def test_hardlinks_hashed_once_and_not_reclaimable(
+    populated_workspace, monkeypatch, capsys
+):
+    import bff.commands.index as index_module
+
+    for i in range(3):
+        os.link("unique.txt", f"unique_link{i}.txt")
+
+    calls = []
+    real_hash_file = index_module.hash_file
+    monkeypatch.setattr(
+        index_module, "hash_file", lambda p: calls.append(p) or real_hash_file(p)
+    )
+
+    init_command()
+    index_command(IndexFilters())
+
+    # 3 regular files + 3 extra links to unique.txt, but only 3 inodes
+    assert len(calls) == 3
+    entry = next(v for v in load_db().values() if len(v["paths"]) == 4)
+    assert len({tuple(r[:2]) for r in entry["inodes"].values()}) == 1
+
+    capsys.readouterr()
+    stats_command()
+    out = capsys.readouterr().out
+    assert "Hardlinks      : 3" in out
+    assert "Duplicates     : 1" in out
+
+    # Links to the master survive; only the real copy is removed
+    clean_command()
+    out = capsys.readouterr().out
+    assert all(os.path.exists(f"unique_link{i}.txt") for i in range(3))
+    assert os.path.exists("file1.txt") != os.path.exists("file2.txt")
+    assert "Space reclaimed: 0.00 MB" in out
+
+
+def test_sparse_file_hash_and_allocated_size(workspace, capsys):
+    from bff.core.hash import hash_file
+
+    size = 16 * 1024 * 1024
+    with open("sparse.img", "wb") as f:
+        f.truncate(size)
+        f.seek(size // 2)
+        f.write(b"payload")
+    stat = os.stat("sparse.img")
+    if stat.st_blocks * 512 >= size:
+        pytest.skip("filesystem does not support sparse files")
+
+    with open("sparse.img", "rb") as f:
+        content = f.read()
+    expected = hashlib.sha256(content).hexdigest()
+    assert hash_file("sparse.img") == expected
+
+    with open("dense.img", "wb") as f:
+        f.write(content)
+    init_command()
+    index_command(IndexFilters())
+    entry = load_db()[expected]
+    assert entry["size"] == size
+    assert sorted(r[3] for r in entry["inodes"].values())[0] < size
+
+    capsys.readouterr()
+    stats_command()
+    out = capsys.readouterr().out
+    assert "Logical Size   : 32.00 MB" in out
+    assert "Total Size     : 16.00 MB" in out
+
+
+@pytest.mark.parametrize("order", ["smallest", "largest", "size-collision"])
+def test_index_order_policies_build_the_same_index(populated_workspace, order):
+    with open("big.bin", "wb") as f:
+        f.write(b"x" * 100_000)
+
+    init_command()
+    index_command(IndexFilters())
+    expected = {h: sorted(e["paths"]) for h, e in load_db().items()}
+
+    shutil.rmtree(".bff")
+    init_command()
+    index_command(IndexFilters(), order=order)
+    assert {h: sorted(e["paths"]) for h, e in load_db().items()} == expected
+
+
+def test_plan_jobs_stats_batches_in_order(workspace, monkeypatch):
+    import bff.commands.index as index_module
+
+    monkeypatch.setattr(index_module, "_PLAN_BATCH", 2)
+    for n in range(5):
+        with open(f"f{n}.txt", "w") as f:
+            f.write(str(n))
+    os.symlink("f0.txt", "link.txt")
+    paths = [f"f{n}.txt" for n in range(5)] + ["link.txt", "gone.txt"]
+
+    jobs = index_module._plan_jobs(paths)
+    assert [job[0] for job, _ in jobs] == paths
+    for (path, stat), location in jobs[:5]:
+        assert (
+            location
+            == (stat.st_dev, stat.st_ino)
+            == (
+                os.stat(path).st_dev,
+                os.stat(path).st_ino,
+            )
+        )
+    assert jobs[5:] == [(("link.txt", None), None), (("gone.txt", None), None)]
+
+
+def test_moved_repository_keeps_its_cache(tmp_path, monkeypatch, capsys):
+    repo = tmp_path / "old"
+    os.makedirs(repo / "sub")
+    (repo / "a.txt").write_text("CONTENT_A")
+    (repo / "sub" / "b.txt").write_text("CONTENT_A")
+    monkeypatch.chdir(repo)
+    init_command()
+    index_command(IndexFilters())
+
+    (entry,) = load_db().values()
+    assert sorted(entry["paths"]) == ["a.txt", os.path.join("sub", "b.txt")]
+
+    shutil.move(str(repo), str(tmp_path / "new"))
+    monkeypatch.chdir(tmp_path / "new")
+    capsys.readouterr()
+    index_command(IndexFilters())
+    out = capsys.readouterr().out
+    assert "Indexed   : 0" in out
+    assert "Pruned    : 0" in out
+
+
+def test_migrate_rebases_absolute_paths(populated_workspace, capsys):
+    from bff.commands.migrate import migrate_command
+
+    init_command()
+    index_command(IndexFilters())
+
+    # An index written with absolute paths, before the repository moved
+    old_root = os.path.join(os.sep, "mnt", "old")
+    data = load_db()
+    for entry in data.values():
+        entry["paths"] = [os.path.join(old_root, p) for p in entry["paths"]]
+        entry["inodes"] = {
+            os.path.join(old_root, p): r for p, r in entry["inodes"].items()
+        }
+    with open(".bff/index.json", "w") as f:
+        json.dump(data, f)
+
+    migrate_command(old_root)
+    assert "Rebased 3 paths" in capsys.readouterr().out
+    assert sorted(p for e in load_db().values() for p in e["paths"]) == [
+        "file1.txt",
+        "file2.txt",
+        "unique.txt",
+    ]
+
+    index_command(IndexFilters())
+    assert "Indexed   : 0" in capsys.readouterr().out
+
+
+def test_moved_files_keep_their_hash_without_reading(
+    populated_workspace, monkeypatch, capsys
+):
+    import bff.commands.index as index_module
+
+    init_command()
+    index_command(IndexFilters())
+    expected = {p: h for h, e in load_db().items() for p in e["paths"]}
+
+    os.makedirs("archive")
+    for name in ("file1.txt", "unique.txt"):
+        os.rename(name, os.path.join("archive", name))
+
+    calls = []
+    monkeypatch.setattr(index_module, "hash_file", lambda p: calls.append(p))
+    capsys.readouterr()
+    index_command(IndexFilters())
+    out = capsys.readouterr().out
+
+    assert calls == []
+    assert "Moved     : 2" in out
+    assert "Pruned    : 2" in out
+    moved = {p: h for h, e in load_db().items() for p in e["paths"]}
+    assert moved[os.path.join("archive", "unique.txt")] == expected["unique.txt"]
+    assert moved[os.path.join("archive", "file1.txt")] == expected["file1.txt"]
+
+
+def test_check_moves_rehashes_files_whose_samples_differ(populated_workspace):
+    init_command()
+    index_command(IndexFilters())
+
+    # Same inode, size and mtime, different content: only sampling notices
+    stat = os.stat("unique.txt")
+    with open("unique.txt", "r+") as f:
+        f.write("X")
+    os.utime("unique.txt", ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    os.rename("unique.txt", "renamed.txt")
+
+    index_command(IndexFilters(), check_moves=True)
+    new_hash = hashlib.sha256(b"XONTENT_B").hexdigest()
+    assert load_db()[new_hash]["paths"] == ["renamed.txt"]
+
+
+def test_index_exclude_prunes_directories(populated_workspace):
+    os.makedirs(os.path.join("build", "out"))
+    with open(os.path.join("build", "out", "artifact.txt"), "w") as f:
+        f.write("CONTENT_C")
+
+    init_command()
+    index_command(IndexFilters(exclude=["build"]))
+
+    paths = {p for e in load_db().values() for p in e["paths"]}
+    assert paths == {"file1.txt", "file2.txt", "unique.txt"}
+
+
+def test_filtered_clean_and_stats_only_touch_matching_paths(
+    populated_workspace, capsys
+):
+    os.makedirs("keep")
+    shutil.copy("unique.txt", os.path.join("keep", "unique.txt"))
+    shutil.copy("unique.txt", os.path.join("keep", "other.txt"))
+
+    init_command()
+    index_command(IndexFilters())
+    capsys.readouterr()
+
+    stats_command(IndexFilters(include=["file*"]))
+    out = capsys.readouterr().out
+    assert "Unique Content : 1" in out
+    assert "Duplicates     : 1" in out
+
+    clean_command(filters=IndexFilters(exclude=["keep"]))
+    # The content of unique.txt only had duplicates under keep/
+    assert os.path.exists(os.path.join("keep", "unique.txt"))
+    assert os.path.exists(os.path.join("keep", "other.txt"))
+    assert os.path.exists("file1.txt") != os.path.exists("file2.txt")
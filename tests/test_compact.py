@@ -0,0 +1,85 @@
+# tests/test_compact.py
+import io
+import json
+
+from bff.core.compact import CompactIndex
+
+FLAT = "ab" * 32
+TREE = "merkle-sha256:" + "cd" * 32
+
+
+def _sample():
+    return {
+        FLAT: {
+            "size": 10,
+            "mimetype": "text/plain",
+            "created_at": 1700000000.25,
+            "mtime": 1700000000.0,
+            "paths": ["/data/a/one.txt", "/data/b/two.txt"],
+            "inodes": {
+                "/data/a/one.txt": [2**64 - 3, 2**63 + 5, 123456789, 4096],
+                "/data/b/two.txt": [64769, 12, 987654321],
+            },
+        },
+        TREE: {
+            "size": 2**40,
+            "mimetype": None,
+            "created_at": 1.5,
+            "mtime": 2.5,
+            "paths": ["relative.bin"],
+            "leaves": ["ef" * 32],
+        },
+    }
+
+
+def test_round_trip_matches_plain_json():
+    data = _sample()
+    text = json.dumps(data, indent=4)
+
+    index = CompactIndex.load(io.StringIO(text))
+    out = io.StringIO()
+    index.dump(out)
+
+    assert out.getvalue() == text
+    assert {k: v.to_dict() for k, v in index.items()} == data
+    assert list(index) == [FLAT, TREE]
+    assert index[TREE]["leaves"] == ["ef" * 32]
+    for entry in index.values():
+        assert list(entry) == list(entry.to_dict())
+        assert len(entry) == len(entry.to_dict())
+    del index[FLAT]["inodes"]
+    assert "inodes" not in list(index[FLAT]) and len(index[FLAT]) == 5
+
+
+def test_entry_views_write_through():
+    index = CompactIndex(_sample())
+    entry = index[FLAT]
+
+    entry["paths"].append("/data/c/three.txt")
+    entry["inodes"]["/data/c/three.txt"] = [1, 2, 3, 4]
+    del entry["inodes"]["/data/b/two.txt"]
+    entry["paths"].remove("/data/a/one.txt")
+    entry["size"] = 11
+
+    assert entry["paths"] == ["/data/b/two.txt", "/data/c/three.txt"]
+    assert dict(entry["inodes"]) == {"/data/c/three.txt": [1, 2, 3, 4]}
+    assert "/data/a/one.txt" not in entry["paths"]
+    assert entry.to_dict()["size"] == 11
+
+    index["00" * 32] = {"size": 0, "paths": ["/x"]}
+    assert index["00" * 32]["paths"] == ["/x"]
+    del index[TREE]
+    assert TREE not in index and len(index) == 2
+
+
+def test_paths_are_stored_relative_to_the_root():
+    text = json.dumps({FLAT: {"size": 1, "paths": ["a/x.txt", "/elsewhere/y.txt"]}})
+
+    index = CompactIndex.load(io.StringIO(text), root="/repo")
+    assert list(index[FLAT]["paths"]) == ["/repo/a/x.txt", "/elsewhere/y.txt"]
+
+    index[FLAT]["paths"].append("/repo/z.txt")
+    out = io.StringIO()
+    index.dump(out)
+    stored = json.loads(out.getvalue())[FLAT]["paths"]
+    assert stored == ["a/x.txt", "/elsewhere/y.txt", "z.txt"]
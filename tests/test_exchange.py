@@ -0,0 +1,136 @@
+# tests/test_exchange.py
+import gzip
+import io
+import json
+import os
+
+import pytest
+
+from bff.commands.export import export_command, import_command
+from bff.commands.init import init_command
+from bff.core import exchange
+from bff.core.constants import INDEX_FILE, SNAPSHOT_LOCK_FILE
+from bff.core.index_manager import load_index, save_index
+
+
+def _entry(n):
+    entry = {
+        "size": n,
+        "mimetype": "text/plain",
+        "created_at": 1700000000.25 + n,
+        "mtime": 1700000000.5 + n,
+        "paths": [f"dir{n % 3}/{n}.txt", f"copy/{n}.txt"],
+        "inodes": {f"dir{n % 3}/{n}.txt": [2049, 1000 + n, 10**18 + n, 4096]},
+    }
+    if n % 2:
+        entry["sample"] = True
+        entry["leaves"] = ["ab" * 32, "cd" * 32]
+    return entry
+
+
+@pytest.fixture
+def repo(workspace):
+    """A repository whose index holds 50 entries of every shape."""
+    init_command()
+    save_index(
+        {f"{n:064x}": _entry(n) for n in range(50)},
+        os.path.join(os.getcwd(), INDEX_FILE),
+    )
+    return workspace
+
+
+def test_iter_entries_streams_any_layout(monkeypatch):
+    monkeypatch.setattr(exchange, "_READ_SIZE", 7)
+    index = {f"{n:064x}": _entry(n) for n in range(10)}
+    for text in (json.dumps(index, indent=4), json.dumps(index), "{}", ""):
+        assert dict(exchange.iter_entries(io.StringIO(text))) == (
+            json.loads(text) if text else {}
+        )
+
+
+@pytest.mark.parametrize("name", ["index.jsonl.gz", "index.csv", "index.csv.gz"])
+def test_export_then_import_is_lossless(repo, capsys, name):
+    before = load_index(INDEX_FILE)
+    export_command(name, jobs=1)
+    assert "Exported 50 entries (100 paths)" in capsys.readouterr().out
+
+    save_index({}, os.path.join(os.getcwd(), INDEX_FILE))
+    import_command(name, force=True)
+    assert "Imported 50 entries" in capsys.readouterr().out
+    assert load_index(INDEX_FILE) == before
+
+
+def test_export_splits_large_indexes_into_shards(repo, monkeypatch):
+    export_command("single.csv.gz", jobs=1)
+    monkeypatch.setattr(exchange, "SHARD_MIN_BYTES", 1024)
+    with open(INDEX_FILE, "rb") as f:
+        assert len(exchange.shard_offsets(f, 3)) == 3
+    export_command("sharded.csv.gz", jobs=3)
+    export_command("sharded.jsonl", jobs=3)
+
+    with gzip.open("single.csv.gz") as a, gzip.open("sharded.csv.gz") as b:
+        assert a.read() == b.read()
+    with open("sharded.jsonl") as f:
+        assert len(f.readlines()) == 50
+    assert not [p for p in os.listdir(".") if ".part" in p]
+
+
+def test_export_lets_saves_through(repo, monkeypatch):
+    fcntl = pytest.importorskip("fcntl")
+    export_index = exchange.export_index
+
+    def export_unlocked(index_file, *args):
+        # What a save needs to replace the index
+        fd = os.open(SNAPSHOT_LOCK_FILE, os.O_RDWR)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        finally:
+            os.close(fd)
+        save_index({}, os.path.join(os.getcwd(), INDEX_FILE))
+        return export_index(index_file, *args)
+
+    monkeypatch.setattr(exchange, "export_index", export_unlocked)
+    export_command("index.jsonl", jobs=1)
+    # The export is of the index as it was opened
+    with open("index.jsonl") as f:
+        assert len(f.readlines()) == 50
+
+
+def test_import_refuses_scattered_rows(repo, capsys):
+    before = load_index(INDEX_FILE)
+    export_command("index.csv", jobs=1)
+    with open("index.csv") as f:
+        header, *rows = f.readlines()
+    with open("index.csv", "w") as f:
+        f.writelines([header] + rows[::2] + rows[1::2])
+
+    with pytest.raises(SystemExit):
+        import_command("index.csv", force=True)
+    assert "do not follow each other" in capsys.readouterr().out
+    assert load_index(INDEX_FILE) == before
+
+
+def test_import_refuses_a_hash_twice(repo, capsys):
+    before = load_index(INDEX_FILE)
+    export_command("index.jsonl", jobs=1)
+    with open("index.jsonl") as f:
+        lines = f.readlines()
+    with open("index.jsonl", "w") as f:
+        f.writelines(lines + lines[:1])
+
+    with pytest.raises(SystemExit):
+        import_command("index.jsonl", force=True)
+    assert "appears twice" in capsys.readouterr().out
+    assert load_index(INDEX_FILE) == before
+
+
+def test_sharded_parquet_export_is_lossless(repo, monkeypatch):
+    pytest.importorskip("pyarrow")
+    before = load_index(INDEX_FILE)
+    monkeypatch.setattr(exchange, "SHARD_MIN_BYTES", 1024)
+    export_command("index.parquet", jobs=3)
+    assert not [p for p in os.listdir(".") if ".part" in p]
+
+    save_index({}, os.path.join(os.getcwd(), INDEX_FILE))
+    import_command("index.parquet", force=True)
+    assert load_index(INDEX_FILE) == before
@@ -0,0 +1,77 @@
+# tests/test_filtering.py
+import os
+
+from bff.core.compact import CompactIndex
+from bff.core.filtering import IndexFilters, select
+
+ROOT = os.path.join(os.sep, "repo")
+HASH_A = "a" * 64
+HASH_B = "b" * 64
+
+
+def _path(*parts):
+    return os.path.join(ROOT, *parts)
+
+
+def _index():
+    return CompactIndex(
+        {
+            HASH_A: {
+                "size": 100,
+                "mimetype": "image/png",
+                "created_at": 10.0,
+                "mtime": 10.0,
+                "paths": [_path("photos", "a.png"), _path("cache", "a.png")],
+            },
+            HASH_B: {
+                "size": 5,
+                "mimetype": "text/plain",
+                "created_at": 20.0,
+                "mtime": 20.0,
+                "paths": [_path("notes.txt"), _path("photos", "notes.TXT")],
+                "inodes": {_path("photos", "notes.TXT"): [1, 2, 30_000_000_000, 8]},
+            },
+        },
+        root=ROOT,
+    )
+
+
+def _selected(filters):
+    return {h[0]: positions for h, _, positions in select(_index(), filters)}
+
+
+def test_name_and_path_globs():
+    assert _selected(IndexFilters(include=["*.png"])) == {"a": None}
+    assert _selected(IndexFilters(include=["photos/*"])) == {"a": [0], "b": [1]}
+    assert _selected(IndexFilters(exclude=["*.png"])) == {"b": None}
+
+
+def test_excluded_directory_excludes_its_subtree():
+    compiled = IndexFilters(exclude=["cache"], root=ROOT).compile()
+    assert compiled.prunes_dir(_path("cache"))
+    assert compiled.prunes_dir(_path("cache", "deep"))
+    assert not compiled.prunes_dir(_path("photos"))
+    assert _selected(IndexFilters(exclude=["cache"])) == {"a": [0], "b": None}
+    # Include globs only apply to files, never to their directories
+    compiled = IndexFilters(include=["*.png"], root=ROOT).compile()
+    assert not compiled.prunes_dir(_path("photos"))
+
+
+def test_extensions_regex_and_attributes():
+    assert _selected(IndexFilters(extensions=[".txt"])) == {"b": None}
+    assert _selected(IndexFilters(path_regex=r"^photos/")) == {"a": [0], "b": [1]}
+    assert _selected(IndexFilters(mimetypes=["image/*"])) == {"a": None}
+    assert _selected(IndexFilters(min_size_bytes=50)) == {"a": None}
+    assert _selected(IndexFilters(after_date=15.0)) == {"b": None}
+
+
+def test_mtime_range_uses_each_path_record():
+    # notes.TXT was recorded with its own mtime (30s), notes.txt falls
+    # back to the entry's
+    assert _selected(IndexFilters(modified_after=25.0)) == {"b": [1]}
+    assert _selected(IndexFilters(modified_before=25.0)) == {"a": None, "b": [0]}
+
+
+def test_no_filters_selects_everything():
+    assert _selected(None) == {"a": None, "b": None}
+    assert _selected(IndexFilters()) == {"a": None, "b": None}
@@ -24,3 +24,49 @@ def test_hash_empty_file(tmp_path):
     # SHA256 of empty string
     expected = "e3b0c44298fc1c149afbf4c8996fb92427ae41e4649b934ca495991b7852b855"
     assert hash_file(str(p)) == expected
+
+
+def test_tree_hash_is_tagged_and_parallel_safe(tmp_path, monkeypatch):
+    import bff.core.hash as hash_module
+
+    monkeypatch.setattr(hash_module, "TREE_CHUNK_SIZE", 1024)
+    p = tmp_path / "big.bin"
+    p.write_bytes(bytes(range(256)) * 20)  # 5 chunks, the last one partial
+
+    key, leaves = hash_module.hash_tree(str(p), workers=1)
+    assert hash_module.hash_tree(str(p), workers=4) == (key, leaves)
+    assert hash_module.is_tree_hash(key)
+    assert len(leaves) == 5
+    assert key == hash_module.TREE_PREFIX + hash_module.merkle_root(leaves)
+    assert key.split(":")[-1] != hash_file(str(p))
+
+
+def test_verify_localizes_corrupt_chunks(workspace, monkeypatch, capsys):
+    import json
+
+    import bff.core.hash as hash_module
+    from bff.commands.index import IndexFilters, index_command
+    from bff.commands.init import init_command
+    from bff.commands.verify import verify_command
+
+    monkeypatch.setattr(hash_module, "TREE_CHUNK_SIZE", 1024)
+    init_command()
+    with open(".bff/config.json", "w") as f:
+        json.dump({"tree_hash_min_size": 2048}, f)
+    with open("big.bin", "wb") as f:
+        f.write(b"a" * 10_000)
+    with open("small.txt", "w") as f:
+        f.write("flat")
+
+    index_command(IndexFilters())
+    with open(".bff/index.json") as f:
+        keys = set(json.load(f))
+    assert hashlib.sha256(b"flat").hexdigest() in keys
+    assert any(hash_module.is_tree_hash(k) for k in keys)
+
+    with open("big.bin", "r+b") as f:
+        f.seek(5000)
+        f.write(b"X")
+    capsys.readouterr()
+    verify_command()
+    assert "differs in bytes 4096-5120" in capsys.readouterr().out
@@ -0,0 +1,67 @@
+# tests/test_locking.py
+import os
+import threading
+
+import pytest
+
+from bff.commands.index import IndexFilters, index_command
+from bff.commands.init import init_command
+from bff.commands.stats import stats_command
+from bff.core.constants import LOCK_FILE, SNAPSHOT_LOCK_FILE
+from bff.core.locking import snapshot_lock, writer_lock
+
+fcntl = pytest.importorskip("fcntl")
+
+
+def _can_lock(path, mode):
+    """Tries the lock from another open file description, like another process."""
+    fd = os.open(path, os.O_RDWR)
+    try:
+        fcntl.flock(fd, mode | fcntl.LOCK_NB)
+        return True
+    except BlockingIOError:
+        return False
+    finally:
+        os.close(fd)
+
+
+def test_writer_lock_is_exclusive(workspace):
+    init_command()
+    with writer_lock():
+        assert not _can_lock(LOCK_FILE, fcntl.LOCK_SH)
+    assert _can_lock(LOCK_FILE, fcntl.LOCK_EX)
+
+
+def test_snapshot_lock_is_shared_between_readers(workspace):
+    init_command()
+    with snapshot_lock():
+        assert _can_lock(SNAPSHOT_LOCK_FILE, fcntl.LOCK_SH)
+        assert not _can_lock(SNAPSHOT_LOCK_FILE, fcntl.LOCK_EX)
+
+
+def test_readers_do_not_wait_for_writers(populated_workspace, capsys):
+    init_command()
+    index_command(IndexFilters())
+    capsys.readouterr()
+
+    with writer_lock():
+        stats_command()
+    assert "Unique Content : 2" in capsys.readouterr().out
+
+
+def test_second_writer_waits_for_the_first(populated_workspace, capsys):
+    init_command()
+    done = threading.Event()
+
+    def run_index():
+        index_command(IndexFilters())
+        done.set()
+
+    with writer_lock():
+        worker = threading.Thread(target=run_index)
+        worker.start()
+        assert not done.wait(0.3)
+    worker.join(10)
+
+    assert done.is_set()
+    assert "Waiting for another bff process" in capsys.readouterr().out
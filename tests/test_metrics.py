@@ -0,0 +1,56 @@
+# tests/test_metrics.py
+import json
+
+import pytest
+
+from bff.commands.index import IndexFilters, index_command
+from bff.commands.init import init_command
+from bff.core import metrics
+
+
+@pytest.fixture
+def registry():
+    reg = metrics.enable("test")
+    yield reg
+    metrics.disable()
+
+
+def test_disabled_helpers_record_nothing():
+    metrics.disable()
+    with metrics.timer("hash"):
+        pass
+    metrics.incr("hash_bytes", 10)
+    assert metrics.active() is None
+
+
+def test_histogram_quantiles_use_bucket_bounds():
+    hist = metrics.Histogram()
+    for _ in range(99):
+        hist.observe(0.001)
+    hist.observe(1.5)
+
+    assert hist.count == 100
+    assert 0.001 <= hist.quantile(0.5) < 0.002
+    assert hist.quantile(1.0) == 1.5
+    assert hist.cumulative_buckets()[-1] == (float("inf"), 100)
+
+
+def test_index_records_pipeline_stages(populated_workspace, registry):
+    init_command()
+    index_command(IndexFilters())
+
+    data = json.loads(registry.to_json())
+    for stage in ("walk", "filter", "stat", "hash", "lock_wait", "index_save"):
+        assert data["stages"][stage]["count"] > 0
+    assert data["counters"]["hash_bytes"] == 3 * len("CONTENT_A")
+    assert data["counters"]["files_indexed"] == 3
+
+
+def test_prometheus_export(registry):
+    registry.observe("hash", 0.25)
+    registry.incr("hash_bytes", 42)
+
+    text = registry.to_prometheus()
+    assert 'bff_stage_seconds_bucket{stage="hash",le="+Inf"} 1' in text
+    assert 'bff_stage_seconds_count{stage="hash"} 1' in text
+    assert "bff_hash_bytes_total 42" in text
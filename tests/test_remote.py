@@ -0,0 +1,257 @@
+# tests/test_remote.py
+import http.client
+import json
+import os
+import shutil
+import threading
+
+import pytest
+
+from bff.commands.diff import diff_command
+from bff.commands.index import IndexFilters, index_command
+from bff.commands.init import init_command
+from bff.commands.serve import make_server
+from bff.core import journal
+from bff.core.constants import FINGERPRINTS_FILE, INDEX_FILE, JOURNAL_FILE
+from bff.core.index_manager import load_index
+from bff.core.remote import CONTENT_ENDPOINT, pull
+from bff.commands import sync
+from bff.commands.sync import sync_command
+
+
+def _write(path, content):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w") as f:
+        f.write(content)
+
+
+@pytest.fixture
+def repos(tmp_path, monkeypatch):
+    """A 'remote' repository with a few files, and an empty 'local' one."""
+    remote, local = tmp_path / "remote", tmp_path / "local"
+    for n in range(20):
+        _write(str(remote / "data" / f"{n}.txt"), f"content {n}")
+    for root in (remote, local):
+        root.mkdir(exist_ok=True)
+        monkeypatch.chdir(root)
+        init_command()
+        index_command(IndexFilters())
+    monkeypatch.chdir(local)
+    return str(remote), str(local)
+
+
+def _reindex(root, monkeypatch):
+    cwd = os.getcwd()
+    monkeypatch.chdir(root)
+    index_command(IndexFilters())
+    monkeypatch.chdir(cwd)
+
+
+def _records(root):
+    with open(os.path.join(root, JOURNAL_FILE)) as f:
+        return [json.loads(line) for line in f]
+
+
+def test_journal_records_changes_between_saves(repos, monkeypatch):
+    remote, _ = repos
+    assert journal.load_state(remote)["seq"] == 0
+    assert _records(remote) == []
+
+    _write(os.path.join(remote, "data", "new.txt"), "brand new")
+    os.remove(os.path.join(remote, "data", "0.txt"))
+    _reindex(remote, monkeypatch)
+
+    (record,) = _records(remote)
+    assert record["seq"] == journal.load_state(remote)["seq"] == 1
+    (entry,) = record["put"].values()
+    assert entry["paths"] == [os.path.join("data", "new.txt")]
+    assert len(record["del"]) == 1
+
+    # A save that changes nothing adds no record
+    _reindex(remote, monkeypatch)
+    assert len(_records(remote)) == 1
+
+
+def test_journal_starts_over_without_usable_fingerprints(repos, monkeypatch):
+    remote, _ = repos
+    repo_id = journal.load_state(remote)["repo"]
+    # Fingerprints of an older layout: the changes can no longer be computed
+    with open(os.path.join(remote, FINGERPRINTS_FILE), "wb") as f:
+        f.write(b"\x01a" + b"\x00" * 8)
+
+    os.remove(os.path.join(remote, "data", "0.txt"))
+    _reindex(remote, monkeypatch)
+    state = journal.load_state(remote)
+    assert state["repo"] != repo_id
+    assert state["seq"] == 0
+    assert _records(remote) == []
+
+
+@pytest.fixture
+def server(repos):
+    remote, _ = repos
+    httpd = make_server(remote, allow_content=True)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_port}"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def _remote_paths(index):
+    return sorted(p for entry in index.values() for p in entry["paths"])
+
+
+@pytest.mark.parametrize("scheme", ["http", "file"])
+def test_pull_transfers_only_deltas(repos, server, scheme, monkeypatch):
+    remote, _ = repos
+    url = server if scheme == "http" else f"file://{remote}"
+
+    index, transport = pull(url)
+    full_size = transport.received
+    assert len(index) == 20
+    assert _remote_paths(index)[0] == os.path.join(remote, "data", "0.txt")
+
+    _write(os.path.join(remote, "data", "new.txt"), "brand new")
+    os.remove(os.path.join(remote, "data", "1.txt"))
+    _reindex(remote, monkeypatch)
+
+    index, transport = pull(url)
+    assert 0 < transport.received < full_size
+    assert os.path.join(remote, "data", "new.txt") in _remote_paths(index)
+    assert os.path.join(remote, "data", "1.txt") not in _remote_paths(index)
+    assert len(index) == 20
+
+    # Nothing changed: only the header comes back
+    index, transport = pull(url)
+    assert len(index) == 20
+    assert transport.received < 200
+
+
+def test_pull_starts_over_after_a_reset(repos, server, monkeypatch):
+    remote, _ = repos
+    pull(server)
+
+    monkeypatch.chdir(remote)
+    shutil.rmtree(".bff")
+    init_command()
+    os.remove(os.path.join("data", "2.txt"))
+    index_command(IndexFilters())
+    monkeypatch.chdir(repos[1])
+
+    index, _ = pull(server)
+    assert len(index) == 19
+
+
+def test_diff_against_a_served_repository(repos, server, capsys):
+    diff_command(server)
+    out = capsys.readouterr().out
+    assert "Received" in out
+    assert "TARGET ONLY (Unique there)  : 20 files" in out
+
+
+def test_sync_fetches_each_missing_content_once(repos, server, monkeypatch, capsys):
+    remote, local = repos
+    for name in ("copy1.txt", "copy2.txt"):
+        _write(os.path.join(remote, "dup", name), "content 3")
+    _write(os.path.join(local, "data", "0.txt"), "already here")
+    _reindex(remote, monkeypatch)
+    _reindex(local, monkeypatch)
+    capsys.readouterr()
+
+    sync_command(server, filters=IndexFilters(exclude=["data/1*"]))
+    out = capsys.readouterr().out
+    # 20 contents, minus data/1.txt and data/10-19.txt, minus data/0.txt taken
+    assert "Fetched   : 8" in out
+    assert "Linked    : 2" in out
+    assert "Existing  : 1" in out
+    with open(os.path.join(local, "dup", "copy2.txt")) as f:
+        assert f.read() == "content 3"
+    with open(os.path.join(local, "data", "0.txt")) as f:
+        assert f.read() == "already here"
+    assert not os.path.exists(os.path.join(local, "data", "1.txt"))
+    src, dest = (os.stat(os.path.join(r, "data", "5.txt")) for r in (remote, local))
+    assert dest.st_mtime_ns == src.st_mtime_ns
+
+    # The local index already knows what was fetched
+    index_command(IndexFilters())
+    assert "Indexed   : 0" in capsys.readouterr().out
+
+
+def test_contents_are_only_served_when_allowed(repos):
+    remote, _ = repos
+    (file_hash,) = [
+        h
+        for h, e in load_index(os.path.join(remote, INDEX_FILE)).items()
+        if e["paths"][0] == os.path.join("data", "4.txt")
+    ]
+    url = CONTENT_ENDPOINT + file_hash
+    for allow_content, status in ((False, 403), (True, 200)):
+        httpd = make_server(remote, allow_content=allow_content)
+        threading.Thread(target=httpd.serve_forever, daemon=True).start()
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", httpd.server_port)
+            conn.request("GET", url)
+            response = conn.getresponse()
+            assert response.status == status
+            if allow_content:
+                assert response.read() == b"content 4"
+            conn.close()
+        finally:
+            httpd.shutdown()
+            httpd.server_close()
+
+
+def test_sync_from_a_local_path(repos, capsys):
+    remote, local = repos
+    sync_command(remote, link_mode="copy")
+    assert "Fetched   : 20" in capsys.readouterr().out
+    with open(os.path.join(local, "data", "7.txt")) as f:
+        assert f.read() == "content 7"
+
+    sync_command(remote)
+    assert "0 contents to fetch" in capsys.readouterr().out
+
+
+def test_sync_links_contents_already_here_under_other_paths(repos, monkeypatch, capsys):
+    remote, local = repos
+    _write(os.path.join(local, "elsewhere", "five.txt"), "content 5")
+    _reindex(local, monkeypatch)
+    capsys.readouterr()
+
+    sync_command(remote)
+    out = capsys.readouterr().out
+    assert "19 contents to fetch" in out and "1 already here" in out
+    assert "Fetched   : 19" in out
+    assert "Linked    : 1" in out
+    with open(os.path.join(local, "data", "5.txt")) as f:
+        assert f.read() == "content 5"
+
+    index = load_index(os.path.join(local, INDEX_FILE))
+    (entry,) = [e for e in index.values() if "elsewhere/five.txt" in e["paths"]]
+    assert sorted(entry["paths"]) == [
+        os.path.join("data", "5.txt"),
+        "elsewhere/five.txt",
+    ]
+    index_command(IndexFilters())
+    assert "Indexed   : 0" in capsys.readouterr().out
+
+
+def test_sync_records_copies_made_before_a_failure(repos, monkeypatch, capsys):
+    remote, local = repos
+    for name in ("copy1.txt", "copy2.txt"):
+        _write(os.path.join(remote, "dup", name), "content 3")
+    _reindex(remote, monkeypatch)
+
+    def fail(source, dest, link_mode):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(sync, "_link_local", fail)
+    sync_command(remote)
+    assert "Error fetching" in capsys.readouterr().out
+
+    index = load_index(os.path.join(local, INDEX_FILE))
+    (entry,) = [e for e in index.values() if e["paths"][0].startswith("data/3")]
+    # The first copy is in place and indexed; the links were not made
+    assert entry["paths"] == [os.path.join("data", "3.txt")]
+    assert not os.path.exists(os.path.join(local, "dup", "copy1.txt"))
@@ -0,0 +1,86 @@
+# tests/test_scheduler.py
+import os
+import threading
+import time
+
+import pytest
+
+from bff.core import scheduler
+
+
+@pytest.fixture
+def fake_devices(monkeypatch):
+    """Device 1 is a spinning disk, device 2 an NVMe drive."""
+    profiles = {1: scheduler.HDD, 2: scheduler.NVME}
+    monkeypatch.setattr(scheduler, "device_profile", lambda dev: profiles[dev])
+
+
+def test_detects_device_kind_from_sysfs(tmp_path, monkeypatch):
+    for disk, rotational in [("sda", "1"), ("nvme0n1", "0"), ("vdb", "0")]:
+        os.makedirs(tmp_path / "devices" / disk / f"{disk}1")
+        os.makedirs(tmp_path / "devices" / disk / "queue")
+        (tmp_path / "devices" / disk / "queue" / "rotational").write_text(rotational)
+    os.makedirs(tmp_path / "dev")
+    os.symlink(tmp_path / "devices" / "sda" / "sda1", tmp_path / "dev" / "8:1")
+    os.symlink(tmp_path / "devices" / "nvme0n1", tmp_path / "dev" / "259:0")
+    os.symlink(tmp_path / "devices" / "vdb" / "vdb1", tmp_path / "dev" / "252:17")
+    monkeypatch.setattr(scheduler, "_SYS_BLOCK", str(tmp_path / "dev"))
+
+    assert scheduler._detect(os.makedev(8, 1)) == scheduler.HDD
+    assert scheduler._detect(os.makedev(259, 0)) == scheduler.NVME
+    assert scheduler._detect(os.makedev(252, 17)) == scheduler.SSD
+    assert scheduler._detect(os.makedev(0, 42)) == scheduler.UNKNOWN
+
+
+def test_hdd_jobs_run_one_at_a_time_in_inode_order(fake_devices):
+    jobs = [(f"hdd{ino}", (1, ino)) for ino in (30, 10, 20)]
+    jobs += [(f"nvme{i}", (2, i)) for i in range(8)]
+    jobs.append(("unknown", None))
+
+    lock = threading.Lock()
+    running = {"hdd": 0}
+    peak = {"hdd": 0}
+    hdd_order = []
+
+    def worker(item):
+        if item.startswith("hdd"):
+            with lock:
+                running["hdd"] += 1
+                peak["hdd"] = max(peak["hdd"], running["hdd"])
+                hdd_order.append(item)
+            time.sleep(0.01)
+            with lock:
+                running["hdd"] -= 1
+        return item.upper()
+
+    done = {}
+    caller = threading.get_ident()
+
+    def on_done(item, result):
+        assert threading.get_ident() == caller
+        done[item] = result
+
+    scheduler.run_by_device(jobs, worker, on_done)
+
+    assert done == {item: item.upper() for item, _ in jobs}
+    assert hdd_order == ["hdd10", "hdd20", "hdd30"]
+    assert peak["hdd"] == 1
+
+
+def test_worker_errors_propagate(fake_devices):
+    def worker(item):
+        raise ValueError(item)
+
+    with pytest.raises(ValueError):
+        scheduler.run_by_device([("x", (2, 1))], worker, lambda item, r: None)
+
+
+def test_priority_comes_before_inode_order(fake_devices):
+    jobs = [("big", (1, 1)), ("small", (1, 3)), ("medium", (1, 2))]
+    rank = {"small": 0, "medium": 1, "big": 2}
+    order = []
+
+    scheduler.run_by_device(
+        jobs, order.append, lambda item, r: None, priority=rank.__getitem__
+    )
+    assert order == ["small", "medium", "big"]
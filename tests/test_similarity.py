@@ -0,0 +1,73 @@
+# tests/test_similarity.py
+import random
+
+from bff.commands.index import IndexFilters, index_command
+from bff.commands.init import init_command
+from bff.commands.similar import find_similar_clusters, similar_command
+from bff.core.similarity import BKTree, hamming, lsh_pairs, minhash
+
+
+def _digests(n, seed):
+    rng = random.Random(seed)
+    return [f"{rng.getrandbits(128):032x}" for _ in range(n)]
+
+
+def test_bktree_matches_brute_force():
+    rng = random.Random(0)
+    values = [rng.getrandbits(64) for _ in range(300)]
+    tree = BKTree()
+    for i, v in enumerate(values):
+        tree.add(v, i)
+
+    query = values[0] ^ 0b1011  # 3 bits away from the first value
+    found = sorted(item for _, item in tree.search(query, 12))
+    expected = sorted(i for i, v in enumerate(values) if hamming(v, query) <= 12)
+    assert found == expected
+    assert 0 in found
+
+
+def test_lsh_finds_overlapping_sets_only():
+    base = _digests(200, seed=1)
+    sketches = {
+        "original": minhash(base),
+        "edited": minhash(base[:180] + _digests(20, seed=2)),
+        "unrelated": minhash(_digests(200, seed=3)),
+    }
+    assert lsh_pairs(sketches) == {("edited", "original")}
+
+
+def test_find_similar_clusters_combines_images_and_sketches():
+    index = {h: {"size": 10, "paths": [f"/{h}"]} for h in "abcde"}
+    base = _digests(100, seed=4)
+    similarity = {
+        "images": {
+            "a": "ff00ff00ff00ff00",
+            "b": "ff00ff00ff00ff01",
+            "c": "00ff00ff00ff00ff",
+        },
+        "sketches": {"d": minhash(base), "e": minhash(base[:95] + _digests(5, seed=5))},
+    }
+
+    clusters = find_similar_clusters(index, similarity)
+    assert sorted(sorted(c) for c in clusters) == [["a", "b"], ["d", "e"]]
+
+
+def test_similar_command_reports_near_duplicates(workspace, capsys):
+    rng = random.Random(9)
+    data = rng.getrandbits(8 * 1_200_000).to_bytes(1_200_000, "little")
+    with open("dump-monday.bin", "wb") as f:
+        f.write(data)
+    with open("dump-tuesday.bin", "wb") as f:
+        f.write(data[:600_000] + b"new rows" + data[600_000:])
+    with open("other.bin", "wb") as f:
+        f.write(rng.getrandbits(8 * 300_000).to_bytes(300_000, "little"))
+
+    init_command()
+    index_command(IndexFilters(), similarity=True)
+    capsys.readouterr()
+    similar_command()
+    out = capsys.readouterr().out
+
+    assert "Found 1 near-duplicate clusters" in out
+    assert "dump-monday.bin" in out and "dump-tuesday.bin" in out
+    assert "other.bin" not in out
@@ -0,0 +1,55 @@
+# tests/test_startup.py
+import os
+import subprocess
+import sys
+
+import pytest
+
+from bff.commands.init import init_command
+
+# Cumulative import time budget for `bff.main`, in milliseconds.
+# Override with BFF_STARTUP_BUDGET_MS on slow machines.
+STARTUP_BUDGET_MS = float(os.environ.get("BFF_STARTUP_BUDGET_MS", "50"))
+
+HEAVY_MODULES = ("magic", "tqdm", "concurrent.futures", "multiprocessing")
+
+
+def _importtime(code, cwd=None):
+    """Runs code under -X importtime. Returns {module: cumulative_us}."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True,
+        text=True,
+        cwd=cwd,
+        check=True,
+    )
+    modules = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        modules[name.strip()] = int(cumulative)
+    return modules
+
+
+def test_main_import_skips_heavy_modules():
+    modules = _importtime("import bff.main")
+    for heavy in HEAVY_MODULES:
+        assert heavy not in modules, f"{heavy} imported at startup"
+
+
+@pytest.mark.parametrize("command", ["stats", "init"])
+def test_light_commands_skip_heavy_modules(workspace, command):
+    init_command()
+    code = (
+        f"import sys; sys.argv = ['bff', '{command}']; import bff.main; bff.main.main()"
+    )
+    modules = _importtime(code, cwd=str(workspace))
+    for heavy in HEAVY_MODULES:
+        assert heavy not in modules, f"{heavy} imported by 'bff {command}'"
+
+
+def test_startup_time_budget():
+    # Best of a few runs to keep scheduler noise out of the measurement
+    best_us = min(_importtime("import bff.main")["bff.main"] for _ in range(3))
+    assert best_us / 1000 < STARTUP_BUDGET_MS
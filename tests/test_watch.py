@@ -0,0 +1,118 @@
+# tests/test_watch.py
+import os
+import shutil
+
+import pytest
+
+from bff.commands import index as index_module
+from bff.commands.index import (
+    _build_inode_seed,
+    _build_path_cache,
+    _InodeHashes,
+    index_command,
+)
+from bff.commands.init import init_command
+from bff.commands.watch import _apply_changes, _build_path_hashes
+from bff.core import inotify
+from bff.core.constants import IGNORED_DIRS
+from bff.core.filtering import IndexFilters
+from bff.core.index_manager import load_compact_index
+
+
+def load_db():
+    # Paths are stored relative to the root, the commands work on absolute ones
+    return load_compact_index()
+
+
+def test_apply_changes_updates_only_touched_paths(populated_workspace):
+    init_command()
+    index_command(IndexFilters())
+    index = load_db()
+    path_hashes = _build_path_hashes(index)
+    path_cache = _build_path_cache(index)
+
+    os.remove("unique.txt")
+    with open("new.txt", "w") as f:
+        f.write("CONTENT_A")
+
+    changed = {os.path.abspath("unique.txt"), os.path.abspath("new.txt")}
+    counts = _apply_changes(index, changed, IndexFilters(), path_hashes, path_cache)
+
+    assert counts == {"indexed": 1, "removed": 1}
+    assert len(index) == 1
+    (entry,) = index.values()
+    assert len(entry["paths"]) == 3
+
+
+def test_apply_changes_removes_deleted_directory(workspace):
+    os.makedirs("sub")
+    with open("sub/a.txt", "w") as f:
+        f.write("A")
+    init_command()
+    index_command(IndexFilters())
+    index = load_db()
+    path_hashes = _build_path_hashes(index)
+    path_cache = _build_path_cache(index)
+
+    shutil.rmtree("sub")
+    counts = _apply_changes(
+        index, {os.path.abspath("sub")}, IndexFilters(), path_hashes, path_cache
+    )
+
+    assert counts["removed"] == 1
+    assert index == {}
+
+
+def test_apply_changes_reuses_hashes_of_links_and_moves(
+    populated_workspace, monkeypatch
+):
+    init_command()
+    index_command(IndexFilters())
+    index = load_db()
+    path_hashes = _build_path_hashes(index)
+    path_cache = _build_path_cache(index)
+    inode_hashes = _InodeHashes(_build_inode_seed(index))
+
+    os.link("file1.txt", "link.txt")
+    os.rename("unique.txt", "moved.txt")
+
+    def no_read(*args):
+        raise AssertionError("content read again")
+
+    monkeypatch.setattr(index_module, "_hash_content", no_read)
+    changed = {os.path.abspath(p) for p in ("link.txt", "unique.txt", "moved.txt")}
+    counts = _apply_changes(
+        index, changed, IndexFilters(), path_hashes, path_cache, None, inode_hashes
+    )
+
+    assert counts == {"indexed": 2, "removed": 1}
+    assert inode_hashes.moved == 1
+    assert (
+        path_hashes[os.path.abspath("link.txt")]
+        == path_hashes[os.path.abspath("file1.txt")]
+    )
+    assert os.path.abspath("moved.txt") in path_hashes
+
+
+@pytest.mark.skipif(not inotify.is_supported(), reason="inotify unavailable")
+def test_watcher_reports_new_files(workspace):
+    os.makedirs(".git")
+    watcher = inotify.RecursiveWatcher(str(workspace), IGNORED_DIRS)
+    try:
+        with open("a.txt", "w") as f:
+            f.write("A")
+        with open(".git/ignored", "w") as f:
+            f.write("B")
+        os.makedirs("nested/deeper")
+        with open("nested/deeper/b.txt", "w") as f:
+            f.write("B")
+
+        changed = set()
+        for _ in range(5):
+            changed |= watcher.poll(0.2)
+    finally:
+        watcher.close()
+
+    assert str(workspace / "a.txt") in changed
+    assert str(workspace / "nested" / "deeper" / "b.txt") in changed
+    assert not any(".git" in p for p in changed)